@@ -0,0 +1,98 @@
+"""Persistent cache of searched positions, shared across sessions and processes.
+
+Finished searches store their root position's Zobrist key with the depth,
+score and best move in an SQLite database. Later searches of the same position,
+in this or any other process, start from the stored result instead of from
+depth 1:
+
+    cache = AnalysisCache("analysis_cache.db")
+    ai = ChessAI("expert", cache=cache)
+
+The database runs in WAL mode, so any number of processes can read while one
+writes. Stores are best effort: if the database stays locked longer than the
+busy timeout the result is simply not cached. When the table grows past
+max_entries, the shallowest and then oldest entries are evicted.
+"""
+import time
+import sqlite3
+import threading
+
+# Constants
+DEFAULT_PATH = "analysis_cache.db"
+MAX_ENTRIES = 1_000_000
+EVICTION_INTERVAL = 64  # Stores between size checks
+EVICTION_FRACTION = 0.1  # Share of max_entries removed when the limit is exceeded
+BUSY_TIMEOUT = 5.0  # Seconds to wait for another process's write lock
+
+
+def to_signed(key):
+    """Map an unsigned 64-bit position key onto SQLite's signed integers"""
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+
+class AnalysisCache:
+    """SQLite-backed table of position key -> (depth, score, best move code)"""
+    def __init__(self, path=DEFAULT_PATH, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.lock = threading.Lock()  # One connection is shared by the threads of a process
+        self.stores = 0
+        self.connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None,
+                                          check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS positions ("
+                                "key INTEGER PRIMARY KEY, depth INTEGER NOT NULL, score INTEGER NOT NULL, "
+                                "move INTEGER, stored REAL NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS positions_eviction ON positions (depth, stored)")
+        self._evict()  # The limit may be lower than when the file was written
+
+    def get(self, key):
+        """Get (depth, score, move_code) stored for a position key, or None"""
+        with self.lock:
+            try:
+                return self.connection.execute("SELECT depth, score, move FROM positions WHERE key = ?",
+                                               (to_signed(key),)).fetchone()
+            except sqlite3.OperationalError:
+                return None
+
+    def put(self, key, depth, score, move_code):
+        """Store a search result unless a deeper one is already cached"""
+        with self.lock:
+            try:
+                self.connection.execute(
+                    "INSERT INTO positions (key, depth, score, move, stored) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET depth = excluded.depth, score = excluded.score, "
+                    "move = excluded.move, stored = excluded.stored WHERE excluded.depth >= positions.depth",
+                    (to_signed(key), depth, score, move_code, time.time()))
+                self.stores += 1
+                if self.stores % EVICTION_INTERVAL == 0:
+                    self._evict()
+            except sqlite3.OperationalError:
+                pass  # Locked by another writer for too long; caching is best effort
+
+    def _evict(self):
+        """Remove the shallowest, oldest entries once the table is over its size limit"""
+        count = self.connection.execute("SELECT COUNT(*) FROM positions").fetchone()[0]
+        if count > self.max_entries:
+            excess = count - self.max_entries + int(self.max_entries * EVICTION_FRACTION)
+            self.connection.execute("DELETE FROM positions WHERE key IN "
+                                    "(SELECT key FROM positions ORDER BY depth, stored LIMIT ?)", (excess,))
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM positions").fetchone()[0]
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute("DELETE FROM positions")
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,323 @@
+"""Headless self-play arena for ChessAI-vs-ChessAI matches.
+
+Usage:
+    python arena.py hard expert:depth=2 --games 200 --workers 4 --jsonl games.jsonl --pgn games.pgn
+    python arena.py expert:depth=2 expert:depth=3 --time-limit 0.5 --sprt 0 20
+
+Engines are given as a difficulty optionally followed by settings, for example
+"expert:depth=3:time=0.5". Each opening is played twice with colors swapped.
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from chess_game import ChessAI, ChessBoard, Color, SQUARE_NAMES, decode_move
+from pgn import game_result, moves_to_pgn
+
+# Constants
+DIFFICULTIES = ("easy", "medium", "hard", "expert")
+OPENING_PLIES = 4  # Random plies played before the engines take over
+MAX_PLIES = 400  # Games still running after this many plies are adjudicated drawn
+TIME_MARGIN = 0.25  # Share of the time limit a move may run over before it is forfeited
+MIN_TIME_MARGIN = 0.05  # Seconds of grace added for scheduling jitter on short limits
+MAX_PENDING_PER_WORKER = 2  # Games queued per worker process
+
+
+def parse_engine(spec):
+    """Parse an engine spec like 'expert:depth=3:time=0.5' into a settings dict"""
+    difficulty, *options = spec.split(':')
+    if difficulty not in DIFFICULTIES:
+        raise ValueError(f"unknown difficulty {difficulty!r} in {spec!r}")
+    engine = {'name': spec, 'difficulty': difficulty, 'depth': None, 'time_limit': None}
+    for option in options:
+        key, _, value = option.partition('=')
+        if key == 'depth':
+            engine['depth'] = int(value)
+        elif key == 'time':
+            engine['time_limit'] = float(value)
+        else:
+            raise ValueError(f"unknown engine option {key!r} in {spec!r}")
+    return engine
+
+
+def make_ai(engine, time_limit):
+    """Create a ChessAI for an engine spec, falling back to the arena time limit"""
+    ai = ChessAI(engine['difficulty'], time_limit=engine['time_limit'] or time_limit)
+    if engine['depth']:
+        ai.depth = engine['depth']
+    return ai
+
+
+def play_random_opening(board, plies, rng):
+    """Play a few random legal moves to diversify the starting position"""
+    for _ in range(plies):
+        moves = board.get_all_valid_moves(board.current_player)
+        if board.game_over or not moves:
+            return
+        piece, (to_row, to_col) = rng.choice(moves)
+        board.execute_move(piece.row, piece.col, to_row, to_col)
+
+
+def termination_reason(board):
+    """Describe why a finished game ended, using the board's draw rules"""
+    if board.checkmate:
+        return "checkmate"
+    if board.check_threefold_repetition():
+        return "threefold repetition"
+    if board.check_fifty_move_rule():
+        return "fifty-move rule"
+    if board.check_insufficient_material():
+        return "insufficient material"
+    return "stalemate"
+
+
+def play_game(task):
+    """Play one game and return its record as a dict"""
+    index, white, black, settings = task
+    # Openings are shared by each pair of games; engine randomness is per game
+    opening_rng = random.Random(settings['seed'] * 1000003 + index // 2)
+    random.seed(settings['seed'] * 1000003 + index)
+
+    board = ChessBoard()
+    play_random_opening(board, settings['opening_plies'], opening_rng)
+    opening_plies = board.current_ply
+    engines = {Color.WHITE: make_ai(white, settings['time_limit']),
+               Color.BLACK: make_ai(black, settings['time_limit'])}
+    time_limit = settings['time_limit']
+
+    result = termination = None
+    move_times = []
+    while not board.game_over:
+        if board.current_ply >= settings['max_plies']:
+            result, termination = "1/2-1/2", "max plies"
+            break
+        start = time.perf_counter()
+        move = engines[board.current_player].get_move(board)
+        elapsed = time.perf_counter() - start
+        move_times.append(elapsed)
+        if time_limit and elapsed > time_limit * (1 + settings['time_margin']) + MIN_TIME_MARGIN:
+            result = "0-1" if board.current_player == Color.WHITE else "1-0"
+            termination = "time forfeit"
+            break
+        piece, (to_row, to_col) = move
+        board.execute_move(piece.row, piece.col, to_row, to_col)
+    if result is None:
+        result, termination = game_result(board), termination_reason(board)
+
+    moves = list(board.history.moves)
+    return {
+        'index': index,
+        'white': white['name'],
+        'black': black['name'],
+        'result': result,
+        'termination': termination,
+        'plies': len(moves),
+        'opening_plies': opening_plies,
+        'max_move_time': round(max(move_times, default=0.0), 4),
+        'mean_move_time': round(sum(move_times) / len(move_times), 4) if move_times else 0.0,
+        'moves': [move_to_uci(code) for code in moves],
+        'codes': moves
+    }
+
+
+def move_to_uci(code):
+    """Format a packed move as a UCI long algebraic string"""
+    from_row, from_col, to_row, to_col = decode_move(code)
+    return SQUARE_NAMES[from_row * 8 + from_col] + SQUARE_NAMES[to_row * 8 + to_col]
+
+
+def logistic(elo):
+    """Expected score for an Elo difference"""
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+class MatchStats:
+    """Running win/draw/loss totals for the first engine with Elo and SPRT estimates"""
+    def __init__(self):
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+
+    @property
+    def games(self):
+        return self.wins + self.draws + self.losses
+
+    def add(self, record, engine_name):
+        """Count a finished game from the first engine's point of view"""
+        if record['result'] == "1/2-1/2" or record['result'] == "*":
+            self.draws += 1
+        elif (record['result'] == "1-0") == (record['white'] == engine_name):
+            self.wins += 1
+        else:
+            self.losses += 1
+
+    def score_and_variance(self, prior=0.0):
+        """Get the mean score per game and its per-game variance
+
+        A prior adds that many pseudo-games to each of win, draw and loss.
+        """
+        wins, draws, losses = self.wins + prior, self.draws + prior, self.losses + prior
+        games = wins + draws + losses
+        score = (wins + draws / 2) / games
+        second_moment = (wins + draws / 4) / games
+        return score, second_moment - score ** 2
+
+    def elo(self):
+        """Get (elo_difference, 95% margin), or None until the result is decisive enough"""
+        if not self.games:
+            return None
+        score, variance = self.score_and_variance()
+        if score <= 0 or score >= 1:
+            return None
+        margin = 1.96 * math.sqrt(variance / self.games)
+        low, high = max(score - margin, 1e-6), min(score + margin, 1 - 1e-6)
+        elo = -400 * math.log10(1 / score - 1)
+        return elo, (-400 * math.log10(1 / high - 1) + 400 * math.log10(1 / low - 1)) / 2
+
+    def llr(self, elo0, elo1):
+        """Get the trinomial SPRT log-likelihood ratio of H1 (elo1) against H0 (elo0)"""
+        if not self.games:
+            return 0.0
+        # Half a pseudo-game per outcome keeps the variance positive in one-sided matches
+        score, variance = self.score_and_variance(prior=0.5)
+        score0, score1 = logistic(elo0), logistic(elo1)
+        return (score1 - score0) * (2 * score - score0 - score1) / (2 * variance / self.games)
+
+    def summary(self, sprt=None):
+        text = f"Games {self.games}: +{self.wins} ={self.draws} -{self.losses}"
+        elo = self.elo()
+        if elo:
+            text += f", Elo {elo[0]:+.1f} +/- {elo[1]:.1f}"
+        if sprt:
+            elo0, elo1, lower, upper = sprt
+            text += f", LLR {self.llr(elo0, elo1):.2f} ({lower:.2f}, {upper:.2f})"
+        return text
+
+
+def sprt_bounds(alpha, beta):
+    """Get the (lower, upper) LLR bounds for the given error rates"""
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def iter_tasks(engine_a, engine_b, games, settings):
+    """Yield game tasks, alternating colors so each opening is played from both sides"""
+    for index in range(games):
+        if index % 2 == 0:
+            yield index, engine_a, engine_b, settings
+        else:
+            yield index, engine_b, engine_a, settings
+
+
+def run_match(engine_a, engine_b, games, settings, workers=None):
+    """Play a match across a process pool, yielding game records as they finish"""
+    workers = workers or os.cpu_count() or 1
+    tasks = iter_tasks(engine_a, engine_b, games, settings)
+    if workers == 1:
+        for task in tasks:
+            yield play_game(task)
+        return
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    pending = set()
+    try:
+        for task in tasks:
+            pending.add(executor.submit(play_game, task))
+            if len(pending) >= workers * MAX_PENDING_PER_WORKER:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        # Stopping early (e.g. SPRT finished) drops the games not yet started
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def open_output(path):
+    """Open an output path for writing, where '-' means stdout"""
+    if path == '-':
+        return sys.stdout
+    return open(path, 'w')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play ChessAI-vs-ChessAI matches")
+    parser.add_argument('engine_a', help="first engine, e.g. 'expert:depth=3'")
+    parser.add_argument('engine_b', help="second engine, e.g. 'hard'")
+    parser.add_argument('--games', type=int, default=100, help="number of games (default: 100)")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--opening-plies', type=int, default=OPENING_PLIES, help="random opening plies")
+    parser.add_argument('--time-limit', type=float, default=None, help="seconds per move")
+    parser.add_argument('--time-margin', type=float, default=TIME_MARGIN,
+                        help="share of the time limit allowed over before a time forfeit (default: %(default)s)")
+    parser.add_argument('--max-plies', type=int, default=MAX_PLIES, help="adjudicate a draw after this many plies")
+    parser.add_argument('--seed', type=int, default=1, help="random seed for openings and engines")
+    parser.add_argument('--jsonl', help="write one JSON record per game ('-' for stdout)")
+    parser.add_argument('--pgn', help="write games as PGN ('-' for stdout)")
+    parser.add_argument('--sprt', nargs=2, type=float, metavar=('ELO0', 'ELO1'),
+                        help="stop once an SPRT between ELO0 and ELO1 is decided")
+    parser.add_argument('--alpha', type=float, default=0.05, help="SPRT false positive rate")
+    parser.add_argument('--beta', type=float, default=0.05, help="SPRT false negative rate")
+    args = parser.parse_args(argv)
+
+    try:
+        engine_a, engine_b = parse_engine(args.engine_a), parse_engine(args.engine_b)
+    except ValueError as error:
+        parser.error(str(error))
+    if engine_a['name'] == engine_b['name']:
+        engine_b['name'] += " (2)"
+    settings = {
+        'seed': args.seed,
+        'opening_plies': args.opening_plies,
+        'time_limit': args.time_limit,
+        'time_margin': args.time_margin,
+        'max_plies': args.max_plies
+    }
+    sprt = None
+    if args.sprt:
+        sprt = (args.sprt[0], args.sprt[1]) + sprt_bounds(args.alpha, args.beta)
+
+    jsonl_file = open_output(args.jsonl) if args.jsonl else None
+    pgn_file = open_output(args.pgn) if args.pgn else None
+    stats = MatchStats()
+    start = time.perf_counter()
+    try:
+        for record in run_match(engine_a, engine_b, args.games, settings, args.workers):
+            stats.add(record, engine_a['name'])
+            codes = record.pop('codes')
+            if jsonl_file:
+                jsonl_file.write(json.dumps(record) + "\n")
+                jsonl_file.flush()
+            if pgn_file:
+                tags = {"Event": "Arena", "Round": str(record['index'] + 1),
+                        "White": record['white'], "Black": record['black'],
+                        "Termination": record['termination']}
+                pgn_file.write(moves_to_pgn(codes, tags, result=record['result']) + "\n")
+                pgn_file.flush()
+            print(stats.summary(sprt), file=sys.stderr)
+            if sprt:
+                llr = stats.llr(sprt[0], sprt[1])
+                if llr <= sprt[2] or llr >= sprt[3]:
+                    print(f"SPRT {'accepted H1' if llr >= sprt[3] else 'accepted H0'}", file=sys.stderr)
+                    break
+    finally:
+        for output in (jsonl_file, pgn_file):
+            if output and output is not sys.stdout:
+                output.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"{stats.games} games in {elapsed:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""Vectorized evaluation of many positions at once with NumPy.
+
+Positions are encoded as an (N, 64) int8 array of piece codes (the same codes
+as PIECE_CODES, 0 for an empty square, square = row * 8 + col with row 0 being
+rank 8). evaluate_batch() scores the whole array with the weights in
+chess_game and returns exactly what ChessAI.evaluate() gives for each position.
+
+Usage:
+    python batch_eval.py positions.fen [--output scores.npy]
+"""
+import os
+import sys
+import time
+import argparse
+from functools import lru_cache
+
+import numpy as np
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import chess_game
+from chess_game import Color, PIECE_CODES, PIECE_CODE_INDEX, FEN_PIECES, NEIGHBOR_SQUARES, \
+    expand_fen_rank
+
+# Constants
+CHUNK_SIZE = 1024  # Positions evaluated per step, small enough to stay in cache
+SQUARES = np.arange(64, dtype=np.int16)
+
+# ADJACENCY[square, neighbor] is 1 for the up to 8 squares around each square
+ADJACENCY = np.zeros((64, 64), dtype=np.float32)
+for _square, _neighbors in enumerate(NEIGHBOR_SQUARES):
+    for _row, _col in _neighbors:
+        ADJACENCY[_square, _row * 8 + _col] = 1
+
+
+def build_tables():
+    """Get (square_values, mobility_weights) arrays from the current evaluation weights
+
+    square_values[code, square] is the signed material plus piece-square value
+    of a piece on a square; mobility_weights[code] is the signed bonus per empty
+    neighboring square. White is positive. The tables are read from chess_game
+    on every call so that weights loaded at startup are picked up.
+    """
+    square_values = np.zeros((len(PIECE_CODES), 64), dtype=np.int32)
+    mobility_weights = np.zeros(len(PIECE_CODES), dtype=np.int32)
+    for code, (color, piece_type) in enumerate(PIECE_CODES[1:], 1):
+        table = np.array(chess_game.PIECE_SQUARE_TABLES[piece_type], dtype=np.int32).reshape(8, 8)
+        if color == Color.BLACK:
+            # Black reads the table with the rows mirrored
+            table = table[::-1]
+        sign = 1 if color == Color.WHITE else -1
+        square_values[code] = sign * (chess_game.PIECE_VALUES[piece_type] + table.ravel())
+        mobility_weights[code] = sign * chess_game.MOBILITY_WEIGHTS[piece_type]
+    return square_values, mobility_weights
+
+
+def encode_boards(boards):
+    """Encode an iterable of ChessBoards as an (N, 64) int8 array of piece codes"""
+    data = b''.join(board.save_board_state()[0] for board in boards)
+    return np.frombuffer(data, dtype=np.int8).reshape(-1, 64).copy()
+
+
+@lru_cache(maxsize=4096)
+def encode_fen_rank(rank):
+    """Get the 8 piece codes of one FEN rank as bytes"""
+    return bytes(PIECE_CODE_INDEX[FEN_PIECES[symbol]] if symbol else 0 for symbol in expand_fen_rank(rank))
+
+
+def encode_fen(fen):
+    """Get the 64 piece codes of a FEN's piece placement as bytes"""
+    ranks = fen.split(None, 1)[0].split('/')
+    if len(ranks) != 8:
+        raise ValueError(f"Invalid FEN: {fen!r}")
+    try:
+        return b''.join(map(encode_fen_rank, ranks))
+    except ValueError:
+        raise ValueError(f"Invalid FEN: {fen!r}") from None
+
+
+def encode_fens(fens):
+    """Encode an iterable of FEN strings as an (N, 64) int8 array of piece codes
+
+    Only the piece placement is read, since that is all the evaluation uses.
+    """
+    data = b''.join(map(encode_fen, fens))
+    return np.frombuffer(data, dtype=np.int8).reshape(-1, 64).copy()
+
+
+def one_hot(codes):
+    """Expand (N, 64) piece codes into an (N, 12, 64) bool array of piece planes"""
+    codes = np.asarray(codes)
+    return codes[:, None, :] == np.arange(1, len(PIECE_CODES), dtype=codes.dtype)[None, :, None]
+
+
+def evaluate_batch(codes, tables=None, chunk_size=CHUNK_SIZE):
+    """Score (N, 64) piece codes in centipawns from White's point of view
+
+    Returns an int32 array equal to ChessAI.evaluate() for every position.
+    """
+    codes = np.asarray(codes, dtype=np.int8)
+    if codes.ndim != 2 or codes.shape[1] != 64:
+        raise ValueError(f"expected an (N, 64) array of piece codes, got shape {codes.shape}")
+    square_values, mobility_weights = tables or build_tables()
+    # Every intermediate is a small integer, so float32 arithmetic stays exact
+    flat_values = square_values.astype(np.float32).ravel()
+    mobility_weights = mobility_weights.astype(np.float32)
+    scores = np.empty(len(codes), dtype=np.int32)
+    for start in range(0, len(codes), chunk_size):
+        chunk = codes[start:start + chunk_size]
+        # Index the flattened table with code * 64 + square
+        index = chunk.astype(np.int16)
+        index <<= 6
+        index += SQUARES
+        values = np.take(flat_values, index)
+        # Each empty square earns the weights of the pieces around it
+        mobility = np.take(mobility_weights, chunk) @ ADJACENCY
+        mobility *= chunk == 0
+        values += mobility
+        scores[start:start + chunk_size] = values.sum(axis=1)
+    return scores
+
+
+def evaluate_fens(fens, tables=None):
+    """Score an iterable of FEN strings, see evaluate_batch()"""
+    return evaluate_batch(encode_fens(fens), tables)
+
+
+def evaluate_boards(boards, tables=None):
+    """Score an iterable of ChessBoards, see evaluate_batch()"""
+    return evaluate_batch(encode_boards(boards), tables)
+
+
+def read_fens(path):
+    """Get the FEN lines of a file, skipping blanks and '#' comments"""
+    with open(path) as lines:
+        return [line.strip() for line in lines if line.strip() and not line.startswith('#')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate a file of FEN positions in one batch")
+    parser.add_argument('fens', help="file with one FEN per line")
+    parser.add_argument('--output', help="save the scores to this .npy file instead of printing them")
+    args = parser.parse_args(argv)
+
+    fens = read_fens(args.fens)
+    start = time.perf_counter()
+    codes = encode_fens(fens)
+    encoded = time.perf_counter()
+    scores = evaluate_batch(codes)
+    finished = time.perf_counter()
+
+    if args.output:
+        np.save(args.output, scores)
+    else:
+        for fen, score in zip(fens, scores):
+            print(f"{score}\t{fen}")
+    print(f"{len(fens)} positions: encoded in {encoded - start:.3f}s, "
+          f"evaluated in {finished - encoded:.3f}s "
+          f"({len(fens) / max(finished - encoded, 1e-9):,.0f} positions/sec)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""Benchmarks for the rules engine, the AI and rendering.
+
+Usage:
+    python benchmark.py --save            # record a baseline in benchmark_baseline.json
+    python benchmark.py                   # compare against it, exit 1 on regressions
+    python benchmark.py --filter rules --threshold 0.1
+
+Every benchmark runs on fixed FEN positions with fixed random seeds and reports
+the best time per call over several repeats. Rendering uses SDL's offscreen
+"dummy" video driver, so no window is opened.
+"""
+import os
+import sys
+import json
+import random
+import time
+import timeit
+import argparse
+import platform
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from chess_game import ChessAI, ChessBoard, ChessGame, GameMode, STARTING_FEN
+
+# Constants
+BASELINE_PATH = "benchmark_baseline.json"
+THRESHOLD = 0.25  # Allowed slowdown against the baseline before failing (25%)
+REPEAT = 5
+MIN_RUN_TIME = 0.2  # Seconds each repeat should take, used to pick the call count
+SEED = 12345
+AI_SEARCH_DEPTH = 2  # Fixed depth for the expert benchmark
+
+POSITIONS = {
+    'opening': STARTING_FEN,
+    'middlegame': "r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP3PPP/R2QKB1R w KQ - 0 9",
+    'castling': "r3k2r/pppq1ppp/2npbn2/2b1p3/2B1P3/2NPBN2/PPPQ1PPP/R3K2R w KQkq - 4 9",
+    'endgame': "8/5pk1/6p1/3R4/5P2/6PK/r7/8 w - - 0 45",
+    'checkmated': "rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3"
+}
+# Moves replayed by the execute_move benchmark (a Ruy Lopez)
+OPENING_MOVES = [(6, 4, 4, 4), (1, 4, 3, 4), (7, 6, 5, 5), (0, 1, 2, 2), (7, 5, 3, 1), (1, 0, 2, 0),
+                 (3, 1, 4, 0), (0, 6, 2, 5), (7, 4, 7, 6), (0, 5, 1, 4), (7, 5, 7, 4), (1, 1, 3, 1),
+                 (4, 0, 5, 1), (1, 3, 2, 3), (6, 2, 5, 2), (0, 4, 0, 6)]
+
+
+def bench_get_valid_moves(fen):
+    board = ChessBoard.from_fen(fen)
+    pieces = board.get_all_pieces(board.current_player)
+    return lambda: [board.get_valid_moves(piece) for piece in pieces]
+
+
+def bench_is_in_check(fen):
+    board = ChessBoard.from_fen(fen)
+    return lambda: board.is_in_check(board.current_player)
+
+
+def bench_would_square_be_attacked(fen):
+    board = ChessBoard.from_fen(fen)
+    color = board.current_player
+
+    def run():
+        # Start cold so the attack map build is timed, not just the cached lookups
+        board.invalidate_attack_maps()
+        return [board.would_square_be_attacked(row, col, color) for row in range(8) for col in range(8)]
+    return run
+
+
+def bench_get_board_state(fen):
+    board = ChessBoard.from_fen(fen)
+    return board.get_board_state
+
+
+def bench_is_checkmate(fen):
+    board = ChessBoard.from_fen(fen)
+    return lambda: board.is_checkmate(board.current_player)
+
+
+def bench_execute_move():
+    board = ChessBoard()
+
+    def reset():
+        board.load_fen(STARTING_FEN)
+
+    def run():
+        for move in OPENING_MOVES:
+            board.execute_move(*move)
+    return run, reset
+
+
+def bench_ai_move(difficulty, fen):
+    board = ChessBoard.from_fen(fen)
+    ai = ChessAI(difficulty, depth=AI_SEARCH_DEPTH)
+
+    def run():
+        random.seed(SEED)
+        ai.transposition_table.clear()
+        return ai.get_move(board)
+    return run
+
+
+def bench_frame(fen):
+    game = ChessGame()
+    game.game_mode = GameMode.TWO_PLAYER
+    game.board = ChessBoard.from_fen(fen)
+
+    def run():
+        game.draw_board()
+        game.draw_pieces()
+        game.draw_game_info()
+    return run
+
+
+def build_benchmarks():
+    """Get {name: zero-argument callable} for every benchmark"""
+    benchmarks = {}
+    for name, fen in POSITIONS.items():
+        benchmarks[f"rules.get_valid_moves[{name}]"] = lambda fen=fen: bench_get_valid_moves(fen)
+        benchmarks[f"rules.is_in_check[{name}]"] = lambda fen=fen: bench_is_in_check(fen)
+        benchmarks[f"rules.would_square_be_attacked[{name}]"] = lambda fen=fen: bench_would_square_be_attacked(fen)
+        benchmarks[f"rules.get_board_state[{name}]"] = lambda fen=fen: bench_get_board_state(fen)
+        benchmarks[f"rules.is_checkmate[{name}]"] = lambda fen=fen: bench_is_checkmate(fen)
+    benchmarks["rules.execute_move[opening_16_plies]"] = bench_execute_move
+    for difficulty in ("easy", "medium", "hard", "expert"):
+        benchmarks[f"ai.get_move[{difficulty}]"] = \
+            lambda difficulty=difficulty: bench_ai_move(difficulty, POSITIONS['middlegame'])
+    benchmarks["render.frame[middlegame]"] = lambda: bench_frame(POSITIONS['middlegame'])
+    return benchmarks
+
+
+def time_calls(function, reset, number):
+    """Get the total seconds of number calls, running reset untimed before each"""
+    total = 0.0
+    for _ in range(number):
+        reset()
+        start = time.perf_counter()
+        function()
+        total += time.perf_counter() - start
+    return total
+
+
+def measure(function, repeat=REPEAT, reset=None):
+    """Get the best seconds per call of a function over several timed repeats
+
+    If reset is given it is called before every call, outside the timing.
+    """
+    if reset:
+        number = 1
+        while time_calls(function, reset, number) < MIN_RUN_TIME:
+            number *= 2
+        return min(time_calls(function, reset, number) for _ in range(repeat)) / number
+    timer = timeit.Timer(function)
+    number, elapsed = timer.autorange()
+    if elapsed < MIN_RUN_TIME:
+        number = max(1, int(number * MIN_RUN_TIME / max(elapsed, 1e-9)))
+    return min(timer.repeat(repeat, number)) / number
+
+
+def run_benchmarks(name_filter=None, repeat=REPEAT):
+    """Run the selected benchmarks and return {name: seconds_per_call}"""
+    results = {}
+    for name, setup in build_benchmarks().items():
+        if name_filter and name_filter not in name:
+            continue
+        # Setups return the timed callable, or (callable, untimed reset) when each call needs a fresh state
+        function, reset = setup(), None
+        if isinstance(function, tuple):
+            function, reset = function
+        results[name] = measure(function, repeat, reset)
+        print(f"{name:50} {results[name] * 1e6:12.1f} us", file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Get a list of (name, baseline, current, ratio) for benchmarks slower than allowed"""
+    regressions = []
+    for name, seconds in results.items():
+        previous = baseline.get(name)
+        if previous and seconds > previous * (1 + threshold):
+            regressions.append((name, previous, seconds, seconds / previous))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the chess rules, AI and rendering")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="baseline JSON file")
+    parser.add_argument('--save', action='store_true', help="write the results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help="fail when a benchmark is slower than baseline by this fraction")
+    parser.add_argument('--filter', help="only run benchmarks whose name contains this text")
+    parser.add_argument('--repeat', type=int, default=REPEAT, help="timed repeats per benchmark")
+    parser.add_argument('--output', help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.filter, args.repeat)
+    document = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(document, output, indent=2, sort_keys=True)
+
+    if args.save:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as baseline_file:
+                baseline = json.load(baseline_file).get('results', {})
+        baseline.update(results)
+        document['results'] = baseline
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(document, baseline_file, indent=2, sort_keys=True)
+        print(f"Saved {len(results)} results to {args.baseline}", file=sys.stderr)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save to create one", file=sys.stderr)
+        return 0
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file).get('results', {})
+    regressions = compare(results, baseline, args.threshold)
+    for name, previous, seconds, ratio in regressions:
+        print(f"REGRESSION {name}: {previous * 1e6:.1f} us -> {seconds * 1e6:.1f} us ({ratio:.2f}x)")
+    if regressions:
+        return 1
+    print(f"{len(results)} benchmarks within {args.threshold:.0%} of baseline", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,17 @@
 import pygame
 import sys
 import os
+import json
 from enum import Enum
+from array import array
+from functools import lru_cache
 import random
+import threading
+import queue
+import time
+import argparse
+
+from analysis_cache import AnalysisCache
 
 # Initialize Pygame
 pygame.init()
@@ -25,6 +34,19 @@ RED = (255, 0, 0)
 BLUE = (0, 0, 255)
 GRAY = (128, 128, 128)
 
+# Move history
+CHECKPOINT_INTERVAL = 16  # Plies between full board snapshots
+SCRUB_STEP = 10  # Plies skipped by the up/down arrow keys
+ANALYSIS_LINES = 3  # Best moves shown in analysis mode
+ANALYSIS_TIME = 10.0  # Seconds spent on each position in analysis mode
+PIECE_IMAGE_SIZE = SQUARE_SIZE - 10
+PIECE_MANIFEST = os.path.join("assets", "pieces.json")  # Sprite atlas index written by create_pieces.py
+
+# Computer opponent
+DIFFICULTY_KEYS = {pygame.K_e: "easy", pygame.K_m: "medium", pygame.K_h: "hard", pygame.K_x: "expert"}
+EXPERT_MOVE_TIME = 2.0  # Seconds the expert AI thinks per move
+ANALYSIS_CACHE_ENV = "CHESS_ANALYSIS_CACHE"  # Default path of the expert AI's persistent cache
+
 class PieceType(Enum):
     KING = "king"
     QUEEN = "queen"
@@ -33,15 +55,145 @@ class PieceType(Enum):
     KNIGHT = "knight"
     PAWN = "pawn"
 
+    # Members are singletons, so identity hashing is safe and much faster than Enum's default
+    __hash__ = object.__hash__
+
 class Color(Enum):
     WHITE = "white"
     BLACK = "black"
 
+    __hash__ = object.__hash__
+
 class GameMode(Enum):
     TWO_PLAYER = "two_player"
     VS_COMPUTER = "vs_computer"
 
+# Compact piece codes used by board snapshots (0 means empty square)
+PIECE_CODES = [None] + [(color, piece_type) for color in Color for piece_type in PieceType]
+PIECE_CODE_INDEX = {key: code for code, key in enumerate(PIECE_CODES) if key}
+
+# FEN notation
+STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+PIECE_LETTERS = {
+    PieceType.KING: 'k',
+    PieceType.QUEEN: 'q',
+    PieceType.ROOK: 'r',
+    PieceType.BISHOP: 'b',
+    PieceType.KNIGHT: 'n',
+    PieceType.PAWN: 'p'
+}
+FEN_SYMBOLS = {(color, piece_type): letter.upper() if color == Color.WHITE else letter
+               for piece_type, letter in PIECE_LETTERS.items() for color in Color}
+FEN_PIECES = {symbol: key for key, symbol in FEN_SYMBOLS.items()}
+FEN_PIECE_CODES = {symbol: PIECE_CODE_INDEX[key] for symbol, key in FEN_PIECES.items()}
+CASTLING_SQUARES = {'K': (7, 7), 'Q': (7, 0), 'k': (0, 7), 'q': (0, 0)}  # Rook square per right
+SQUARE_NAMES = [f"{'abcdefgh'[square % 8]}{8 - square // 8}" for square in range(64)]
+
+# Material signatures pack the count of each piece code into 4 bits
+MATERIAL_UNITS = [0] + [1 << (4 * (code - 1)) for code in range(1, len(PIECE_CODES))]
+WHITE_KNIGHT, BLACK_KNIGHT = (PIECE_CODE_INDEX[(color, PieceType.KNIGHT)] for color in Color)
+WHITE_BISHOP, BLACK_BISHOP = (PIECE_CODE_INDEX[(color, PieceType.BISHOP)] for color in Color)
+WHITE_KING, BLACK_KING = (PIECE_CODE_INDEX[(color, PieceType.KING)] for color in Color)
+# Pawns, rooks and queens can always force or help a mate
+MATING_MATERIAL_MASK = sum(0xF * MATERIAL_UNITS[PIECE_CODE_INDEX[(color, piece_type)]]
+                           for color in Color for piece_type in (PieceType.PAWN, PieceType.ROOK, PieceType.QUEEN))
+
+def material_signature(white, black):
+    """Get the material signature of piece letters per side, e.g. material_signature("KR", "K")"""
+    signature = 0
+    for letters, color in ((white, Color.WHITE), (black, Color.BLACK)):
+        for letter in letters.upper():
+            signature += MATERIAL_UNITS[PIECE_CODE_INDEX[FEN_PIECES[letter if color == Color.WHITE
+                                                                      else letter.lower()]]]
+    return signature
+
+# Movement patterns
+KNIGHT_OFFSETS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
+KING_OFFSETS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+ROOK_DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+BISHOP_DIRECTIONS = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+
+def _square_targets(row, col, offsets):
+    """Get the squares (as row * 8 + col) reached from a square by single steps"""
+    return [(row + row_step) * 8 + col + col_step for row_step, col_step in offsets
+            if 0 <= row + row_step < 8 and 0 <= col + col_step < 8]
+
+def _square_rays(row, col, directions):
+    """Get the squares along each direction from a square, nearest first"""
+    rays = []
+    for row_step, col_step in directions:
+        ray = []
+        r, c = row + row_step, col + col_step
+        while 0 <= r < 8 and 0 <= c < 8:
+            ray.append(r * 8 + c)
+            r += row_step
+            c += col_step
+        if ray:
+            rays.append(ray)
+    return rays
+
+# Attack tables indexed by square, used to build attack maps
+KNIGHT_ATTACKS = [_square_targets(square // 8, square % 8, KNIGHT_OFFSETS) for square in range(64)]
+KING_ATTACKS = [_square_targets(square // 8, square % 8, KING_OFFSETS) for square in range(64)]
+PAWN_ATTACKS = {
+    Color.WHITE: [_square_targets(square // 8, square % 8, [(-1, -1), (-1, 1)]) for square in range(64)],
+    Color.BLACK: [_square_targets(square // 8, square % 8, [(1, -1), (1, 1)]) for square in range(64)]
+}
+ROOK_RAYS = [_square_rays(square // 8, square % 8, ROOK_DIRECTIONS) for square in range(64)]
+BISHOP_RAYS = [_square_rays(square // 8, square % 8, BISHOP_DIRECTIONS) for square in range(64)]
+QUEEN_RAYS = [ROOK_RAYS[square] + BISHOP_RAYS[square] for square in range(64)]
+
+def _through_lines(row, col):
+    """Get (ray, opposite ray, slider types) for each direction with squares on both sides of a square"""
+    lines = []
+    for directions, sliders in ((ROOK_DIRECTIONS, (PieceType.ROOK, PieceType.QUEEN)),
+                                (BISHOP_DIRECTIONS, (PieceType.BISHOP, PieceType.QUEEN))):
+        for row_step, col_step in directions:
+            ray = _square_rays(row, col, [(row_step, col_step)])
+            opposite = _square_rays(row, col, [(-row_step, -col_step)])
+            if ray and opposite:
+                lines.append((ray[0], opposite[0], sliders))
+    return lines
+
+# A slider found first along a ray from a square attacks through it along the opposite ray
+THROUGH_LINES = [_through_lines(square // 8, square % 8) for square in range(64)]
+
+# Zobrist keys for hashing positions (fixed seed so keys match across processes)
+_zobrist_random = random.Random(2024)
+ZOBRIST_PIECES = [[_zobrist_random.getrandbits(64) for _ in range(64)] for _ in PIECE_CODES]
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(64)
+ZOBRIST_CASTLING = {symbol: _zobrist_random.getrandbits(64) for symbol in CASTLING_SQUARES}
+ZOBRIST_EN_PASSANT = [_zobrist_random.getrandbits(64) for _ in range(8)]
+
+@lru_cache(maxsize=4096)
+def expand_fen_rank(rank):
+    """Expand one FEN rank into a tuple of 8 piece symbols (None for empty squares)"""
+    symbols = []
+    for char in rank:
+        if char in '12345678':
+            symbols.extend([None] * int(char))
+        elif char in FEN_PIECES:
+            symbols.append(char)
+        else:
+            raise ValueError(f"Invalid FEN rank: {rank!r}")
+    if len(symbols) != 8:
+        raise ValueError(f"Invalid FEN rank: {rank!r}")
+    return tuple(symbols)
+
+def encode_move(from_row, from_col, to_row, to_col):
+    """Pack a move into a 16-bit integer (6 bits per square)"""
+    return (from_row * 8 + from_col) | ((to_row * 8 + to_col) << 6)
+
+def decode_move(code):
+    """Unpack a 16-bit move into (from_row, from_col, to_row, to_col)"""
+    from_square = code & 0x3F
+    to_square = (code >> 6) & 0x3F
+    return from_square // 8, from_square % 8, to_square // 8, to_square % 8
+
 class Piece:
+    _image_cache = {}  # Shared images keyed by (color, type)
+    _atlas_sprites = None  # Sprites of the atlas at PIECE_IMAGE_SIZE keyed by "color_type", loaded once
+
     def __init__(self, piece_type, color, row, col):
         self.type = piece_type
         self.color = color
@@ -52,30 +204,83 @@ class Piece:
         self.load_image()
     
     def load_image(self):
-        """Load piece image from assets folder"""
+        """Load piece image, sharing one surface per color and type"""
+        key = (self.color, self.type)
+        if key not in Piece._image_cache:
+            Piece._image_cache[key] = self.create_image()
+        self.image = Piece._image_cache[key]
+    
+    @classmethod
+    def load_atlas(cls, manifest_path=PIECE_MANIFEST, size=PIECE_IMAGE_SIZE):
+        """Load the sprite atlas once and slice out the sprites drawn at the given size"""
+        if cls._atlas_sprites is None:
+            cls._atlas_sprites = {}
+            try:
+                with open(manifest_path) as manifest_file:
+                    manifest = json.load(manifest_file)
+                sprites = manifest['sprites'].get(str(size))
+                if sprites:
+                    atlas = pygame.image.load(os.path.join(os.path.dirname(manifest_path), manifest['image']))
+                    cls._atlas_sprites = {name: atlas.subsurface(rect) for name, rect in sprites.items()}
+            except (OSError, ValueError, KeyError, pygame.error):
+                pass  # No usable atlas, so create_image() falls back to single images
+        return cls._atlas_sprites
+    
+    def create_image(self):
+        """Create piece image from the sprite atlas, or the assets folder without one"""
+        sprite = Piece.load_atlas().get(f"{self.color.value}_{self.type.value}")
+        if sprite:
+            return sprite
         try:
             filename = f"{self.color.value}_{self.type.value}.png"
             image_path = os.path.join("assets", filename)
             if os.path.exists(image_path):
-                self.image = pygame.image.load(image_path)
-                self.image = pygame.transform.scale(self.image, (SQUARE_SIZE - 10, SQUARE_SIZE - 10))
+                image = pygame.image.load(image_path)
+                image = pygame.transform.scale(image, (PIECE_IMAGE_SIZE, PIECE_IMAGE_SIZE))
             else:
                 # Create a simple colored circle if image not found
-                self.image = pygame.Surface((SQUARE_SIZE - 10, SQUARE_SIZE - 10))
+                image = pygame.Surface((PIECE_IMAGE_SIZE, PIECE_IMAGE_SIZE))
                 color = (255, 255, 255) if self.color == Color.WHITE else (0, 0, 0)
-                pygame.draw.circle(self.image, color, (SQUARE_SIZE//2 - 5, SQUARE_SIZE//2 - 5), 20)
+                pygame.draw.circle(image, color, (SQUARE_SIZE//2 - 5, SQUARE_SIZE//2 - 5), 20)
                 # Add text for piece type
                 font = pygame.font.Font(None, 24)
                 text = font.render(self.type.value[0].upper(), True, (255, 0, 0))
-                self.image.blit(text, (SQUARE_SIZE//2 - 10, SQUARE_SIZE//2 - 10))
+                image.blit(text, (SQUARE_SIZE//2 - 10, SQUARE_SIZE//2 - 10))
         except:
             # Fallback to simple representation
-            self.image = pygame.Surface((SQUARE_SIZE - 10, SQUARE_SIZE - 10))
+            image = pygame.Surface((PIECE_IMAGE_SIZE, PIECE_IMAGE_SIZE))
             color = (255, 255, 255) if self.color == Color.WHITE else (0, 0, 0)
-            pygame.draw.circle(self.image, color, (SQUARE_SIZE//2 - 5, SQUARE_SIZE//2 - 5), 20)
+            pygame.draw.circle(image, color, (SQUARE_SIZE//2 - 5, SQUARE_SIZE//2 - 5), 20)
             font = pygame.font.Font(None, 24)
             text = font.render(self.type.value[0].upper(), True, (255, 0, 0))
-            self.image.blit(text, (SQUARE_SIZE//2 - 10, SQUARE_SIZE//2 - 10))
+            image.blit(text, (SQUARE_SIZE//2 - 10, SQUARE_SIZE//2 - 10))
+        return image
+
+class MoveHistory:
+    """Compact move list with a full board checkpoint every few plies"""
+    def __init__(self, initial_state, checkpoint_interval=CHECKPOINT_INTERVAL):
+        self.moves = array('H')  # One packed 16-bit move per ply
+        self.checkpoints = [initial_state]  # checkpoints[i] is the position after ply i * interval
+        self.checkpoint_interval = checkpoint_interval
+    
+    def __len__(self):
+        return len(self.moves)
+    
+    def record(self, move_code, board):
+        """Append a move, snapshotting the board when a checkpoint is due"""
+        self.moves.append(move_code)
+        if len(self.moves) % self.checkpoint_interval == 0:
+            self.checkpoints.append(board.save_board_state())
+    
+    def truncate(self, ply):
+        """Drop every move after the given ply"""
+        del self.moves[ply:]
+        del self.checkpoints[ply // self.checkpoint_interval + 1:]
+    
+    def nearest_checkpoint(self, ply):
+        """Get (checkpoint_ply, state) for the last checkpoint at or before ply"""
+        index = ply // self.checkpoint_interval
+        return index * self.checkpoint_interval, self.checkpoints[index]
 
 class ChessBoard:
     def __init__(self):
@@ -91,11 +296,22 @@ class ChessBoard:
         self.stalemate = False
         self.last_move = None  # For en passant
         self.move_history = []  # For castling and game history
-        self.move_count = 0  # For fifty-move rule
-        self.position_history = []  # For threefold repetition
-        self.move_states = []  # For move navigation
-        self.current_move_index = -1  # For move navigation
+        self.move_count = 0  # Halfmove clock for fifty-move rule
+        self.fullmove_number = 1  # For FEN
+        self.position_history = array('Q')  # Zobrist key of the position at each ply, for threefold repetition
+        self._attack_maps = None  # Attacker counts per side, built on demand and updated by apply/undo_move
         self.setup_board()
+        self.recount_material()
+        self.position_history.append(self.position_key())
+        self._history = MoveHistory(self.save_board_state())  # For move navigation
+        self.current_ply = 0  # Ply currently shown on the board
+    
+    @property
+    def history(self):
+        """MoveHistory of the game, started from the current position if a bulk load skipped it"""
+        if self._history is None:
+            self._history = MoveHistory(self.save_board_state())
+        return self._history
     
     def setup_board(self):
         """Initialize the chess board with pieces"""
@@ -127,6 +343,8 @@ class ChessBoard:
             piece.has_moved = True
             self.board[to_row][to_col] = piece
             self.board[from_row][from_col] = None
+            self._attack_maps = None
+            self.recount_material()
             return True
         return False
     
@@ -226,15 +444,48 @@ class ChessBoard:
         col_diff = abs(from_col - to_col)
         return (row_diff == 2 and col_diff == 1) or (row_diff == 1 and col_diff == 2)
     
+    def get_candidate_squares(self, piece):
+        """Get the squares a piece could reach by its movement pattern, in board order"""
+        row, col = piece.row, piece.col
+        squares = []
+        if piece.type == PieceType.PAWN:
+            direction = -1 if piece.color == Color.WHITE else 1
+            to_row = row + direction
+            if 0 <= to_row < 8:
+                squares.extend((to_row, to_col) for to_col in (col - 1, col, col + 1) if 0 <= to_col < 8)
+                if 0 <= to_row + direction < 8:
+                    squares.append((to_row + direction, col))
+        elif piece.type in (PieceType.KNIGHT, PieceType.KING):
+            offsets = KNIGHT_OFFSETS if piece.type == PieceType.KNIGHT else KING_OFFSETS
+            for row_step, col_step in offsets:
+                to_row, to_col = row + row_step, col + col_step
+                if 0 <= to_row < 8 and 0 <= to_col < 8:
+                    squares.append((to_row, to_col))
+        else:
+            directions = []
+            if piece.type in (PieceType.ROOK, PieceType.QUEEN):
+                directions += ROOK_DIRECTIONS
+            if piece.type in (PieceType.BISHOP, PieceType.QUEEN):
+                directions += BISHOP_DIRECTIONS
+            for row_step, col_step in directions:
+                to_row, to_col = row + row_step, col + col_step
+                while 0 <= to_row < 8 and 0 <= to_col < 8:
+                    squares.append((to_row, to_col))
+                    if self.board[to_row][to_col]:
+                        break
+                    to_row += row_step
+                    to_col += col_step
+        squares.sort()
+        return squares
+
     def get_valid_moves(self, piece):
         """Get all valid moves for a piece that don't put own king in check"""
         valid_moves = []
-        for row in range(8):
-            for col in range(8):
-                if self.is_valid_move(piece, row, col):
-                    # Check if this move would put own king in check
-                    if not self.would_be_in_check_after_move(piece, row, col):
-                        valid_moves.append((row, col))
+        for row, col in self.get_candidate_squares(piece):
+            if self.is_valid_move(piece, row, col):
+                # Check if this move would put own king in check
+                if not self.would_be_in_check_after_move(piece, row, col):
+                    valid_moves.append((row, col))
         
         # Add castling moves for king
         if piece.type == PieceType.KING and not piece.has_moved:
@@ -259,8 +510,10 @@ class ChessBoard:
         self.board[from_row][from_col] = None
         piece.row, piece.col = to_row, to_col
         
-        # Check if king is in check
-        in_check = self.is_in_check(piece.color)
+        # The attack maps describe the position before this trial move, so scan from the king
+        king_pos = (to_row, to_col) if piece.type == PieceType.KING else find_king(self, piece.color)
+        opponent_color = Color.BLACK if piece.color == Color.WHITE else Color.WHITE
+        in_check = king_pos is not None and self.is_square_attacked(king_pos[0], king_pos[1], opponent_color)
         
         # Restore original state
         self.board[from_row][from_col] = piece
@@ -272,23 +525,27 @@ class ChessBoard:
     def get_castling_moves(self, king):
         """Get valid castling moves for the king"""
         moves = []
-        if king.has_moved or self.is_in_check(king.color):
+        if king.has_moved:
+            return moves
+        opponent_color = Color.BLACK if king.color == Color.WHITE else Color.WHITE
+        attacks = self.get_attack_map(opponent_color)
+        row_start = king.row * 8
+        # The king may not castle out of, through or into check
+        if attacks[row_start + king.col]:
             return moves
             
         # Check kingside castling
         if not self.board[king.row][5] and not self.board[king.row][6]:
             rook = self.board[king.row][7]
             if rook and rook.type == PieceType.ROOK and not rook.has_moved:
-                if not any(self.would_square_be_attacked(king.row, col, king.color) 
-                          for col in range(4, 7)):
+                if not any(attacks[row_start + col] for col in range(4, 7)):
                     moves.append((king.row, 6))
                     
         # Check queenside castling
         if not self.board[king.row][1] and not self.board[king.row][2] and not self.board[king.row][3]:
             rook = self.board[king.row][0]
             if rook and rook.type == PieceType.ROOK and not rook.has_moved:
-                if not any(self.would_square_be_attacked(king.row, col, king.color) 
-                          for col in range(2, 5)):
+                if not any(attacks[row_start + col] for col in range(2, 5)):
                     moves.append((king.row, 2))
                     
         return moves
@@ -296,14 +553,100 @@ class ChessBoard:
     def would_square_be_attacked(self, row, col, defending_color):
         """Check if a square would be attacked by the opponent"""
         opponent_color = Color.BLACK if defending_color == Color.WHITE else Color.WHITE
-        
-        for r in range(8):
-            for c in range(8):
-                piece = self.board[r][c]
-                if piece and piece.color == opponent_color:
-                    if self.is_valid_move(piece, row, col):
-                        return True
-        return False
+        return self.get_attack_map(opponent_color)[row * 8 + col] > 0
+    
+    def get_attack_map(self, color):
+        """Get a list of 64 counts of the pieces of a color attacking each square
+
+        The maps for both sides are built together on first use. From then on
+        apply_move() and undo_move() update only the squares a move changes, so
+        queries during a search are lookups.
+        """
+        if self._attack_maps is None:
+            self._attack_maps = self.compute_attack_maps()
+        return self._attack_maps[color]
+    
+    def invalidate_attack_maps(self):
+        """Drop cached attack maps after changing self.board directly"""
+        self._attack_maps = None
+    
+    def compute_attack_maps(self):
+        """Count the attackers of every square for both sides
+
+        Sliders attack up to and including the first occupied square on each
+        ray; pawns only attack diagonally.
+        """
+        maps = {Color.WHITE: [0] * 64, Color.BLACK: [0] * 64}
+        for row, board_row in enumerate(self.board):
+            for col, piece in enumerate(board_row):
+                if piece:
+                    self.add_attacks(piece, row * 8 + col, maps[piece.color], 1)
+        return maps
+    
+    def add_attacks(self, piece, square, counts, change):
+        """Add change to the counts of the squares a piece on square attacks"""
+        piece_type = piece.type
+        if piece_type == PieceType.PAWN:
+            targets = PAWN_ATTACKS[piece.color][square]
+        elif piece_type == PieceType.KNIGHT:
+            targets = KNIGHT_ATTACKS[square]
+        elif piece_type == PieceType.KING:
+            targets = KING_ATTACKS[square]
+        else:
+            board = self.board
+            rays = ROOK_RAYS if piece_type == PieceType.ROOK else \
+                BISHOP_RAYS if piece_type == PieceType.BISHOP else QUEEN_RAYS
+            for ray in rays[square]:
+                for target in ray:
+                    counts[target] += change
+                    if board[target >> 3][target & 7]:
+                        break
+            return
+        for target in targets:
+            counts[target] += change
+    
+    def set_square(self, row, col, piece):
+        """Put a piece (or None) on a square, updating the attack maps if they are built
+
+        Besides the attacks of the pieces leaving and arriving, emptying or
+        filling a square lengthens or shortens the rays of sliders passing
+        through it.
+        """
+        board_row = self.board[row]
+        old = board_row[col]
+        maps = self._attack_maps
+        if maps is None or old is piece:
+            board_row[col] = piece
+            return
+        square = row * 8 + col
+        if old:
+            self.add_attacks(old, square, maps[old.color], -1)
+        if not piece:
+            board_row[col] = None
+            self.update_lines_through(square, maps, 1)
+            return
+        if not old:
+            self.update_lines_through(square, maps, -1)
+        board_row[col] = piece
+        self.add_attacks(piece, square, maps[piece.color], 1)
+    
+    def update_lines_through(self, square, maps, change):
+        """Add change to the squares sliders attack beyond square, which is empty for change=1"""
+        board = self.board
+        for ray, opposite, sliders in THROUGH_LINES[square]:
+            for target in ray:
+                slider = board[target >> 3][target & 7]
+                if slider:
+                    break
+            else:
+                continue
+            if slider.type not in sliders:
+                continue
+            counts = maps[slider.color]
+            for target in opposite:
+                counts[target] += change
+                if board[target >> 3][target & 7]:
+                    break
     
     def get_en_passant_moves(self, pawn):
         """Get valid en passant moves for a pawn"""
@@ -320,21 +663,53 @@ class ChessBoard:
             # Check if this pawn is adjacent to the last moved pawn
             if abs(pawn.col - last_to[1]) == 1 and pawn.row == last_to[0]:
                 direction = -1 if pawn.color == Color.WHITE else 1
-                moves.append((last_to[0] + direction, last_to[1]))
+                # Both pawns leave the rank, which can expose the king along it
+                captured = self.board[last_to[0]][last_to[1]]
+                self.board[last_to[0]][last_to[1]] = None
+                exposed = self.would_be_in_check_after_move(pawn, last_to[0] + direction, last_to[1])
+                self.board[last_to[0]][last_to[1]] = captured
+                if not exposed:
+                    moves.append((last_to[0] + direction, last_to[1]))
         
         return moves
     
     def execute_move(self, from_row, from_col, to_row, to_col):
         """Execute a move with all special rules"""
-        # Save state before move
-        self.move_states = self.move_states[:self.current_move_index + 1]
-        self.move_states.append(self.save_board_state())
-        self.current_move_index = len(self.move_states) - 1
-
         piece = self.board[from_row][from_col]
         if not piece:
             return False
 
+        # Moving from an earlier ply replaces the rest of the game
+        if self.current_ply < len(self.history):
+            self.history.truncate(self.current_ply)
+            del self.position_history[self.current_ply + 1:]
+        if not self.position_history:
+            # Bulk loads leave the starting position's key to the first move
+            self.position_history.append(self.position_key())
+
+        self.apply_move(from_row, from_col, to_row, to_col)
+        self.current_ply += 1
+        self.history.record(encode_move(from_row, from_col, to_row, to_col), self)
+            
+        # Update position history for threefold repetition
+        self.position_history.append(self.position_key())
+        
+        self.update_game_status()
+        return True
+    
+    def apply_move(self, from_row, from_col, to_row, to_col):
+        """Move pieces and switch player without history or game over checks
+
+        Returns an undo record that undo_move() uses to take the move back.
+        """
+        piece = self.board[from_row][from_col]
+        captured = self.board[to_row][to_col]
+        captured_row = to_row
+        # Halfmove clock resets on pawn moves and captures (including en passant)
+        resets_clock = piece.type == PieceType.PAWN or captured is not None
+        undo_info = [piece, from_row, from_col, to_row, to_col, None, to_row, to_col, piece.has_moved, None,
+                     self.last_move, self.move_count, self.fullmove_number]
+
         # Save move for en passant
         self.last_move = (piece, (from_row, from_col), (to_row, to_col))
         
@@ -344,44 +719,94 @@ class ChessBoard:
             rook_col = 0 if to_col < from_col else 7
             new_rook_col = 3 if to_col < from_col else 5
             rook = self.board[from_row][rook_col]
+            undo_info[9] = (rook, rook_col, new_rook_col, rook.has_moved if rook else False)
             
             # Move rook
-            self.board[from_row][new_rook_col] = rook
-            self.board[from_row][rook_col] = None
+            self.set_square(from_row, rook_col, None)
+            self.set_square(from_row, new_rook_col, rook)
             if rook:
                 rook.col = new_rook_col
                 rook.has_moved = True
 
         # Handle en passant capture
-        if piece.type == PieceType.PAWN and abs(from_col - to_col) == 1 and not self.board[to_row][to_col]:
-            captured_pawn_row = from_row
-            self.board[captured_pawn_row][to_col] = None
+        if piece.type == PieceType.PAWN and abs(from_col - to_col) == 1 and not captured:
+            captured_row = from_row
+            captured = self.board[captured_row][to_col]
+            self.set_square(captured_row, to_col, None)
+        undo_info[5] = captured
+        undo_info[6] = captured_row
+        if captured:
+            self.count_material(captured, captured_row, to_col, -1)
 
         # Handle pawn promotion
         if piece.type == PieceType.PAWN and (to_row == 0 or to_row == 7):
-            self.board[from_row][from_col] = None
-            self.board[to_row][to_col] = Piece(PieceType.QUEEN, piece.color, to_row, to_col)
+            self.set_square(from_row, from_col, None)
+            self.set_square(to_row, to_col, Piece(PieceType.QUEEN, piece.color, to_row, to_col))
+            self.count_material(piece, from_row, from_col, -1)
             piece = self.board[to_row][to_col]
+            self.count_material(piece, to_row, to_col, 1)
         else:
             # Regular move
-            self.board[to_row][to_col] = piece
-            self.board[from_row][from_col] = None
+            self.set_square(to_row, to_col, piece)
+            self.set_square(from_row, from_col, None)
             piece.row = to_row
             piece.col = to_col
 
         piece.has_moved = True
         
         # Update move count for fifty-move rule
-        if piece.type == PieceType.PAWN or self.board[to_row][to_col]:
+        if resets_clock:
             self.move_count = 0
         else:
             self.move_count += 1
-            
-        # Update position history for threefold repetition
-        self.position_history.append(self.get_board_state())
         
         # Switch player
+        if self.current_player == Color.BLACK:
+            self.fullmove_number += 1
         self.current_player = Color.BLACK if self.current_player == Color.WHITE else Color.WHITE
+        return undo_info
+    
+    def undo_move(self, undo_info):
+        """Take back a move made with apply_move()"""
+        (piece, from_row, from_col, to_row, to_col, captured, captured_row, captured_col, had_moved,
+         castling_rook, last_move, move_count, fullmove_number) = undo_info
+        
+        promoted = self.board[to_row][to_col]
+        if promoted is not piece:
+            self.count_material(promoted, to_row, to_col, -1)
+            self.count_material(piece, from_row, from_col, 1)
+        if captured and captured_row == to_row:
+            self.set_square(to_row, to_col, captured)
+        else:
+            self.set_square(to_row, to_col, None)
+            if captured:
+                self.set_square(captured_row, captured_col, captured)
+        if captured:
+            self.count_material(captured, captured_row, captured_col, 1)
+        # A promoted pawn never left its square, so this also undoes promotion
+        self.set_square(from_row, from_col, piece)
+        piece.row, piece.col = from_row, from_col
+        piece.has_moved = had_moved
+        
+        if castling_rook:
+            rook, rook_col, new_rook_col, rook_had_moved = castling_rook
+            self.set_square(from_row, new_rook_col, None)
+            self.set_square(from_row, rook_col, rook)
+            if rook:
+                rook.col = rook_col
+                rook.has_moved = rook_had_moved
+        
+        self.last_move = last_move
+        self.move_count = move_count
+        self.fullmove_number = fullmove_number
+        self.current_player = piece.color
+    
+    def update_game_status(self):
+        """Recompute check, checkmate, stalemate and draw flags for the current position"""
+        self.checkmate = False
+        self.stalemate = False
+        self.game_over = False
+        self.winner = None
         
         # Check for check, checkmate, and stalemate
         self.in_check = self.is_in_check(self.current_player)
@@ -398,8 +823,42 @@ class ChessBoard:
         if self.check_threefold_repetition() or self.check_fifty_move_rule() or self.check_insufficient_material():
             self.game_over = True
             self.stalemate = True
-            
-        return True
+    
+    def go_to_ply(self, ply):
+        """Show the position after the given ply, replaying from the nearest checkpoint"""
+        ply = max(0, min(ply, len(self.history)))
+        start, state = self.history.nearest_checkpoint(ply)
+        # Stepping forward is cheaper from the position already on the board
+        if start <= self.current_ply <= ply:
+            start = self.current_ply
+        else:
+            self.load_board_state(state)
+        for code in self.history.moves[start:ply]:
+            self.apply_move(*decode_move(code))
+        
+        self.current_ply = ply
+        self.selected_piece = None
+        self.selected_pos = None
+        self.valid_moves = []
+        self.update_game_status()
+    
+    def step_back(self):
+        """Show the previous ply"""
+        if self.current_ply > 0:
+            self.go_to_ply(self.current_ply - 1)
+    
+    def step_forward(self):
+        """Show the next ply"""
+        if self.current_ply < len(self.history):
+            self.go_to_ply(self.current_ply + 1)
+    
+    def go_to_start(self):
+        """Show the starting position"""
+        self.go_to_ply(0)
+    
+    def go_to_end(self):
+        """Show the latest position"""
+        self.go_to_ply(len(self.history))
     
     def is_checkmate(self, color):
         """Check if the given color is in checkmate"""
@@ -431,27 +890,46 @@ class ChessBoard:
     
     def is_in_check(self, color):
         """Check if the king of given color is in check"""
-        # Find the king
-        king_pos = None
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece and piece.type == PieceType.KING and piece.color == color:
-                    king_pos = (row, col)
-                    break
-        
+        king_pos = find_king(self, color)
         if not king_pos:
             return False
         
-        # Check if any opponent piece can attack the king
+        # Check if any opponent piece attacks the king's square
         opponent_color = Color.BLACK if color == Color.WHITE else Color.WHITE
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece and piece.color == opponent_color:
-                    if self.is_valid_move(piece, king_pos[0], king_pos[1]):
+        return self.get_attack_map(opponent_color)[king_pos[0] * 8 + king_pos[1]] > 0
+    
+    def is_square_attacked(self, row, col, by_color):
+        """Check if a piece of by_color attacks a square, scanning outwards from it"""
+        board = self.board
+        # Pawns attack diagonally forward, so look one row behind the square
+        pawn_row = row + 1 if by_color == Color.WHITE else row - 1
+        if 0 <= pawn_row < 8:
+            for pawn_col in (col - 1, col + 1):
+                if 0 <= pawn_col < 8:
+                    piece = board[pawn_row][pawn_col]
+                    if piece and piece.color == by_color and piece.type == PieceType.PAWN:
+                        return True
+        
+        for offsets, piece_type in ((KNIGHT_OFFSETS, PieceType.KNIGHT), (KING_OFFSETS, PieceType.KING)):
+            for row_step, col_step in offsets:
+                r, c = row + row_step, col + col_step
+                if 0 <= r < 8 and 0 <= c < 8:
+                    piece = board[r][c]
+                    if piece and piece.color == by_color and piece.type == piece_type:
                         return True
         
+        for directions, slider in ((ROOK_DIRECTIONS, PieceType.ROOK), (BISHOP_DIRECTIONS, PieceType.BISHOP)):
+            for row_step, col_step in directions:
+                r, c = row + row_step, col + col_step
+                while 0 <= r < 8 and 0 <= c < 8:
+                    piece = board[r][c]
+                    if piece:
+                        if piece.color == by_color and piece.type in (slider, PieceType.QUEEN):
+                            return True
+                        break
+                    r += row_step
+                    c += col_step
+        
         return False
     
     def get_all_pieces(self, color):
@@ -464,6 +942,14 @@ class ChessBoard:
                     pieces.append(piece)
         return pieces
 
+    def get_all_valid_moves(self, color):
+        """Get all legal (piece, (row, col)) moves for a given color"""
+        moves = []
+        for piece in self.get_all_pieces(color):
+            for move in self.get_valid_moves(piece):
+                moves.append((piece, move))
+        return moves
+
     def get_board_state(self):
         """Get current board state for threefold repetition"""
         state = []
@@ -474,93 +960,526 @@ class ChessBoard:
                     state.append(f"{piece.color.value}_{piece.type.value}_{row}_{col}")
         return tuple(sorted(state))
 
+    def position_key(self):
+        """Get a 64-bit Zobrist hash of the position, side to move, castling rights and en passant"""
+        key = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece:
+                    key ^= ZOBRIST_PIECES[PIECE_CODE_INDEX[(piece.color, piece.type)]][row * 8 + col]
+        if self.current_player == Color.BLACK:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        for symbol, (row, rook_col) in CASTLING_SQUARES.items():
+            king = self.board[row][4]
+            rook = self.board[row][rook_col]
+            if (king and king.type == PieceType.KING and not king.has_moved and
+                    rook and rook.type == PieceType.ROOK and not rook.has_moved and rook.color == king.color):
+                key ^= ZOBRIST_CASTLING[symbol]
+        if self.last_move:
+            last_piece, last_from, last_to = self.last_move
+            if last_piece.type == PieceType.PAWN and abs(last_to[0] - last_from[0]) == 2:
+                key ^= ZOBRIST_EN_PASSANT[last_to[1]]
+        return key
+
     def check_threefold_repetition(self):
-        """Check for threefold repetition"""
-        current_state = self.get_board_state()
-        count = 1
-        for state in reversed(self.position_history):
-            if state == current_state:
-                count += 1
-            if count >= 3:
-                return True
-        return False
+        """Check whether the current position has occurred three times, counting this occurrence"""
+        # Positions before the last capture or pawn move cannot repeat
+        start = max(0, self.current_ply - self.move_count)
+        return self.position_history[start:self.current_ply + 1].count(self.position_key()) >= 3
 
     def check_fifty_move_rule(self):
         """Check for fifty-move rule"""
-        return self.move_count >= 50
+        return self.move_count >= 100
 
     def check_insufficient_material(self):
-        """Check for insufficient material to checkmate"""
-        white_pieces = self.get_all_pieces(Color.WHITE)
-        black_pieces = self.get_all_pieces(Color.BLACK)
-        
-        # King vs King
-        if len(white_pieces) == 1 and len(black_pieces) == 1:
+        """Check for positions where neither side can ever checkmate
+
+        That is king against king with at most one knight or bishop on the
+        board, or kings with only bishops that all stand on one square color.
+        Uses the incrementally kept material counts, so it takes constant time.
+        """
+        if self.material_signature & MATING_MATERIAL_MASK:
+            return False
+        counts = self.piece_counts
+        knights = counts[WHITE_KNIGHT] + counts[BLACK_KNIGHT]
+        bishops = counts[WHITE_BISHOP] + counts[BLACK_BISHOP]
+        if knights + bishops <= 1:
             return True
-            
-        # King and Knight vs King
-        if len(white_pieces) == 2 and len(black_pieces) == 1:
-            if any(p.type == PieceType.KNIGHT for p in white_pieces):
-                return True
-        if len(black_pieces) == 2 and len(white_pieces) == 1:
-            if any(p.type == PieceType.KNIGHT for p in black_pieces):
-                return True
-                
-        # King and Bishop vs King
-        if len(white_pieces) == 2 and len(black_pieces) == 1:
-            if any(p.type == PieceType.BISHOP for p in white_pieces):
-                return True
-        if len(black_pieces) == 2 and len(white_pieces) == 1:
-            if any(p.type == PieceType.BISHOP for p in black_pieces):
-                return True
-                
-        return False
+        if knights:
+            return False
+        white_squares = self.bishop_square_colors[Color.WHITE]
+        black_squares = self.bishop_square_colors[Color.BLACK]
+        return white_squares[0] + black_squares[0] == 0 or white_squares[1] + black_squares[1] == 0
+    
+    def recount_material(self):
+        """Rebuild the piece counts, bishop square colors and material signature from the board"""
+        self.piece_counts = [0] * len(PIECE_CODES)
+        self.bishop_square_colors = {Color.WHITE: [0, 0], Color.BLACK: [0, 0]}  # Light, dark
+        self.material_signature = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece:
+                    self.count_material(piece, row, col, 1)
+    
+    def count_material(self, piece, row, col, change):
+        """Add change (1 or -1) to the material counts for a piece on a square"""
+        code = PIECE_CODE_INDEX[(piece.color, piece.type)]
+        self.piece_counts[code] += change
+        self.material_signature += change * MATERIAL_UNITS[code]
+        if piece.type == PieceType.BISHOP:
+            self.bishop_square_colors[piece.color][(row + col) % 2] += change
 
     def save_board_state(self):
-        """Save current board state for move navigation"""
-        state = {
-            'board': [[None if piece is None else {
-                'type': piece.type,
-                'color': piece.color,
-                'has_moved': piece.has_moved
-            } for piece in row] for row in self.board],
-            'current_player': self.current_player,
-            'last_move': self.last_move,
-            'move_count': self.move_count,
-            'in_check': self.in_check
-        }
-        return state
+        """Save a compact snapshot of the current position for move navigation"""
+        squares = bytearray(64)
+        moved = 0  # Bitmask of squares holding pieces that have moved
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece:
+                    square = row * 8 + col
+                    squares[square] = PIECE_CODE_INDEX[(piece.color, piece.type)]
+                    if piece.has_moved:
+                        moved |= 1 << square
+        
+        last_move = None
+        if self.last_move:
+            _, last_from, last_to = self.last_move
+            last_move = (last_from, last_to)
+        return (bytes(squares), moved, self.current_player, last_move, self.move_count, self.fullmove_number)
 
     def load_board_state(self, state):
         """Load a saved board state"""
+        squares, moved, current_player, last_move, move_count, fullmove_number = state
+        self._attack_maps = None
         for row in range(8):
             for col in range(8):
-                piece_data = state['board'][row][col]
-                if piece_data is None:
+                square = row * 8 + col
+                code = squares[square]
+                if code == 0:
                     self.board[row][col] = None
                 else:
-                    piece = Piece(piece_data['type'], piece_data['color'], row, col)
-                    piece.has_moved = piece_data['has_moved']
+                    color, piece_type = PIECE_CODES[code]
+                    piece = Piece(piece_type, color, row, col)
+                    piece.has_moved = bool(moved >> square & 1)
                     self.board[row][col] = piece
         
-        self.current_player = state['current_player']
-        self.last_move = state['last_move']
-        self.move_count = state['move_count']
-        self.in_check = state['in_check']
+        self.current_player = current_player
+        self.last_move = None
+        if last_move:
+            last_from, last_to = last_move
+            self.last_move = (self.board[last_to[0]][last_to[1]], last_from, last_to)
+        self.move_count = move_count
+        self.fullmove_number = fullmove_number
+        self.recount_material()
+
+    def load_fen(self, fen, update_status=True):
+        """Set up the board from a FEN string, reusing existing piece objects"""
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError(f"Invalid FEN: {fen!r}")
+        placement, active, castling, en_passant = fields[:4]
+        halfmove = fields[4] if len(fields) > 4 and fields[4].isdigit() else "0"
+        fullmove = fields[5] if len(fields) > 5 and fields[5].isdigit() else "1"
+        ranks = placement.split('/')
+        if len(ranks) != 8 or active not in ('w', 'b') or (castling != '-' and set(castling) - set('KQkq')):
+            raise ValueError(f"Invalid FEN: {fen!r}")
+        # Validate everything up front so a bad FEN leaves the board untouched
+        try:
+            rows = [expand_fen_rank(rank) for rank in ranks]
+        except ValueError:
+            raise ValueError(f"Invalid FEN: {fen!r}") from None
+        if placement.count('K') != 1 or placement.count('k') != 1:
+            raise ValueError(f"Invalid FEN, each side needs one king: {fen!r}")
+        if en_passant != '-' and (len(en_passant) != 2 or en_passant[0] not in 'abcdefgh' or en_passant[1] not in '36'):
+            raise ValueError(f"Invalid FEN: {fen!r}")
+        
+        self._attack_maps = None
+        counts = [0] * len(PIECE_CODES)
+        bishop_square_colors = {Color.WHITE: [0, 0], Color.BLACK: [0, 0]}
+        
+        # Recycle the current pieces instead of allocating new ones
+        spare_pieces = {}
+        for board_row in self.board:
+            for piece in board_row:
+                if piece:
+                    spare_pieces.setdefault(FEN_SYMBOLS[(piece.color, piece.type)], []).append(piece)
+        
+        for row, symbols in enumerate(rows):
+            board_row = self.board[row]
+            for col, symbol in enumerate(symbols):
+                if symbol is None:
+                    board_row[col] = None
+                    continue
+                spares = spare_pieces.get(symbol)
+                if spares:
+                    piece = spares.pop()
+                    piece.row, piece.col = row, col
+                else:
+                    color, piece_type = FEN_PIECES[symbol]
+                    piece = Piece(piece_type, color, row, col)
+                # Pawns off their start rank can no longer double step
+                if symbol == 'P':
+                    piece.has_moved = row != 6
+                elif symbol == 'p':
+                    piece.has_moved = row != 1
+                else:
+                    piece.has_moved = symbol in 'KRkr'
+                board_row[col] = piece
+                # Material counts are kept here rather than by a second pass over the board
+                counts[FEN_PIECE_CODES[symbol]] += 1
+                if symbol in 'Bb':
+                    bishop_square_colors[piece.color][(row + col) % 2] += 1
+        self.piece_counts = counts
+        self.bishop_square_colors = bishop_square_colors
+        self.material_signature = sum(count * unit for count, unit in zip(counts, MATERIAL_UNITS))
+        
+        # Castling rights are stored as unmoved kings and rooks
+        for symbol, (row, rook_col) in CASTLING_SQUARES.items():
+            if symbol in castling:
+                color = Color.WHITE if symbol.isupper() else Color.BLACK
+                king = self.board[row][4]
+                rook = self.board[row][rook_col]
+                if king and king.type == PieceType.KING and king.color == color:
+                    king.has_moved = False
+                if rook and rook.type == PieceType.ROOK and rook.color == color:
+                    rook.has_moved = False
+        
+        # En passant is stored as the pawn's double step
+        self.last_move = None
+        if en_passant != '-':
+            col = ord(en_passant[0]) - ord('a')
+            direction = 1 if en_passant[1] == '3' else -1
+            to_row = 8 - int(en_passant[1]) - direction
+            pawn = self.board[to_row][col]
+            if pawn and pawn.type == PieceType.PAWN:
+                self.last_move = (pawn, (to_row + 2 * direction, col), (to_row, col))
+        
+        self.current_player = Color.WHITE if active == 'w' else Color.BLACK
+        self.move_count = int(halfmove)
+        self.fullmove_number = int(fullmove)
+        self.selected_piece = None
+        self.selected_pos = None
+        self.valid_moves = []
+        self.position_history = array('Q', [self.position_key()] if update_status else [])
+        # Bulk loads leave the history to be started when first used
+        self._history = MoveHistory(self.save_board_state()) if update_status else None
+        self.current_ply = 0
+        self.in_check = False
+        self.checkmate = False
+        self.stalemate = False
+        self.game_over = False
+        self.winner = None
+        if update_status:
+            self.update_game_status()
+
+    @classmethod
+    def from_fen(cls, fen):
+        """Create a board from a FEN string"""
+        board = cls()
+        board.load_fen(fen)
+        return board
+
+    def to_fen(self):
+        """Get the current position as a FEN string"""
+        ranks = []
+        for row in range(8):
+            rank = ''
+            empty = 0
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += FEN_SYMBOLS[(piece.color, piece.type)]
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+        
+        castling = ''
+        for symbol, (row, rook_col) in CASTLING_SQUARES.items():
+            color = Color.WHITE if symbol.isupper() else Color.BLACK
+            king = self.board[row][4]
+            rook = self.board[row][rook_col]
+            if (king and king.type == PieceType.KING and king.color == color and not king.has_moved and
+                    rook and rook.type == PieceType.ROOK and rook.color == color and not rook.has_moved):
+                castling += symbol
+        
+        en_passant = '-'
+        if self.last_move:
+            last_piece, last_from, last_to = self.last_move
+            if last_piece.type == PieceType.PAWN and abs(last_to[0] - last_from[0]) == 2:
+                en_passant = SQUARE_NAMES[(last_from[0] + last_to[0]) // 2 * 8 + last_to[1]]
+        
+        active = 'w' if self.current_player == Color.WHITE else 'b'
+        return f"{'/'.join(ranks)} {active} {castling or '-'} {en_passant} {self.move_count} {self.fullmove_number}"
+
+def iter_fen_positions(source, board=None):
+    """Stream FEN lines from a file path or iterable of lines into one reused board
+
+    The same board object is yielded for every line, so copy anything you need
+    before advancing. Game over flags are not computed while bulk loading, and
+    the move history is only started if it is used.
+    """
+    if board is None:
+        board = ChessBoard()
+    if isinstance(source, str):
+        with open(source) as lines:
+            yield from iter_fen_positions(lines, board)
+        return
+    for line in source:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            board.load_fen(line, update_status=False)
+            yield board
+
+# Evaluation weights in centipawns
+PIECE_VALUES = {
+    PieceType.PAWN: 100,
+    PieceType.KNIGHT: 320,
+    PieceType.BISHOP: 330,
+    PieceType.ROOK: 500,
+    PieceType.QUEEN: 900,
+    PieceType.KING: 0
+}
+
+# Piece-square tables from White's side, indexed row * 8 + col with row 0 being rank 8
+PIECE_SQUARE_TABLES = {
+    PieceType.PAWN: [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0],
+    PieceType.KNIGHT: [
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50],
+    PieceType.BISHOP: [
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20],
+    PieceType.ROOK: [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        0, 0, 0, 5, 5, 0, 0, 0],
+    PieceType.QUEEN: [
+        -20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        0, 0, 5, 5, 5, 5, 0, -5,
+        -10, 5, 5, 5, 5, 5, 0, -10,
+        -10, 0, 5, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20],
+    PieceType.KING: [
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+        20, 20, 0, 0, 0, 0, 20, 20,
+        20, 30, 10, 0, 0, 10, 30, 20]
+}
+
+# Mobility proxy: bonus per empty square next to the piece
+MOBILITY_WEIGHTS = {
+    PieceType.PAWN: 0,
+    PieceType.KNIGHT: 2,
+    PieceType.BISHOP: 2,
+    PieceType.ROOK: 1,
+    PieceType.QUEEN: 1,
+    PieceType.KING: 0
+}
+NEIGHBOR_SQUARES = [[(row + row_step, col + col_step) for row_step, col_step in KING_OFFSETS
+                     if 0 <= row + row_step < 8 and 0 <= col + col_step < 8]
+                    for row in range(8) for col in range(8)]
+KING_ZONE_ATTACK_WEIGHT = 5  # Centipawns per enemy attack on a square next to the king, at search leaves
+EVAL_WEIGHTS_PATH = "eval_weights.json"  # Tuned weights written by tuner.py
+
+def load_evaluation_weights(path=EVAL_WEIGHTS_PATH):
+    """Replace the evaluation weights with those in a JSON file written by tuner.py
+
+    The tables are updated in place, so every module that imported them sees
+    the new values. Sections or piece types missing from the file keep their
+    current weights. Raises ValueError if the file is malformed.
+    """
+    with open(path) as weights_file:
+        try:
+            weights = json.load(weights_file)
+        except json.JSONDecodeError as error:
+            raise ValueError(f"Invalid weights file {path!r}: {error}") from None
+    # Read everything before changing anything, so a bad file leaves the weights alone
+    values, tables, mobility = {}, {}, {}
+    try:
+        for piece_type in PieceType:
+            name = piece_type.value
+            if name in weights.get('piece_values', {}):
+                values[piece_type] = int(weights['piece_values'][name])
+            if name in weights.get('mobility_weights', {}):
+                mobility[piece_type] = int(weights['mobility_weights'][name])
+            if name in weights.get('piece_square_tables', {}):
+                tables[piece_type] = [int(value) for value in weights['piece_square_tables'][name]]
+                if len(tables[piece_type]) != 64:
+                    raise ValueError(f"{name} table has {len(tables[piece_type])} entries")
+    except (AttributeError, TypeError, ValueError) as error:
+        raise ValueError(f"Invalid weights file {path!r}: {error}") from None
+    PIECE_VALUES.update(values)
+    PIECE_SQUARE_TABLES.update(tables)
+    MOBILITY_WEIGHTS.update(mobility)
+
+def save_evaluation_weights(path=EVAL_WEIGHTS_PATH):
+    """Write the current evaluation weights in the format load_evaluation_weights() reads"""
+    weights = {
+        'piece_values': {piece_type.value: PIECE_VALUES[piece_type] for piece_type in PieceType},
+        'piece_square_tables': {piece_type.value: PIECE_SQUARE_TABLES[piece_type] for piece_type in PieceType},
+        'mobility_weights': {piece_type.value: MOBILITY_WEIGHTS[piece_type] for piece_type in PieceType}
+    }
+    with open(path, 'w') as weights_file:
+        json.dump(weights, weights_file, indent=1)
+
+# Tuned weights replace the defaults above when present
+if os.path.exists(EVAL_WEIGHTS_PATH):
+    try:
+        load_evaluation_weights(EVAL_WEIGHTS_PATH)
+    except (OSError, ValueError) as error:
+        # A bad weights file must not stop the game and tools from starting
+        print(f"Warning: {error}; using the default evaluation weights", file=sys.stderr)
+
+# Specialised evaluators for known endgames, keyed by material signature
+ENDGAME_EVALUATORS = {}  # Signature -> (evaluator, stronger color)
+ENDGAME_BONUS = 2000  # Added for the stronger side so won endgames outrank unclear positions
+
+def register_endgame(*names):
+    """Register an evaluator for endgames such as "KRvK"
+
+    The evaluator is called as evaluator(board, strong_color) and returns a score
+    from White's point of view. The colour-mirrored endgame is registered too.
+    """
+    def decorator(evaluator):
+        for name in names:
+            strong, weak = name.split('v')
+            ENDGAME_EVALUATORS[material_signature(strong, weak)] = (evaluator, Color.WHITE)
+            ENDGAME_EVALUATORS[material_signature(weak, strong)] = (evaluator, Color.BLACK)
+        return evaluator
+    return decorator
+
+def find_king(board, color):
+    """Get the (row, col) of a side's king, or None"""
+    for row in range(8):
+        for col in range(8):
+            piece = board.board[row][col]
+            if piece and piece.type == PieceType.KING and piece.color == color:
+                return row, col
+    return None
+
+@register_endgame("KQvK", "KRvK")
+def evaluate_mating_endgame(board, strong_color):
+    """Drive the lone king to the edge and bring the stronger king closer
+
+    Positions like these could instead be probed in an endgame tablebase;
+    such a probe would register here under the same material signature.
+    """
+    weak_color = Color.BLACK if strong_color == Color.WHITE else Color.WHITE
+    strong_king, weak_king = find_king(board, strong_color), find_king(board, weak_color)
+    material = sum(PIECE_VALUES[piece_type] * board.piece_counts[PIECE_CODE_INDEX[(strong_color, piece_type)]]
+                   for piece_type in PieceType)
+    score = ENDGAME_BONUS + material
+    if strong_king and weak_king:
+        # Manhattan distance of the lone king from the centre, 0 to 6
+        edge = max(3 - weak_king[0], weak_king[0] - 4) + max(3 - weak_king[1], weak_king[1] - 4)
+        kings_apart = abs(strong_king[0] - weak_king[0]) + abs(strong_king[1] - weak_king[1])
+        score += 20 * edge + 10 * (14 - kings_apart)
+    return score if strong_color == Color.WHITE else -score
+
+# Search
+DEFAULT_SEARCH_DEPTH = 3
+MAX_SEARCH_DEPTH = 64
+MATE_SCORE = 100000
+TRANSPOSITION_TABLE_SIZE = 1 << 18  # Entries kept before the table is cleared
+TIME_CHECK_INTERVAL = 16  # Nodes between deadline checks, each node taking up to about 1 ms
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+
+class SearchTimeout(Exception):
+    """Raised inside the search when its time limit runs out"""
+
+class SearchReport:
+    """Depth, score, node counts, timing and principal variation of a search"""
+    def __init__(self, depth, score, nodes, seconds, pv, hash_hits, cutoffs):
+        self.depth = depth
+        self.score = score  # Centipawns for the side to move
+        self.nodes = nodes
+        self.seconds = seconds
+        self.pv = pv  # Packed 16-bit moves, best move first
+        self.hash_hits = hash_hits
+        self.cutoffs = cutoffs
+    
+    @property
+    def nps(self):
+        """Nodes searched per second"""
+        return int(self.nodes / self.seconds) if self.seconds > 0 else 0
+    
+    def to_dict(self):
+        """Get the report as a JSON-friendly dict with the PV in UCI notation"""
+        pv = []
+        for code in self.pv:
+            from_row, from_col, to_row, to_col = decode_move(code)
+            pv.append(SQUARE_NAMES[from_row * 8 + from_col] + SQUARE_NAMES[to_row * 8 + to_col])
+        return {
+            'depth': self.depth,
+            'score': self.score,
+            'nodes': self.nodes,
+            'time': round(self.seconds, 6),
+            'nps': self.nps,
+            'pv': pv,
+            'hash_hits': self.hash_hits,
+            'cutoffs': self.cutoffs
+        }
 
 class ChessAI:
-    def __init__(self, difficulty="medium"):
+    def __init__(self, difficulty="medium", depth=DEFAULT_SEARCH_DEPTH, time_limit=None, cache=None):
         self.difficulty = difficulty
+        self.depth = depth  # Search depth for expert difficulty
+        self.time_limit = time_limit  # Seconds per move for expert difficulty
+        self.cache = cache  # Optional persistent AnalysisCache of root search results
+        self.transposition_table = {}
+        self.table_size = TRANSPOSITION_TABLE_SIZE
+        self.nodes = 0
+        self.hash_hits = 0
+        self.cutoffs = 0
+        self.deadline = None
+        self.key_path = []  # Position keys from the last irreversible move down to the current search node
+        self.stop_event = threading.Event()  # Set from another thread to end a search early
+        self.last_report = None  # SearchReport of the latest search
+        self.on_report = None  # Optional callback receiving each finished search's report
     
     def get_move(self, board):
-        """Get AI move based on difficulty"""
-        pieces = board.get_all_pieces(Color.BLACK)
-        valid_moves = []
-        
-        for piece in pieces:
-            moves = board.get_valid_moves(piece)
-            for move in moves:
-                valid_moves.append((piece, move))
+        """Get AI move for the side to move based on difficulty"""
+        valid_moves = board.get_all_valid_moves(board.current_player)
         
         if not valid_moves:
             return None
@@ -569,6 +1488,9 @@ class ChessAI:
             return random.choice(valid_moves)
         elif self.difficulty == "medium":
             return self.get_medium_move(board, valid_moves)
+        elif self.difficulty == "expert":
+            move, _ = self.search(board, self.depth, self.time_limit)
+            return move
         else:
             return self.get_hard_move(board, valid_moves)
     
@@ -586,29 +1508,19 @@ class ChessAI:
     def get_hard_move(self, board, valid_moves):
         """Hard difficulty AI - basic strategy"""
         # Prioritize: checkmate > check > capture > development
-        best_moves = []
         capture_moves = []
         check_moves = []
         
         for piece, (to_row, to_col) in valid_moves:
-            # Simulate move
-            original_piece = board.board[to_row][to_col]
-            board.board[to_row][to_col] = piece
-            board.board[piece.row][piece.col] = None
-            piece.row, piece.col = to_row, to_col
-            
-            # Check if this puts opponent in check
-            if board.is_in_check(Color.WHITE):
-                check_moves.append((piece, (to_row, to_col)))
-            
             # Check if this is a capture
-            if original_piece:
+            if board.board[to_row][to_col]:
                 capture_moves.append((piece, (to_row, to_col)))
             
-            # Restore board
-            board.board[piece.row][piece.col] = None
-            board.board[to_row][to_col] = original_piece
-            piece.row, piece.col = to_row, to_col
+            # Check if this puts opponent in check
+            undo_info = board.apply_move(piece.row, piece.col, to_row, to_col)
+            if board.is_in_check(board.current_player):
+                check_moves.append((undo_info[0], (to_row, to_col)))
+            board.undo_move(undo_info)
         
         if check_moves:
             return random.choice(check_moves)
@@ -616,18 +1528,445 @@ class ChessAI:
             return random.choice(capture_moves)
         else:
             return random.choice(valid_moves)
+    
+    def evaluate(self, board):
+        """Score the position in centipawns from White's point of view"""
+        score = 0
+        squares = board.board
+        for row in range(8):
+            for col in range(8):
+                piece = squares[row][col]
+                if piece is None:
+                    continue
+                piece_type = piece.type
+                if piece.color == Color.WHITE:
+                    value = PIECE_VALUES[piece_type] + PIECE_SQUARE_TABLES[piece_type][row * 8 + col]
+                else:
+                    value = PIECE_VALUES[piece_type] + PIECE_SQUARE_TABLES[piece_type][(7 - row) * 8 + col]
+                weight = MOBILITY_WEIGHTS[piece_type]
+                if weight:
+                    for r, c in NEIGHBOR_SQUARES[row * 8 + col]:
+                        if squares[r][c] is None:
+                            value += weight
+                score += value if piece.color == Color.WHITE else -value
+        return score
+    
+    def evaluate_leaf(self, board):
+        """Score a search leaf, using a registered endgame evaluator when one matches the material"""
+        endgame = ENDGAME_EVALUATORS.get(board.material_signature)
+        if endgame:
+            evaluator, strong_color = endgame
+            return evaluator(board, strong_color)
+        return self.evaluate(board) + self.king_safety(board)
+    
+    def king_safety(self, board):
+        """Score enemy attacks next to each king from White's point of view, read from the attack maps"""
+        score = 0
+        for color, opponent_color, sign in ((Color.WHITE, Color.BLACK, -1), (Color.BLACK, Color.WHITE, 1)):
+            king_pos = find_king(board, color)
+            if king_pos:
+                attacks = board.get_attack_map(opponent_color)
+                pressure = sum(attacks[square] for square in KING_ATTACKS[king_pos[0] * 8 + king_pos[1]])
+                score += sign * KING_ZONE_ATTACK_WEIGHT * pressure
+        return score
+    
+    def search(self, board, max_depth=None, time_limit=None, on_depth=None):
+        """Iterative deepening alpha-beta search, returns ((piece, (row, col)), score) for the side to move
+
+        on_depth, if given, is called with a SearchReport after each completed depth.
+        """
+        max_depth = min(max_depth or self.depth, MAX_SEARCH_DEPTH)
+        start = time.perf_counter()
+        self.deadline = start + time_limit if time_limit else None
+        self.nodes = 0
+        self.hash_hits = 0
+        self.cutoffs = 0
+        
+        root_moves = board.get_all_valid_moves(board.current_player)
+        if not root_moves:
+            return None, 0
+        self.start_key_path(board)
+        best_move, best_score = root_moves[0], 0
+        report = SearchReport(0, 0, 0, 0.0, [], 0, 0)
+        root_key = board.position_key()
+        first_depth = 1
+        searched_depth = 0
+        cached = self.probe_cache(root_key, root_moves)
+        if cached:
+            # Continue from the stored result, which is returned as is if deep enough
+            cached_depth, best_score, best_move = cached
+            piece, (to_row, to_col) = best_move
+            self.transposition_table[root_key] = (cached_depth, best_score, EXACT,
+                                                  encode_move(piece.row, piece.col, to_row, to_col))
+            report = SearchReport(cached_depth, best_score, 0, time.perf_counter() - start,
+                                  self.principal_variation(board, cached_depth), 0, 0)
+            if on_depth:
+                on_depth(report)
+            root_moves.remove(best_move)
+            root_moves.insert(0, best_move)
+            first_depth = cached_depth + 1
+            if abs(best_score) >= MATE_SCORE - MAX_SEARCH_DEPTH:
+                first_depth = max_depth + 1
+        for depth in range(first_depth, max_depth + 1):
+            try:
+                move, score = self.search_root(board, root_moves, depth)
+            except SearchTimeout:
+                break
+            best_move, best_score = move, score
+            searched_depth = depth
+            piece, (to_row, to_col) = move
+            # Store the root so the principal variation can be read back from the table
+            self.transposition_table[root_key] = (depth, score, EXACT,
+                                                  encode_move(piece.row, piece.col, to_row, to_col))
+            report = SearchReport(depth, score, self.nodes, time.perf_counter() - start,
+                                  self.principal_variation(board, depth), self.hash_hits, self.cutoffs)
+            if on_depth:
+                on_depth(report)
+            # Try the best move first at the next depth
+            root_moves.remove(move)
+            root_moves.insert(0, move)
+            if abs(score) >= MATE_SCORE - MAX_SEARCH_DEPTH:
+                break
+        
+        if self.cache is not None and searched_depth:
+            piece, (to_row, to_col) = best_move
+            self.cache.put(root_key, searched_depth, best_score, encode_move(piece.row, piece.col, to_row, to_col))
+        
+        # Count the nodes of an unfinished iteration in the final report
+        report.nodes = self.nodes
+        report.hash_hits = self.hash_hits
+        report.cutoffs = self.cutoffs
+        report.seconds = time.perf_counter() - start
+        self.last_report = report
+        if self.on_report:
+            self.on_report(report)
+        return best_move, best_score
+    
+    def search_multipv(self, board, lines=3, max_depth=None, time_limit=None, on_depth=None, history=None):
+        """Iterative deepening search keeping the best few root moves, returns a SearchReport per line
+
+        Each report's score is exact for the side to move and its pv starts with
+        that line's root move. on_depth, if given, is called with the list of
+        reports after each completed depth. The transposition table is kept
+        between calls, so searching a position next to the previous one starts warm.
+        history optionally gives the keys of the game positions before the root
+        (see start_key_path) when the board does not carry its own game.
+        """
+        max_depth = min(max_depth or self.depth, MAX_SEARCH_DEPTH)
+        start = time.perf_counter()
+        self.deadline = start + time_limit if time_limit else None
+        self.nodes = 0
+        self.hash_hits = 0
+        self.cutoffs = 0
+        
+        root_moves = board.get_all_valid_moves(board.current_player)
+        self.start_key_path(board, history)
+        reports = []
+        root_key = board.position_key()
+        for depth in range(1, max_depth + 1):
+            try:
+                scored = self.search_root_multipv(board, root_moves, depth, lines)
+            except SearchTimeout:
+                break
+            seconds = time.perf_counter() - start
+            reports = []
+            for score, move in scored:
+                piece, (to_row, to_col) = move
+                code = encode_move(piece.row, piece.col, to_row, to_col)
+                undo_info = board.apply_move(piece.row, piece.col, to_row, to_col)
+                try:
+                    pv = [code] + self.principal_variation(board, depth - 1)
+                finally:
+                    board.undo_move(undo_info)
+                reports.append(SearchReport(depth, score, self.nodes, seconds, pv, self.hash_hits, self.cutoffs))
+            if scored:
+                self.transposition_table[root_key] = (depth, scored[0][0], EXACT, reports[0].pv[0])
+            if on_depth:
+                on_depth(reports)
+            # Search the best lines first at the next depth
+            best = [move for _, move in scored]
+            root_moves = best + [move for move in root_moves if move not in best]
+            if not scored or all(abs(score) >= MATE_SCORE - MAX_SEARCH_DEPTH for score, _ in scored):
+                break
+        return reports
+    
+    def start_key_path(self, board, history=None):
+        """Seed the repetition path with the root and the earlier positions it could repeat
+
+        history is a sequence of position keys ending just before the root;
+        without it the board's own position_history is used.
+        """
+        if history is None:
+            start = max(0, board.current_ply - board.move_count)
+            history = board.position_history[start:board.current_ply]
+        self.key_path = list(history)
+        self.key_path.append(board.position_key())
+    
+    def probe_cache(self, root_key, root_moves):
+        """Get (depth, score, move) stored in the persistent cache for the root, or None"""
+        if self.cache is None:
+            return None
+        entry = self.cache.get(root_key)
+        if not entry:
+            return None
+        depth, score, code = entry
+        for move in root_moves:
+            piece, (to_row, to_col) = move
+            # A move that is not legal here means the key collided with another position
+            if encode_move(piece.row, piece.col, to_row, to_col) == code:
+                return depth, score, move
+        return None
+    
+    def principal_variation(self, board, max_length):
+        """Follow hash moves from the current position to get the expected line as packed moves"""
+        line = []
+        undo_stack = []
+        seen = set()
+        try:
+            while len(line) < max_length:
+                key = board.position_key()
+                entry = self.transposition_table.get(key)
+                if not entry or entry[3] is None or key in seen:
+                    break
+                seen.add(key)
+                from_row, from_col, to_row, to_col = decode_move(entry[3])
+                piece = board.board[from_row][from_col]
+                if (not piece or piece.color != board.current_player or
+                        (to_row, to_col) not in board.get_valid_moves(piece)):
+                    break
+                line.append(entry[3])
+                undo_stack.append(board.apply_move(from_row, from_col, to_row, to_col))
+        finally:
+            for undo_info in reversed(undo_stack):
+                board.undo_move(undo_info)
+        return line
+    
+    def should_stop(self):
+        """Check if the search was stopped or ran out of time"""
+        if self.stop_event.is_set():
+            return True
+        return self.deadline is not None and time.perf_counter() > self.deadline
+    
+    def search_root(self, board, root_moves, depth):
+        """Search every root move to the given depth and return the best (move, score)"""
+        alpha = -MATE_SCORE - 1
+        best_move = root_moves[0]
+        for move in root_moves:
+            piece, (to_row, to_col) = move
+            undo_info = board.apply_move(piece.row, piece.col, to_row, to_col)
+            try:
+                score = -self.negamax(board, depth - 1, -MATE_SCORE - 1, -alpha, 1)
+            finally:
+                board.undo_move(undo_info)
+            if score > alpha:
+                alpha = score
+                best_move = move
+        return best_move, alpha
+    
+    def search_root_multipv(self, board, root_moves, depth, lines):
+        """Search the root moves to the given depth and return the best [(score, move)] lines
+
+        A move only needs an exact score if it beats the worst line kept so far,
+        so later moves are searched with that score as the lower bound.
+        """
+        scored = []
+        for move in root_moves:
+            alpha = scored[-1][0] if len(scored) >= lines else -MATE_SCORE - 1
+            piece, (to_row, to_col) = move
+            undo_info = board.apply_move(piece.row, piece.col, to_row, to_col)
+            try:
+                score = -self.negamax(board, depth - 1, -MATE_SCORE - 1, -alpha, 1)
+            finally:
+                board.undo_move(undo_info)
+            if score > alpha:
+                index = len(scored)
+                while index and scored[index - 1][0] < score:
+                    index -= 1
+                scored.insert(index, (score, move))
+                del scored[lines:]
+        return scored
+    
+    def negamax(self, board, depth, alpha, beta, ply):
+        """Alpha-beta search returning the score for the side to move"""
+        self.nodes += 1
+        if self.nodes % TIME_CHECK_INTERVAL == 0 and self.should_stop():
+            raise SearchTimeout()
+        if board.check_fifty_move_rule() or board.check_insufficient_material():
+            return 0
+        
+        key = board.position_key()
+        # Only positions since the last capture or pawn move can recur; any repeat scores as a draw
+        if board.move_count >= 4 and key in self.key_path[-board.move_count:]:
+            return 0
+        entry = self.transposition_table.get(key)
+        tt_move = None
+        if entry:
+            entry_depth, entry_score, entry_flag, tt_move = entry
+            if entry_depth >= depth:
+                # Mate scores are stored relative to the node, not the root
+                if entry_score > MATE_SCORE - MAX_SEARCH_DEPTH:
+                    entry_score -= ply
+                elif entry_score < -MATE_SCORE + MAX_SEARCH_DEPTH:
+                    entry_score += ply
+                if (entry_flag == EXACT or
+                        entry_flag == LOWER_BOUND and entry_score >= beta or
+                        entry_flag == UPPER_BOUND and entry_score <= alpha):
+                    self.hash_hits += 1
+                    return entry_score
+        
+        moves = board.get_all_valid_moves(board.current_player)
+        if not moves:
+            return -MATE_SCORE + ply if board.is_in_check(board.current_player) else 0
+        if depth <= 0:
+            score = self.evaluate_leaf(board)
+            return score if board.current_player == Color.WHITE else -score
+        
+        moves.sort(key=lambda move: self.move_order_key(board, move, tt_move), reverse=True)
+        original_alpha = alpha
+        best_score = -MATE_SCORE - 1
+        best_code = None
+        self.key_path.append(key)
+        for piece, (to_row, to_col) in moves:
+            from_row, from_col = piece.row, piece.col
+            undo_info = board.apply_move(from_row, from_col, to_row, to_col)
+            try:
+                score = -self.negamax(board, depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                board.undo_move(undo_info)
+            if score > best_score:
+                best_score = score
+                best_code = encode_move(from_row, from_col, to_row, to_col)
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                self.cutoffs += 1
+                break
+        self.key_path.pop()
+        
+        if best_score <= original_alpha:
+            flag = UPPER_BOUND
+        elif best_score >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        stored_score = best_score
+        if stored_score > MATE_SCORE - MAX_SEARCH_DEPTH:
+            stored_score += ply
+        elif stored_score < -MATE_SCORE + MAX_SEARCH_DEPTH:
+            stored_score -= ply
+        if len(self.transposition_table) >= self.table_size:
+            self.transposition_table.clear()
+        self.transposition_table[key] = (depth, stored_score, flag, best_code)
+        return best_score
+    
+    def move_order_key(self, board, move, tt_move):
+        """Sort key putting the hash move first, then captures by most valuable victim"""
+        piece, (to_row, to_col) = move
+        if tt_move is not None and encode_move(piece.row, piece.col, to_row, to_col) == tt_move:
+            return 1 << 20
+        victim = board.board[to_row][to_col]
+        if victim:
+            return 10 * PIECE_VALUES[victim.type] - PIECE_VALUES[piece.type] + 10000
+        return 0
+
+def format_score(score):
+    """Format a centipawn score in pawns such as +0.35, or as a mate distance such as M3 or -M2"""
+    if abs(score) >= MATE_SCORE - MAX_SEARCH_DEPTH:
+        moves = (MATE_SCORE - abs(score) + 1) // 2
+        return f"M{moves}" if score > 0 else f"-M{moves}"
+    return f"{score / 100:+.2f}"
+
+class AnalysisSession:
+    """Background multi-PV search of one position at a time, streaming results through a queue
+
+    analyze() switches to a new position without waiting: it tells the running
+    search to stop and queues the new position for the session's searcher
+    thread, which picks it up as soon as the old search has unwound. Each
+    search works on its own board built from the FEN, along with the keys of
+    the game positions it could repeat, for up to time_limit seconds. It puts
+    (generation, reports) on the updates queue after each depth; poll() hands
+    the latest results for the current generation to the UI thread and drops
+    those of superseded searches. All searches share one transposition table,
+    so results carry over from position to position.
+    """
+    def __init__(self, lines=ANALYSIS_LINES, time_limit=ANALYSIS_TIME):
+        self.lines = lines
+        self.time_limit = time_limit
+        self.transposition_table = {}
+        self.jobs = queue.Queue()  # (ai, fen, history keys, generation) for the searcher, None to end it
+        self.updates = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        self.ai = None  # ChessAI of the current search, each with its own stop event
+        self.generation = 0  # Bumped per position so stale reports can be told apart
+        self.fen = None
+        self.reports = []  # Latest SearchReport per line for self.fen, best first
+    
+    def analyze(self, board):
+        """Start searching the board's position unless it is the one already being searched"""
+        fen = board.to_fen()
+        if fen == self.fen:
+            return
+        self.stop()
+        self.generation += 1
+        self.fen = fen
+        self.reports = []
+        self.ai = ChessAI("expert", MAX_SEARCH_DEPTH)
+        self.ai.transposition_table = self.transposition_table
+        # The searcher gets copies, so the game can move on while it runs
+        start = max(0, board.current_ply - board.move_count)
+        history = board.position_history[start:board.current_ply]
+        self.jobs.put((self.ai, fen, history, self.generation))
+    
+    def run(self):
+        """Searcher thread: search each queued position until told to stop"""
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            ai, fen, history, generation = job
+            if ai.stop_event.is_set():
+                continue  # Superseded before it started
+            board = ChessBoard.from_fen(fen)
+            ai.search_multipv(board, self.lines, MAX_SEARCH_DEPTH, self.time_limit,
+                              on_depth=lambda reports: self.updates.put((generation, reports)), history=history)
+    
+    def poll(self):
+        """Take the queued results, keeping those for the current position, and return them"""
+        while True:
+            try:
+                generation, reports = self.updates.get_nowait()
+            except queue.Empty:
+                return self.reports
+            if generation == self.generation:
+                self.reports = reports
+    
+    def stop(self):
+        """Tell the running search to stop, without waiting for it"""
+        if self.ai:
+            self.ai.stop_event.set()
+            self.ai = None
+        self.fen = None
+    
+    def close(self):
+        """Stop searching and let the searcher thread exit"""
+        self.stop()
+        self.jobs.put(None)
 
 class ChessGame:
-    def __init__(self):
+    def __init__(self, difficulty="medium", cache=None):
         self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
         pygame.display.set_caption("Chess Game")
         self.clock = pygame.time.Clock()
         self.board = ChessBoard()
         self.game_mode = None
         self.ai = None
+        self.difficulty = difficulty
+        self.cache = cache  # Optional AnalysisCache shared by every AI of the session
         self.font = pygame.font.Font(None, 36)
         self.small_font = pygame.font.Font(None, 24)
         self.show_move_history = False
+        self.analysis = None  # AnalysisSession while analysis mode is on
         
     def draw_menu(self):
         """Draw the main menu"""
@@ -647,6 +1986,11 @@ class ChessGame:
         self.screen.blit(two_player_text, two_player_rect)
         self.screen.blit(vs_computer_text, vs_computer_rect)
         
+        difficulty_text = self.small_font.render(f"Difficulty: {self.difficulty.title()} (E/M/H/X to change)",
+                                                 True, GRAY)
+        difficulty_rect = difficulty_text.get_rect(center=(WIDTH//2, 300))
+        self.screen.blit(difficulty_text, difficulty_rect)
+        
         instructions = self.small_font.render("Press SPACE to start game", True, GRAY)
         inst_rect = instructions.get_rect(center=(WIDTH//2, HEIGHT - 50))
         self.screen.blit(instructions, inst_rect)
@@ -718,7 +2062,7 @@ class ChessGame:
             self.screen.blit(text_surface, (WIDTH // 2 - text_surface.get_width() // 2, 60))
         
         # Draw move count for fifty-move rule
-        move_text = f"Moves without capture/pawn move: {self.board.move_count}/50"
+        move_text = f"Moves without capture/pawn move: {self.board.move_count // 2}/50"
         text_surface = self.small_font.render(move_text, True, BLACK)
         self.screen.blit(text_surface, (20, HEIGHT - 40))
 
@@ -728,13 +2072,65 @@ class ChessGame:
         self.screen.blit(text_surface, (WIDTH - 150, 20))
 
         # Draw move navigation buttons
-        if len(self.board.move_states) > 1:
+        if len(self.board.history) > 0:
             prev_text = "← Previous Move"
             next_text = "Next Move →"
             text_surface = self.small_font.render(prev_text, True, BLACK)
             self.screen.blit(text_surface, (WIDTH - 150, 50))
             text_surface = self.small_font.render(next_text, True, BLACK)
             self.screen.blit(text_surface, (WIDTH - 150, 80))
+            ply_text = f"Ply {self.board.current_ply}/{len(self.board.history)}"
+            text_surface = self.small_font.render(ply_text, True, GRAY)
+            self.screen.blit(text_surface, (WIDTH - 150, 110))
+    
+    def draw_analysis(self):
+        """Draw the evaluation bar left of the board and the best lines on the right"""
+        reports = self.analysis.poll()
+        white_to_move = self.board.current_player == Color.WHITE
+        
+        # Evaluation bar, White's share growing from the bottom
+        bar = pygame.Rect(BOARD_X - 30, BOARD_Y, 16, BOARD_SIZE)
+        pygame.draw.rect(self.screen, BLACK, bar)
+        if reports:
+            score = reports[0].score if white_to_move else -reports[0].score
+            if abs(score) >= MATE_SCORE - MAX_SEARCH_DEPTH:
+                share = 1.0 if score > 0 else 0.0
+            else:
+                share = 1 / (1 + 10 ** (-score / 400))
+        else:
+            share = 0.5
+        white_height = round(BOARD_SIZE * share)
+        pygame.draw.rect(self.screen, WHITE, (bar.x, bar.bottom - white_height, bar.width, white_height))
+        pygame.draw.rect(self.screen, GRAY, bar, 1)
+        
+        # Best lines with scores from White's point of view
+        x, y = WIDTH - 150, 140
+        depth = reports[0].depth if reports else 0
+        text_surface = self.small_font.render(f"Analysis, depth {depth}", True, BLUE)
+        self.screen.blit(text_surface, (x, y))
+        y += 25
+        if not reports and self.board.game_over:
+            text_surface = self.small_font.render("No legal moves", True, GRAY)
+            self.screen.blit(text_surface, (x, y))
+        for report in reports:
+            line = report.to_dict()['pv']
+            score = report.score if white_to_move else -report.score
+            text_surface = self.small_font.render(format_score(score), True, BLACK)
+            self.screen.blit(text_surface, (x, y))
+            y += 20
+            for start in range(0, min(len(line), 6), 3):
+                text_surface = self.small_font.render(" ".join(line[start:start + 3]), True, GRAY)
+                self.screen.blit(text_surface, (x + 10, y))
+                y += 20
+            y += 8
+    
+    def toggle_analysis(self):
+        """Turn analysis mode on or off"""
+        if self.analysis:
+            self.analysis.close()
+            self.analysis = None
+        else:
+            self.analysis = AnalysisSession()
     
     def get_square_from_mouse(self, pos):
         """Convert mouse position to board coordinates"""
@@ -751,22 +2147,20 @@ class ChessGame:
         if WIDTH - 150 <= pos[0] <= WIDTH - 20 and 20 <= pos[1] <= 40:
             self.game_mode = None
             self.board = ChessBoard()
+            if self.analysis:
+                self.toggle_analysis()
             return
 
         # Check if move navigation buttons are clicked
-        if len(self.board.move_states) > 1:
+        if len(self.board.history) > 0:
             # Previous move button
             if WIDTH - 150 <= pos[0] <= WIDTH - 20 and 50 <= pos[1] <= 70:
-                if self.board.current_move_index > 0:
-                    self.board.current_move_index -= 1
-                    self.board.load_board_state(self.board.move_states[self.board.current_move_index])
+                self.board.step_back()
                 return
 
             # Next move button
             if WIDTH - 150 <= pos[0] <= WIDTH - 20 and 80 <= pos[1] <= 100:
-                if self.board.current_move_index < len(self.board.move_states) - 1:
-                    self.board.current_move_index += 1
-                    self.board.load_board_state(self.board.move_states[self.board.current_move_index])
+                self.board.step_forward()
                 return
 
         if self.board.game_over:
@@ -805,6 +2199,10 @@ class ChessGame:
             self.board.selected_piece = clicked_piece
             self.board.valid_moves = self.board.get_valid_moves(clicked_piece)
     
+    def new_ai(self):
+        """Create the computer opponent for the selected difficulty"""
+        return ChessAI(self.difficulty, time_limit=EXPERT_MOVE_TIME, cache=self.cache)
+    
     def ai_move(self):
         """Make AI move"""
         if (self.game_mode == GameMode.VS_COMPUTER and 
@@ -830,25 +2228,35 @@ class ChessGame:
                     if event.key == pygame.K_r and self.board.game_over:
                         self.board = ChessBoard()
                         if self.game_mode == GameMode.VS_COMPUTER:
-                            self.ai = ChessAI()
+                            self.ai = self.new_ai()
                     elif event.key == pygame.K_1:
                         self.game_mode = GameMode.TWO_PLAYER
                         self.board = ChessBoard()
                     elif event.key == pygame.K_2:
                         self.game_mode = GameMode.VS_COMPUTER
                         self.board = ChessBoard()
-                        self.ai = ChessAI()
+                        self.ai = self.new_ai()
+                    elif event.key in DIFFICULTY_KEYS and not self.game_mode:
+                        self.difficulty = DIFFICULTY_KEYS[event.key]
                     elif event.key == pygame.K_b and self.game_mode:
                         self.game_mode = None
                         self.board = ChessBoard()
-                    elif event.key == pygame.K_LEFT and len(self.board.move_states) > 1:
-                        if self.board.current_move_index > 0:
-                            self.board.current_move_index -= 1
-                            self.board.load_board_state(self.board.move_states[self.board.current_move_index])
-                    elif event.key == pygame.K_RIGHT and len(self.board.move_states) > 1:
-                        if self.board.current_move_index < len(self.board.move_states) - 1:
-                            self.board.current_move_index += 1
-                            self.board.load_board_state(self.board.move_states[self.board.current_move_index])
+                        if self.analysis:
+                            self.toggle_analysis()
+                    elif event.key == pygame.K_a and self.game_mode:
+                        self.toggle_analysis()
+                    elif event.key == pygame.K_LEFT and self.game_mode:
+                        self.board.step_back()
+                    elif event.key == pygame.K_RIGHT and self.game_mode:
+                        self.board.step_forward()
+                    elif event.key == pygame.K_DOWN and self.game_mode:
+                        self.board.go_to_ply(self.board.current_ply - SCRUB_STEP)
+                    elif event.key == pygame.K_UP and self.game_mode:
+                        self.board.go_to_ply(self.board.current_ply + SCRUB_STEP)
+                    elif event.key == pygame.K_HOME and self.game_mode:
+                        self.board.go_to_start()
+                    elif event.key == pygame.K_END and self.game_mode:
+                        self.board.go_to_end()
             
             self.screen.fill(WHITE)
             
@@ -858,14 +2266,33 @@ class ChessGame:
                 self.draw_board()
                 self.draw_pieces()
                 self.draw_game_info()
+                if self.analysis:
+                    # Follows moves and navigation, restarting only when the position changes
+                    self.analysis.analyze(self.board)
+                    self.draw_analysis()
             
             pygame.display.flip()
             self.clock.tick(60)
         
+        if self.analysis:
+            self.analysis.close()
         pygame.quit()
         sys.exit()
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play chess against a friend or the computer")
+    parser.add_argument('--difficulty', choices=list(DIFFICULTY_KEYS.values()), default="medium")
+    parser.add_argument('--analysis-cache', default=os.environ.get(ANALYSIS_CACHE_ENV),
+                        help=f"SQLite file keeping expert search results across sessions (default: ${ANALYSIS_CACHE_ENV})")
+    args = parser.parse_args(argv)
+    
+    cache = AnalysisCache(args.analysis_cache) if args.analysis_cache else None
+    try:
+        ChessGame(args.difficulty, cache).run()
+    finally:
+        if cache:
+            cache.close()
+
 if __name__ == "__main__":
-    game = ChessGame()
-    game.run()
+    sys.exit(main())
 
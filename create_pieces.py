@@ -1,11 +1,36 @@
-import pygame
+"""Build the chess piece sprite atlas.
+
+Every piece is drawn at each size in ATLAS_SIZES and packed into one PNG, one
+row per size, with a JSON manifest giving the rectangle of each sprite:
+
+    {"hash": "...", "image": "pieces.png",
+     "sprites": {"50": {"white_king": [x, y, width, height], ...}, ...}}
+
+The hash covers this file's drawing code and the requested sizes, so running
+the script again does nothing until one of them changes. Sprites are rendered
+in parallel worker processes, which send back raw RGBA bytes.
+
+Usage:
+    python create_pieces.py [--sizes 25 50 100] [--force]
+"""
 import os
+import sys
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
 
-# Initialize Pygame
-pygame.init()
+import pygame
 
 # Constants
-PIECE_SIZE = 50
+PIECE_SIZE = 50  # Size the drawing coordinates below are written for
+ATLAS_SIZES = (25, 50, 100)  # 50 is SQUARE_SIZE - 10, the size drawn on the board
+SUPERSAMPLE = 4  # Sprites are drawn this much larger, then smoothly scaled down
+ASSETS_DIR = "assets"
+ATLAS_FILE = "pieces.png"
+MANIFEST_FILE = "pieces.json"
 COLORS = {
     'white': (255, 255, 255),
     'black': (50, 50, 50),
@@ -13,161 +38,253 @@ COLORS = {
     'highlight': (200, 200, 200)
 }
 
-def create_king(color):
+class Canvas:
+    """Drawing surface taking coordinates at PIECE_SIZE and scaling them to any sprite size"""
+    def __init__(self, size):
+        self.size = size
+        self.scale = size * SUPERSAMPLE / PIECE_SIZE
+        self.surface = pygame.Surface((size * SUPERSAMPLE, size * SUPERSAMPLE), pygame.SRCALPHA)
+    
+    def point(self, point):
+        return round(point[0] * self.scale), round(point[1] * self.scale)
+    
+    def rectangle(self, rect):
+        x, y, width, height = rect
+        return pygame.Rect(self.point((x, y)), self.point((width, height)))
+    
+    def width(self, width):
+        return max(1, round(width * self.scale)) if width else 0
+    
+    def ellipse(self, color, rect, width=0):
+        pygame.draw.ellipse(self.surface, color, self.rectangle(rect), self.width(width))
+    
+    def rect(self, color, rect, width=0):
+        pygame.draw.rect(self.surface, color, self.rectangle(rect), self.width(width))
+    
+    def polygon(self, color, points, width=0):
+        pygame.draw.polygon(self.surface, color, [self.point(point) for point in points], self.width(width))
+    
+    def line(self, color, start, end, width=1):
+        pygame.draw.line(self.surface, color, self.point(start), self.point(end), self.width(width))
+    
+    def circle(self, color, center, radius, width=0):
+        pygame.draw.circle(self.surface, color, self.point(center), round(radius * self.scale), self.width(width))
+    
+    def finish(self):
+        """Get the finished sprite at its target size"""
+        return pygame.transform.smoothscale(self.surface, (self.size, self.size))
+
+def create_king(color, size=PIECE_SIZE):
     """Create a king piece image"""
-    surface = pygame.Surface((PIECE_SIZE, PIECE_SIZE), pygame.SRCALPHA)
+    canvas = Canvas(size)
     main_color = COLORS[color]
     outline_color = COLORS['outline']
     
     # Crown base
-    pygame.draw.ellipse(surface, main_color, (10, 30, 30, 15))
-    pygame.draw.ellipse(surface, outline_color, (10, 30, 30, 15), 2)
+    canvas.ellipse(main_color, (10, 30, 30, 15))
+    canvas.ellipse(outline_color, (10, 30, 30, 15), 2)
     
     # Crown points
     points = [(15, 15), (20, 5), (25, 15), (30, 5), (35, 15), (40, 30), (10, 30)]
-    pygame.draw.polygon(surface, main_color, points)
-    pygame.draw.polygon(surface, outline_color, points, 2)
+    canvas.polygon(main_color, points)
+    canvas.polygon(outline_color, points, 2)
     
     # Cross on top
-    pygame.draw.line(surface, outline_color, (25, 5), (25, 15), 2)
-    pygame.draw.line(surface, outline_color, (20, 10), (30, 10), 2)
+    canvas.line(outline_color, (25, 5), (25, 15), 2)
+    canvas.line(outline_color, (20, 10), (30, 10), 2)
     
-    return surface
+    return canvas.finish()
 
-def create_queen(color):
+def create_queen(color, size=PIECE_SIZE):
     """Create a queen piece image"""
-    surface = pygame.Surface((PIECE_SIZE, PIECE_SIZE), pygame.SRCALPHA)
+    canvas = Canvas(size)
     main_color = COLORS[color]
     outline_color = COLORS['outline']
     
     # Crown base
-    pygame.draw.ellipse(surface, main_color, (10, 25, 30, 20))
-    pygame.draw.ellipse(surface, outline_color, (10, 25, 30, 20), 2)
+    canvas.ellipse(main_color, (10, 25, 30, 20))
+    canvas.ellipse(outline_color, (10, 25, 30, 20), 2)
     
     # Crown spikes
     points = [(10, 25), (15, 10), (20, 20), (25, 5), (30, 20), (35, 10), (40, 25)]
     for i in range(len(points) - 1):
-        pygame.draw.line(surface, outline_color, points[i], points[i + 1], 2)
+        canvas.line(outline_color, points[i], points[i + 1], 2)
     
     # Fill crown
     crown_points = [(10, 25), (15, 10), (20, 20), (25, 5), (30, 20), (35, 10), (40, 25), (40, 35), (10, 35)]
-    pygame.draw.polygon(surface, main_color, crown_points)
-    pygame.draw.polygon(surface, outline_color, crown_points, 2)
+    canvas.polygon(main_color, crown_points)
+    canvas.polygon(outline_color, crown_points, 2)
     
-    return surface
+    return canvas.finish()
 
-def create_rook(color):
+def create_rook(color, size=PIECE_SIZE):
     """Create a rook piece image"""
-    surface = pygame.Surface((PIECE_SIZE, PIECE_SIZE), pygame.SRCALPHA)
+    canvas = Canvas(size)
     main_color = COLORS[color]
     outline_color = COLORS['outline']
     
     # Castle body
-    pygame.draw.rect(surface, main_color, (15, 15, 20, 30))
-    pygame.draw.rect(surface, outline_color, (15, 15, 20, 30), 2)
+    canvas.rect(main_color, (15, 15, 20, 30))
+    canvas.rect(outline_color, (15, 15, 20, 30), 2)
     
     # Castle battlements
-    pygame.draw.rect(surface, main_color, (12, 10, 26, 10))
-    pygame.draw.rect(surface, outline_color, (12, 10, 26, 10), 2)
+    canvas.rect(main_color, (12, 10, 26, 10))
+    canvas.rect(outline_color, (12, 10, 26, 10), 2)
     
     # Battlements details
-    pygame.draw.line(surface, outline_color, (17, 10), (17, 20), 2)
-    pygame.draw.line(surface, outline_color, (25, 10), (25, 20), 2)
-    pygame.draw.line(surface, outline_color, (33, 10), (33, 20), 2)
+    canvas.line(outline_color, (17, 10), (17, 20), 2)
+    canvas.line(outline_color, (25, 10), (25, 20), 2)
+    canvas.line(outline_color, (33, 10), (33, 20), 2)
     
-    return surface
+    return canvas.finish()
 
-def create_bishop(color):
+def create_bishop(color, size=PIECE_SIZE):
     """Create a bishop piece image"""
-    surface = pygame.Surface((PIECE_SIZE, PIECE_SIZE), pygame.SRCALPHA)
+    canvas = Canvas(size)
     main_color = COLORS[color]
     outline_color = COLORS['outline']
     
     # Bishop body (teardrop shape)
-    pygame.draw.ellipse(surface, main_color, (15, 20, 20, 25))
-    pygame.draw.ellipse(surface, outline_color, (15, 20, 20, 25), 2)
+    canvas.ellipse(main_color, (15, 20, 20, 25))
+    canvas.ellipse(outline_color, (15, 20, 20, 25), 2)
     
     # Bishop head
-    pygame.draw.circle(surface, main_color, (25, 15), 8)
-    pygame.draw.circle(surface, outline_color, (25, 15), 8, 2)
+    canvas.circle(main_color, (25, 15), 8)
+    canvas.circle(outline_color, (25, 15), 8, 2)
     
     # Bishop hat
-    pygame.draw.circle(surface, main_color, (25, 10), 4)
-    pygame.draw.circle(surface, outline_color, (25, 10), 4, 2)
+    canvas.circle(main_color, (25, 10), 4)
+    canvas.circle(outline_color, (25, 10), 4, 2)
     
     # Cross cut
-    pygame.draw.line(surface, outline_color, (20, 25), (30, 35), 2)
+    canvas.line(outline_color, (20, 25), (30, 35), 2)
     
-    return surface
+    return canvas.finish()
 
-def create_knight(color):
+def create_knight(color, size=PIECE_SIZE):
     """Create a knight piece image"""
-    surface = pygame.Surface((PIECE_SIZE, PIECE_SIZE), pygame.SRCALPHA)
+    canvas = Canvas(size)
     main_color = COLORS[color]
     outline_color = COLORS['outline']
     
     # Horse head shape
     points = [(15, 40), (20, 30), (18, 20), (22, 15), (28, 12), (35, 15), (38, 25), (35, 35), (30, 40)]
-    pygame.draw.polygon(surface, main_color, points)
-    pygame.draw.polygon(surface, outline_color, points, 2)
+    canvas.polygon(main_color, points)
+    canvas.polygon(outline_color, points, 2)
     
     # Horse ear
-    pygame.draw.polygon(surface, main_color, [(28, 12), (30, 8), (32, 12)])
-    pygame.draw.polygon(surface, outline_color, [(28, 12), (30, 8), (32, 12)], 2)
+    canvas.polygon(main_color, [(28, 12), (30, 8), (32, 12)])
+    canvas.polygon(outline_color, [(28, 12), (30, 8), (32, 12)], 2)
     
     # Eye
-    pygame.draw.circle(surface, outline_color, (30, 20), 2)
+    canvas.circle(outline_color, (30, 20), 2)
     
     # Mane
-    pygame.draw.line(surface, outline_color, (22, 15), (25, 25), 2)
+    canvas.line(outline_color, (22, 15), (25, 25), 2)
     
-    return surface
+    return canvas.finish()
 
-def create_pawn(color):
+def create_pawn(color, size=PIECE_SIZE):
     """Create a pawn piece image"""
-    surface = pygame.Surface((PIECE_SIZE, PIECE_SIZE), pygame.SRCALPHA)
+    canvas = Canvas(size)
     main_color = COLORS[color]
     outline_color = COLORS['outline']
     
     # Pawn head
-    pygame.draw.circle(surface, main_color, (25, 20), 8)
-    pygame.draw.circle(surface, outline_color, (25, 20), 8, 2)
+    canvas.circle(main_color, (25, 20), 8)
+    canvas.circle(outline_color, (25, 20), 8, 2)
     
     # Pawn body
-    pygame.draw.ellipse(surface, main_color, (18, 28, 14, 17))
-    pygame.draw.ellipse(surface, outline_color, (18, 28, 14, 17), 2)
-    
-    return surface
-
-def create_all_pieces():
-    """Create all chess piece images"""
-    # Create assets directory
-    assets_dir = "assets"
-    if not os.path.exists(assets_dir):
-        os.makedirs(assets_dir)
-    
-    piece_functions = {
-        'king': create_king,
-        'queen': create_queen,
-        'rook': create_rook,
-        'bishop': create_bishop,
-        'knight': create_knight,
-        'pawn': create_pawn
-    }
-    
-    colors = ['white', 'black']
-    
-    for color in colors:
-        for piece_name, piece_func in piece_functions.items():
-            surface = piece_func(color)
-            filename = f"{color}_{piece_name}.png"
-            filepath = os.path.join(assets_dir, filename)
-            pygame.image.save(surface, filepath)
-            print(f"Created {filepath}")
-    
-    print("All chess piece images created successfully!")
+    canvas.ellipse(main_color, (18, 28, 14, 17))
+    canvas.ellipse(outline_color, (18, 28, 14, 17), 2)
+    
+    return canvas.finish()
 
-if __name__ == "__main__":
-    create_all_pieces()
-    pygame.quit()
+PIECE_FUNCTIONS = {
+    'king': create_king,
+    'queen': create_queen,
+    'rook': create_rook,
+    'bishop': create_bishop,
+    'knight': create_knight,
+    'pawn': create_pawn
+}
+PIECE_COLORS = ['white', 'black']
+
+def render_sprite(job):
+    """Draw one sprite in a worker process, returning (color, name, size, RGBA bytes)"""
+    color, name, size = job
+    surface = PIECE_FUNCTIONS[name](color, size)
+    return color, name, size, pygame.image.tostring(surface, 'RGBA')
+
+def source_hash(sizes):
+    """Hash of everything the atlas is built from: this file's code and the sizes"""
+    digest = hashlib.sha256()
+    with open(os.path.abspath(__file__), 'rb') as source:
+        # Line endings depend on the checkout, so they do not count as a change
+        digest.update(source.read().replace(b'\r\n', b'\n'))
+    digest.update(json.dumps(sorted(sizes)).encode())
+    return digest.hexdigest()
+
+def atlas_is_current(assets_dir, content_hash):
+    """Check whether the atlas on disk was built from the same sources"""
+    try:
+        with open(os.path.join(assets_dir, MANIFEST_FILE)) as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError):
+        return False
+    return (manifest.get('hash') == content_hash and
+            os.path.exists(os.path.join(assets_dir, manifest.get('image', ATLAS_FILE))))
+
+def build_atlas(sizes=ATLAS_SIZES, assets_dir=ASSETS_DIR, force=False, workers=None):
+    """Render every piece at every size into the atlas and manifest
 
+    Returns False without touching the files when they are already up to date.
+    """
+    sizes = sorted(set(sizes))
+    content_hash = source_hash(sizes)
+    if not force and atlas_is_current(assets_dir, content_hash):
+        return False
+    os.makedirs(assets_dir, exist_ok=True)
+    
+    # One row per size, one column per piece
+    names = [(color, name) for color in PIECE_COLORS for name in PIECE_FUNCTIONS]
+    row_y = {}
+    height = 0
+    for size in sizes:
+        row_y[size] = height
+        height += size
+    atlas = pygame.Surface((max(sizes) * len(names), height), pygame.SRCALPHA)
+    sprites = {str(size): {} for size in sizes}
+    
+    jobs = [(color, name, size) for size in sizes for color, name in names]
+    with ProcessPoolExecutor(workers) as executor:
+        for color, name, size, pixels in executor.map(render_sprite, jobs):
+            x = names.index((color, name)) * size
+            y = row_y[size]
+            atlas.blit(pygame.image.fromstring(pixels, (size, size), 'RGBA'), (x, y))
+            sprites[str(size)][f"{color}_{name}"] = [x, y, size, size]
+    
+    pygame.image.save(atlas, os.path.join(assets_dir, ATLAS_FILE))
+    manifest = {'hash': content_hash, 'image': ATLAS_FILE, 'sizes': sizes, 'sprites': sprites}
+    with open(os.path.join(assets_dir, MANIFEST_FILE), 'w') as manifest_file:
+        json.dump(manifest, manifest_file)
+    return True
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the chess piece sprite atlas")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(ATLAS_SIZES),
+                        help="sprite sizes in pixels (default: %(default)s)")
+    parser.add_argument('--assets', default=ASSETS_DIR, help="output directory (default: %(default)s)")
+    parser.add_argument('--force', action='store_true', help="rebuild even if the sources are unchanged")
+    parser.add_argument('--workers', type=int, help="worker processes (default: one per CPU)")
+    args = parser.parse_args(argv)
+    
+    if build_atlas(args.sizes, args.assets, args.force, args.workers):
+        print(f"Created {os.path.join(args.assets, ATLAS_FILE)} and {MANIFEST_FILE} "
+              f"with sizes {sorted(set(args.sizes))}")
+    else:
+        print("Piece atlas is up to date")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
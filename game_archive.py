@@ -0,0 +1,356 @@
+"""Compact binary game archive with memory-mapped random access.
+
+Usage:
+    python game_archive.py import games.pgn games.cga
+    python game_archive.py export games.cga [--index 12] > games.pgn
+    python game_archive.py info games.cga
+    python game_archive.py reindex games.cga
+
+An archive is a file of game records plus a sidecar index (archive + ".idx")
+holding one little-endian u64 file offset per game. The archive starts with
+an 8-byte file header (magic and version) and each game record is:
+
+    u32 move count, u8 result, u8 reserved, u16 FEN length, u16 tags length
+    FEN (UTF-8, empty for the standard start), tags (JSON object, UTF-8)
+    one little-endian u16 per ply, packed by encode_move()
+
+Readers map both files with mmap, so game i is found through the index and
+decoded without touching any other record. The move count of the last game
+can be patched in place, which is how live games are streamed in move by move.
+"""
+import os
+import sys
+import json
+import mmap
+import struct
+import argparse
+from array import array
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from chess_game import ChessBoard, STARTING_FEN, decode_move
+from pgn import parse_game, parse_san, game_result, moves_to_pgn, iter_sources
+
+# Constants
+MAGIC = b"CGA1"
+VERSION = 1
+FILE_HEADER = struct.Struct("<4sHH")  # Magic, version, reserved
+GAME_HEADER = struct.Struct("<IBBHH")  # Move count, result, reserved, FEN length, tags length
+OFFSET = struct.Struct("<Q")
+RESULT_CODES = {"*": 0, "1-0": 1, "0-1": 2, "1/2-1/2": 3}
+RESULT_NAMES = {code: name for name, code in RESULT_CODES.items()}
+INDEX_SUFFIX = ".idx"
+INDEX_BATCH = 256  # Finished games buffered before their index entries are published
+
+
+def _moves_from_bytes(data):
+    """Decode little-endian u16 moves into an array('H')"""
+    moves = array('H')
+    moves.frombytes(data)
+    if sys.byteorder == 'big':
+        moves.byteswap()
+    return moves
+
+
+def _moves_to_bytes(moves):
+    moves = array('H', moves)
+    if sys.byteorder == 'big':
+        moves.byteswap()
+    return moves.tobytes()
+
+
+def _record_fields(start_fen, tags):
+    """Encode the FEN and tags stored after a game header"""
+    fen = b"" if start_fen == STARTING_FEN else start_fen.encode()
+    tag_bytes = json.dumps(tags, separators=(',', ':')).encode() if tags else b""
+    if len(fen) > 0xFFFF or len(tag_bytes) > 0xFFFF:
+        raise ValueError("FEN or tags too long for the archive header")
+    return fen, tag_bytes
+
+
+class ArchivedGame:
+    """One game read from an archive"""
+    def __init__(self, moves, result="*", tags=None, start_fen=STARTING_FEN):
+        self.moves = moves  # array('H') of packed moves
+        self.result = result
+        self.tags = tags or {}
+        self.start_fen = start_fen
+
+    def __len__(self):
+        return len(self.moves)
+
+    def to_board(self):
+        """Replay the game on a new ChessBoard, with its full move history"""
+        board = ChessBoard.from_fen(self.start_fen)
+        for code in self.moves:
+            board.execute_move(*decode_move(code))
+        return board
+
+    def to_pgn(self):
+        return moves_to_pgn(self.moves, self.tags, self.start_fen, self.result)
+
+
+class LiveGame:
+    """Handle for a game being appended move by move (the archive's last record)"""
+    def __init__(self, writer, offset, header):
+        self.writer = writer
+        self.offset = offset
+        self.move_count, self.result, self.fen_length, self.tags_length = header
+
+    def append(self, move_code):
+        """Add one packed move and publish the new move count"""
+        self._check_open()
+        archive = self.writer.archive
+        archive.seek(0, os.SEEK_END)
+        archive.write(_moves_to_bytes([move_code]))
+        self.move_count += 1
+        self._patch_header()
+
+    def finish(self, result):
+        """Record the game's result"""
+        self._check_open()
+        self.result = RESULT_CODES[result]
+        self._patch_header()
+
+    def _check_open(self):
+        # Moves go at the end of the file, so only the archive's last record can grow
+        if self.writer.live is not self:
+            raise ValueError("live game is no longer the last record in the archive")
+
+    def _patch_header(self):
+        # Moves are written before the count, so readers never see unwritten plies
+        archive = self.writer.archive
+        archive.flush()
+        archive.seek(self.offset)
+        archive.write(GAME_HEADER.pack(self.move_count, self.result, 0, self.fen_length, self.tags_length))
+        archive.flush()
+        archive.seek(0, os.SEEK_END)
+
+
+class ArchiveWriter:
+    """Appends games to an archive and its index, creating them if needed"""
+    def __init__(self, path):
+        self.path = path
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.archive = open(path, 'w+b' if new else 'r+b')
+        if new:
+            self.archive.write(FILE_HEADER.pack(MAGIC, VERSION, 0))
+        else:
+            _check_file_header(self.archive.read(FILE_HEADER.size), path)
+        self.archive.seek(0, os.SEEK_END)
+        self.index = open(path + INDEX_SUFFIX, 'ab')
+        self.pending_offsets = []
+        self.live = None
+
+    def begin_game(self, tags=None, start_fen=STARTING_FEN):
+        """Start a new record with no moves yet and return its LiveGame handle"""
+        fen, tag_bytes = _record_fields(start_fen, tags)
+        self.archive.seek(0, os.SEEK_END)
+        offset = self.archive.tell()
+        self.archive.write(GAME_HEADER.pack(0, RESULT_CODES["*"], 0, len(fen), len(tag_bytes)))
+        self.archive.write(fen)
+        self.archive.write(tag_bytes)
+        self.pending_offsets.append(offset)
+        self.flush()
+        self.live = LiveGame(self, offset, (0, RESULT_CODES["*"], len(fen), len(tag_bytes)))
+        return self.live
+
+    def add_game(self, moves, result="*", tags=None, start_fen=STARTING_FEN):
+        """Append a finished game in one write (readers see it once the writer flushes)"""
+        fen, tag_bytes = _record_fields(start_fen, tags)
+        self.archive.seek(0, os.SEEK_END)
+        offset = self.archive.tell()
+        self.archive.write(GAME_HEADER.pack(len(moves), RESULT_CODES[result], 0, len(fen), len(tag_bytes))
+                           + fen + tag_bytes + _moves_to_bytes(moves))
+        self.pending_offsets.append(offset)
+        self.live = None
+        if len(self.pending_offsets) >= INDEX_BATCH:
+            self.flush()
+
+    def add_board(self, board, tags=None, result=None):
+        """Append the moves recorded in a board's history up to the ply shown"""
+        start = ChessBoard()
+        start.load_board_state(board.history.checkpoints[0])
+        if result is None:
+            result = game_result(board)
+        self.add_game(board.history.moves[:board.current_ply], result, tags, start.to_fen())
+
+    def flush(self):
+        # Records reach the archive before their offsets reach the index,
+        # so a reader never maps an index entry past the end of the archive
+        self.archive.flush()
+        if self.pending_offsets:
+            self.index.write(b''.join(OFFSET.pack(offset) for offset in self.pending_offsets))
+            self.pending_offsets.clear()
+        self.index.flush()
+
+    def close(self):
+        self.flush()
+        self.archive.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _check_file_header(data, path):
+    if len(data) < FILE_HEADER.size:
+        raise ValueError(f"{path} is not a game archive")
+    magic, version, _ = FILE_HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} game archive")
+
+
+class ArchiveReader:
+    """Random access to the games of an archive through memory maps"""
+    def __init__(self, path):
+        self.path = path
+        self.archive_file = open(path, 'rb')
+        self.index_file = open(path + INDEX_SUFFIX, 'rb')
+        self.archive = self.index = None
+        self.refresh()
+        _check_file_header(self.archive[:FILE_HEADER.size], path)
+
+    def refresh(self):
+        """Remap both files to see games appended since opening"""
+        self._close_maps()
+        self.archive = self._map(self.archive_file)
+        self.index = self._map(self.index_file)
+
+    @staticmethod
+    def _map(file):
+        if os.fstat(file.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.index) // OFFSET.size
+
+    def offset(self, number):
+        if not -len(self) <= number < len(self):
+            raise IndexError(f"game {number} out of range")
+        return OFFSET.unpack_from(self.index, (number % len(self)) * OFFSET.size)[0]
+
+    def moves(self, number):
+        """Get only the packed moves of a game"""
+        offset = self.offset(number)
+        move_count, _, _, fen_length, tags_length = GAME_HEADER.unpack_from(self.archive, offset)
+        start = offset + GAME_HEADER.size + fen_length + tags_length
+        return _moves_from_bytes(self.archive[start:start + 2 * move_count])
+
+    def __getitem__(self, number):
+        """Decode game number (0-based) without reading any other record"""
+        offset = self.offset(number)
+        move_count, result, _, fen_length, tags_length = GAME_HEADER.unpack_from(self.archive, offset)
+        position = offset + GAME_HEADER.size
+        start_fen = bytes(self.archive[position:position + fen_length]).decode() or STARTING_FEN
+        position += fen_length
+        tags = json.loads(bytes(self.archive[position:position + tags_length])) if tags_length else {}
+        position += tags_length
+        moves = _moves_from_bytes(self.archive[position:position + 2 * move_count])
+        return ArchivedGame(moves, RESULT_NAMES.get(result, "*"), tags, start_fen)
+
+    def __iter__(self):
+        for number in range(len(self)):
+            yield self[number]
+
+    def _close_maps(self):
+        for mapped in (self.archive, self.index):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+
+    def close(self):
+        self._close_maps()
+        self.archive_file.close()
+        self.index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def rebuild_index(path):
+    """Rewrite an archive's index by walking its records, returning the game count"""
+    offsets = []
+    with open(path, 'rb') as archive_file:
+        size = os.fstat(archive_file.fileno()).st_size
+        with mmap.mmap(archive_file.fileno(), 0, access=mmap.ACCESS_READ) as archive:
+            _check_file_header(archive[:FILE_HEADER.size], path)
+            offset = FILE_HEADER.size
+            while offset + GAME_HEADER.size <= size:
+                move_count, _, _, fen_length, tags_length = GAME_HEADER.unpack_from(archive, offset)
+                end = offset + GAME_HEADER.size + fen_length + tags_length + 2 * move_count
+                if end > size:
+                    break  # Truncated last record
+                offsets.append(offset)
+                offset = end
+    with open(path + INDEX_SUFFIX, 'wb') as index:
+        index.write(b''.join(OFFSET.pack(offset) for offset in offsets))
+    return len(offsets)
+
+
+def import_pgn(sources, path):
+    """Append PGN games to an archive, returning (imported, skipped) counts"""
+    board = ChessBoard()
+    imported = skipped = 0
+    with ArchiveWriter(path) as writer:
+        for text in sources:
+            tags, sans, result = parse_game(text)
+            start_fen = tags.pop('FEN', STARTING_FEN)
+            tags.pop('SetUp', None)
+            try:
+                board.load_fen(start_fen, update_status=False)
+                for san in sans:
+                    board.execute_move(*parse_san(board, san))
+            except ValueError:
+                skipped += 1
+                continue
+            tags.pop('Result', None)
+            writer.add_game(board.history.moves, result if result in RESULT_CODES else "*", tags, start_fen)
+            imported += 1
+    return imported, skipped
+
+
+def export_pgn(path, output, numbers=None):
+    """Write games of an archive (all, or the given numbers) to a text stream as PGN"""
+    with ArchiveReader(path) as reader:
+        for number in numbers if numbers is not None else range(len(reader)):
+            output.write(reader[number].to_pgn() + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Binary chess game archives")
+    commands = parser.add_subparsers(dest='command', required=True)
+    import_command = commands.add_parser('import', help="append PGN games to an archive")
+    import_command.add_argument('pgn', nargs='+', help="PGN files, or '-' for stdin")
+    import_command.add_argument('archive')
+    export_command = commands.add_parser('export', help="write archived games as PGN")
+    export_command.add_argument('archive')
+    export_command.add_argument('--index', type=int, action='append', help="game number (repeatable)")
+    info_command = commands.add_parser('info', help="show game and move counts")
+    info_command.add_argument('archive')
+    reindex_command = commands.add_parser('reindex', help="rebuild the .idx file")
+    reindex_command.add_argument('archive')
+    args = parser.parse_args(argv)
+
+    if args.command == 'import':
+        imported, skipped = import_pgn(iter_sources(args.pgn), args.archive)
+        print(f"Imported {imported} games, skipped {skipped} with illegal moves", file=sys.stderr)
+    elif args.command == 'export':
+        export_pgn(args.archive, sys.stdout, args.index)
+    elif args.command == 'info':
+        with ArchiveReader(args.archive) as reader:
+            plies = sum(len(reader.moves(number)) for number in range(len(reader)))
+            print(f"{len(reader)} games, {plies} plies, {os.path.getsize(args.archive)} bytes")
+    else:
+        print(f"Indexed {rebuild_index(args.archive)} games", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""Call counters and timers for the rules engine and the AI search.
+
+Instrumentation wraps methods on individual ChessBoard and ChessAI objects by
+shadowing them with instance attributes, so nothing is timed (and nothing
+costs anything) until attach() is called, and detach() restores the plain
+class methods. Times are inclusive: is_in_check time spent inside
+get_valid_moves is counted under both.
+
+    stats = Instrumentation(sink=JsonLinesSink("search.jsonl"))
+    stats.attach(board, ai)
+    ai.get_move(board)
+    print(stats.snapshot())
+    stats.detach()
+"""
+import json
+import time
+
+# Methods wrapped by default on each kind of object
+BOARD_METHODS = (
+    "get_valid_moves",  # Move generation for one piece
+    "get_all_valid_moves",  # Move generation for one side
+    "is_in_check",  # Check detection
+    "is_square_attacked",
+    "would_square_be_attacked",
+    "execute_move",
+    "apply_move",
+    "update_game_status",
+    "position_key"
+)
+AI_METHODS = (
+    "evaluate",
+    "get_move",
+    "search"
+)
+
+
+class Instrumentation:
+    """Counts calls and accumulates time for methods of attached objects"""
+    def __init__(self, sink=None):
+        self.calls = {}
+        self.seconds = {}
+        self.searches = []  # Report dicts of searches finished while attached
+        self.sink = sink  # Optional callable receiving each search report dict
+        self._attached = []
+        self._previous_callbacks = []
+
+    def attach(self, *objects):
+        """Start timing the known methods of each ChessBoard or ChessAI object"""
+        for obj in objects:
+            names = AI_METHODS if hasattr(obj, "transposition_table") else BOARD_METHODS
+            for name in names:
+                if name in vars(obj):
+                    continue  # Already attached
+                key = f"{type(obj).__name__}.{name}"
+                setattr(obj, name, self._timed(key, getattr(obj, name)))
+                self._attached.append((obj, name))
+            if hasattr(obj, "on_report"):
+                self._previous_callbacks.append((obj, obj.on_report))
+                obj.on_report = self.record_search
+        return self
+
+    def detach(self):
+        """Restore the original methods and report callbacks"""
+        for obj, name in self._attached:
+            vars(obj).pop(name, None)
+        for obj, callback in self._previous_callbacks:
+            obj.on_report = callback
+        self._attached = []
+        self._previous_callbacks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.detach()
+
+    def _timed(self, key, method):
+        """Wrap a bound method so each call is counted and timed under key"""
+        calls = self.calls
+        seconds = self.seconds
+        calls.setdefault(key, 0)
+        seconds.setdefault(key, 0.0)
+        clock = time.perf_counter
+
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                seconds[key] += clock() - start
+                calls[key] += 1
+        return timed
+
+    def record_search(self, report):
+        """Store a finished search report together with the timers so far"""
+        record = report.to_dict()
+        record['timers'] = self.timers()
+        self.searches.append(record)
+        if self.sink:
+            self.sink(record)
+
+    def timers(self):
+        """Get {method: {'calls': n, 'seconds': s}} for every timed method"""
+        return {key: {'calls': self.calls[key], 'seconds': round(self.seconds[key], 6)}
+                for key in sorted(self.calls)}
+
+    def snapshot(self):
+        """Get timers and search totals as a JSON-friendly dict"""
+        nodes = sum(search['nodes'] for search in self.searches)
+        search_time = sum(search['time'] for search in self.searches)
+        return {
+            'timers': self.timers(),
+            'searches': len(self.searches),
+            'nodes': nodes,
+            'nps': int(nodes / search_time) if search_time > 0 else 0,
+            'hash_hits': sum(search['hash_hits'] for search in self.searches),
+            'cutoffs': sum(search['cutoffs'] for search in self.searches)
+        }
+
+    def reset(self):
+        """Zero all counters without detaching"""
+        for key in self.calls:
+            self.calls[key] = 0
+            self.seconds[key] = 0.0
+        self.searches = []
+
+
+class JsonLinesSink:
+    """Callable that appends each record as one JSON line to a file"""
+    def __init__(self, path_or_file):
+        if isinstance(path_or_file, str):
+            self.file = open(path_or_file, 'a')
+            self.owns_file = True
+        else:
+            self.file = path_or_file
+            self.owns_file = False
+
+    def __call__(self, record):
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def close(self):
+        if self.owns_file:
+            self.file.close()
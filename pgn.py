@@ -0,0 +1,379 @@
+"""Streaming PGN reader, SAN conversion and a parallel game validator.
+
+Usage:
+    python pgn.py games.pgn [more.pgn ...] [--workers N] [--unordered]
+    cat games.pgn | python pgn.py -
+"""
+import os
+import re
+import sys
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from chess_game import ChessBoard, Color, PieceType, STARTING_FEN, SQUARE_NAMES, decode_move
+
+# Constants
+CHUNK_SIZE = 1 << 16  # Characters read from the input per chunk
+BATCH_SIZE = 32  # Games sent to a worker process at a time
+MAX_PENDING_BATCHES = 4  # Batches in flight per worker, bounds memory use
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+SEVEN_TAG_ROSTER = ("Event", "Site", "Date", "Round", "White", "Black", "Result")
+
+SAN_PIECES = {
+    'K': PieceType.KING,
+    'Q': PieceType.QUEEN,
+    'R': PieceType.ROOK,
+    'B': PieceType.BISHOP,
+    'N': PieceType.KNIGHT
+}
+SAN_LETTERS = {piece_type: letter for letter, piece_type in SAN_PIECES.items()}
+
+TAG_RE = re.compile(r'^\[(\w+)\s+"((?:[^"\\]|\\.)*)"\]\s*$')
+TOKEN_RE = re.compile(r'\{[^}]*\}?|;[^\n]*|\$\d+|\(|\)|1-0|0-1|1/2-1/2|\*|\d+\.+|[^\s(){};.]+')
+SAN_RE = re.compile(r'^([KQRBN])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([QRBN]))?$')
+CASTLING_SAN = {'O-O': 6, '0-0': 6, 'O-O-O': 2, '0-0-0': 2}
+
+
+def iter_lines(stream, chunk_size=CHUNK_SIZE):
+    """Yield lines from a text stream, reading it in fixed-size chunks"""
+    pending = ''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        lines = (pending + chunk).split('\n')
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+def read_pgn_games(stream, chunk_size=CHUNK_SIZE):
+    """Yield the raw text of each game in a PGN stream, one game at a time"""
+    lines = []
+    seen_moves = False
+    for line in iter_lines(stream, chunk_size):
+        stripped = line.strip()
+        # A tag line after movetext starts the next game
+        if stripped.startswith('[') and seen_moves:
+            yield '\n'.join(lines)
+            lines = []
+            seen_moves = False
+        if stripped and not stripped.startswith(('[', '%')):
+            seen_moves = True
+        lines.append(line)
+    if any(line.strip() for line in lines):
+        yield '\n'.join(lines)
+
+
+def tokenize_movetext(text):
+    """Yield ('move', san) and ('result', result) tokens, skipping comments and variations"""
+    depth = 0
+    for match in TOKEN_RE.finditer(text):
+        token = match.group()
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth = max(0, depth - 1)
+        elif depth or token[0] in '{;$' or token[0].isdigit() and token.endswith('.'):
+            continue
+        elif token in RESULTS:
+            yield 'result', token
+        else:
+            yield 'move', token
+
+
+def parse_game(text):
+    """Split a game's text into (tags, san_moves, result)"""
+    tags = {}
+    movetext = []
+    for line in text.split('\n'):
+        match = TAG_RE.match(line.strip())
+        if match:
+            tags[match.group(1)] = match.group(2).replace('\\"', '"').replace('\\\\', '\\')
+        elif not line.startswith('%'):
+            movetext.append(line)
+
+    moves = []
+    result = tags.get('Result', '*')
+    for kind, token in tokenize_movetext('\n'.join(movetext)):
+        if kind == 'move':
+            moves.append(token)
+        else:
+            result = token
+    return tags, moves, result
+
+
+def parse_san(board, san):
+    """Resolve a SAN move to (from_row, from_col, to_row, to_col) with the board's move generator"""
+    token = san.rstrip('+#!?')
+    color = board.current_player
+
+    if token in CASTLING_SAN:
+        row = 7 if color == Color.WHITE else 0
+        to_col = CASTLING_SAN[token]
+        king = board.board[row][4]
+        if king and king.type == PieceType.KING and king.color == color:
+            if (row, to_col) in board.get_valid_moves(king):
+                return row, 4, row, to_col
+        raise ValueError(f"illegal castling {san!r}")
+
+    match = SAN_RE.match(token)
+    if not match:
+        raise ValueError(f"unreadable move {san!r}")
+    letter, from_file, from_rank, target, promotion = match.groups()
+    if promotion and promotion != 'Q':
+        raise ValueError(f"underpromotion is not supported {san!r}")
+    piece_type = SAN_PIECES[letter] if letter else PieceType.PAWN
+    to_square = SQUARE_NAMES.index(target)
+    to_row, to_col = to_square // 8, to_square % 8
+
+    candidates = []
+    for piece in board.get_all_pieces(color):
+        if piece.type != piece_type:
+            continue
+        if from_file and piece.col != ord(from_file) - ord('a'):
+            continue
+        if from_rank and piece.row != 8 - int(from_rank):
+            continue
+        # Cheap geometry test first; en passant captures land on an empty square
+        if piece_type == PieceType.PAWN:
+            if abs(piece.col - to_col) > 1:
+                continue
+        elif not board.is_valid_move(piece, to_row, to_col):
+            continue
+        if (to_row, to_col) in board.get_valid_moves(piece):
+            candidates.append(piece)
+
+    if not candidates:
+        raise ValueError(f"illegal move {san!r}")
+    if len(candidates) > 1:
+        raise ValueError(f"ambiguous move {san!r}")
+    piece = candidates[0]
+    return piece.row, piece.col, to_row, to_col
+
+
+def move_to_san(board, from_row, from_col, to_row, to_col):
+    """Get the SAN for a legal move in the current position, without a check marker"""
+    piece = board.board[from_row][from_col]
+    if piece.type == PieceType.KING and abs(from_col - to_col) == 2:
+        return 'O-O' if to_col == 6 else 'O-O-O'
+
+    target = SQUARE_NAMES[to_row * 8 + to_col]
+    if piece.type == PieceType.PAWN:
+        san = f"{'abcdefgh'[from_col]}x{target}" if from_col != to_col else target
+        if to_row in (0, 7):
+            san += '=Q'
+        return san
+
+    # Disambiguate between pieces of the same type that reach the same square
+    rivals = [other for other in board.get_all_pieces(piece.color)
+              if other is not piece and other.type == piece.type
+              and board.is_valid_move(other, to_row, to_col)
+              and (to_row, to_col) in board.get_valid_moves(other)]
+    disambiguation = ''
+    if rivals:
+        if all(other.col != from_col for other in rivals):
+            disambiguation = 'abcdefgh'[from_col]
+        elif all(other.row != from_row for other in rivals):
+            disambiguation = str(8 - from_row)
+        else:
+            disambiguation = SQUARE_NAMES[from_row * 8 + from_col]
+    capture = 'x' if board.board[to_row][to_col] else ''
+    return f"{SAN_LETTERS[piece.type]}{disambiguation}{capture}{target}"
+
+
+def check_suffix(board):
+    """Get the SAN check marker for the side to move after a move was executed"""
+    if board.checkmate:
+        return '#'
+    return '+' if board.in_check else ''
+
+
+def game_result(board):
+    """Get the PGN result string for a board's current status"""
+    if board.checkmate:
+        return "1-0" if board.winner == Color.WHITE else "0-1"
+    if board.game_over:
+        return "1/2-1/2"
+    return "*"
+
+
+def moves_to_pgn(moves, tags=None, start_fen=STARTING_FEN, result=None):
+    """Build PGN text from packed 16-bit moves played from start_fen"""
+    board = ChessBoard.from_fen(start_fen)
+    first_player = board.current_player
+    tokens = []
+    for code in moves:
+        from_row, from_col, to_row, to_col = decode_move(code)
+        if board.current_player == Color.WHITE:
+            tokens.append(f"{board.fullmove_number}.")
+        elif not tokens:
+            tokens.append(f"{board.fullmove_number}...")
+        san = move_to_san(board, from_row, from_col, to_row, to_col)
+        board.execute_move(from_row, from_col, to_row, to_col)
+        tokens.append(san + check_suffix(board))
+
+    if result is None:
+        result = game_result(board)
+    # Seven tag roster first, in its standard order
+    extra_tags = dict(tags or {})
+    tags = {name: extra_tags.pop(name, "?") for name in SEVEN_TAG_ROSTER}
+    tags.update(extra_tags)
+    tags["Result"] = result
+    if start_fen != STARTING_FEN or first_player != Color.WHITE:
+        tags["SetUp"] = "1"
+        tags["FEN"] = start_fen
+    tokens.append(result)
+
+    # Wrap movetext at 80 columns
+    lines = []
+    line = ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > 80:
+            lines.append(line)
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    lines.append(line)
+    header = '\n'.join(f'[{name} "{value}"]' for name, value in tags.items())
+    return f"{header}\n\n" + '\n'.join(lines) + "\n"
+
+
+def board_to_pgn(board, tags=None):
+    """Build PGN text for the moves recorded in a board's history"""
+    start = ChessBoard()
+    start.load_board_state(board.history.checkpoints[0])
+    return moves_to_pgn(board.history.moves[:board.current_ply], tags, start.to_fen())
+
+
+_worker_board = None
+
+
+def validate_game(index, text, board=None):
+    """Replay one game's text and report its status as a dict"""
+    tags, moves, result = parse_game(text)
+    if board is None:
+        board = ChessBoard()
+    report = {
+        'index': index,
+        'white': tags.get('White', '?'),
+        'black': tags.get('Black', '?'),
+        'result': result,
+        'plies': 0,
+        'error': None
+    }
+    try:
+        board.load_fen(tags.get('FEN', STARTING_FEN))
+        for san in moves:
+            # Repetition and fifty-move draws can be played on; only mate and stalemate end a game
+            if board.game_over and (board.checkmate or board.is_stalemate(board.current_player)):
+                raise ValueError(f"move {san!r} after the game ended")
+            from_row, from_col, to_row, to_col = parse_san(board, san)
+            board.execute_move(from_row, from_col, to_row, to_col)
+            report['plies'] += 1
+        if board.checkmate and result != game_result(board):
+            raise ValueError(f"result {result} does not match checkmate")
+    except ValueError as error:
+        move_number = report['plies'] // 2 + 1
+        report['error'] = f"ply {report['plies'] + 1} (move {move_number}): {error}"
+    return report
+
+
+def validate_batch(batch):
+    """Validate a list of (index, text) games with this process's reusable board"""
+    global _worker_board
+    if _worker_board is None:
+        _worker_board = ChessBoard()
+    return [validate_game(index, text, _worker_board) for index, text in batch]
+
+
+def iter_batches(games, batch_size):
+    """Group an iterable of games into lists of (index, text)"""
+    numbered = enumerate(games)
+    while True:
+        batch = list(islice(numbered, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def validate_games(games, workers=None, ordered=True, batch_size=BATCH_SIZE):
+    """Validate games across a process pool, yielding one report per game
+
+    Only a bounded number of batches is in flight at once, so memory use
+    does not grow with the size of the input.
+    """
+    workers = workers or os.cpu_count() or 1
+    batches = iter_batches(games, batch_size)
+    if workers == 1:
+        for batch in batches:
+            yield from validate_batch(batch)
+        return
+
+    max_pending = workers * MAX_PENDING_BATCHES
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque() if ordered else set()
+        add = pending.append if ordered else pending.add
+        for batch in batches:
+            add(executor.submit(validate_batch, batch))
+            while len(pending) >= max_pending:
+                yield from _drain(pending, ordered)
+        while pending:
+            yield from _drain(pending, ordered)
+
+
+def _drain(pending, ordered):
+    """Yield reports from the oldest batch (ordered) or any finished batch"""
+    if ordered:
+        yield from pending.popleft().result()
+        return
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in done:
+        pending.discard(future)
+        yield from future.result()
+
+
+def iter_sources(paths, chunk_size=CHUNK_SIZE):
+    """Yield games from each path in turn, where '-' means stdin"""
+    for path in paths:
+        if path == '-':
+            yield from read_pgn_games(sys.stdin, chunk_size)
+            continue
+        with open(path, encoding='utf-8', errors='replace') as stream:
+            yield from read_pgn_games(stream, chunk_size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate PGN games against the chess rules engine")
+    parser.add_argument('paths', nargs='*', default=['-'], help="PGN files, '-' for stdin")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--unordered', action='store_true', help="report games as soon as they finish")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="games per worker task")
+    parser.add_argument('--quiet', action='store_true', help="only print the summary")
+    args = parser.parse_args(argv)
+
+    games = errors = plies = 0
+    start = time.perf_counter()
+    for report in validate_games(iter_sources(args.paths), args.workers, not args.unordered, args.batch_size):
+        games += 1
+        plies += report['plies']
+        if report['error']:
+            errors += 1
+            if not args.quiet:
+                print(f"game {report['index'] + 1} ({report['white']} vs {report['black']}): {report['error']}")
+    elapsed = time.perf_counter() - start
+
+    rate = games / elapsed if elapsed > 0 else 0.0
+    print(f"{games} games, {plies} plies, {errors} with errors in {elapsed:.2f}s "
+          f"({rate:.1f} games/sec)", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,490 @@
+"""Asyncio game server hosting many ChessBoard sessions over a JSON-lines TCP protocol.
+
+Usage:
+    python server.py serve --port 8765 --workers 4
+    python server.py loadgen --port 8765 --clients 200 --games 5 --ai easy
+
+Each request is one JSON object per line with an "op" and an optional "id"
+that is echoed in the response:
+
+    {"id": 1, "op": "new", "ai": "expert:depth=2", "color": "white", "clock": 300, "increment": 2}
+    {"id": 2, "op": "move", "game": 1, "move": "e2e4"}
+    {"id": 3, "op": "state", "game": 1}
+    {"id": 4, "op": "resign", "game": 1}
+    {"id": 5, "op": "close", "game": 1}
+
+Responses carry "ok" and either the game state or an "error". The server
+also pushes {"event": "move", ...} when the AI replies and {"event": "end", ...}
+when a game finishes by checkmate, a draw rule, resignation or time. If the
+AI's job fails, the client gets {"event": "error", ...} and the game ends as
+a loss for the AI ("engine failure"); a crashed worker pool is replaced.
+
+AI moves run in a process pool. A semaphore bounds the number of AI jobs in
+flight, so extra requests wait in the event loop instead of piling up in
+the pool. Closing, resigning or disconnecting cancels a game's pending AI job.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from chess_game import ChessBoard, Color, PieceType, STARTING_FEN
+from arena import parse_engine, make_ai, termination_reason
+from pgn import game_result
+from uci import parse_uci_move, format_uci_move
+
+# Constants
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_SESSIONS = 10000
+MAX_PENDING_PER_WORKER = 4  # AI jobs in flight per worker process
+MAX_LINE_LENGTH = 1 << 16  # Longest request line accepted
+CLOCK_MOVES_TO_GO = 30  # Moves an AI without a time setting spreads its clock over
+
+
+def legal_moves(board):
+    """Get the side to move's legal moves as UCI strings"""
+    moves = []
+    for piece, (to_row, to_col) in board.get_all_valid_moves(board.current_player):
+        promotion = piece.type == PieceType.PAWN and to_row in (0, 7)
+        moves.append(format_uci_move(piece.row, piece.col, to_row, to_col, promotion))
+    return moves
+
+
+_worker_board = None
+
+
+def choose_ai_move(fen, engine_spec, time_limit):
+    """Pick the AI's move for a FEN position, returning it as a UCI string or None"""
+    global _worker_board
+    if _worker_board is None:
+        _worker_board = ChessBoard()
+    board = _worker_board
+    board.load_fen(fen, update_status=False)
+    move = make_ai(parse_engine(engine_spec), time_limit).get_move(board)
+    if move is None:
+        return None
+    piece, (to_row, to_col) = move
+    promotion = piece.type == PieceType.PAWN and to_row in (0, 7)
+    return format_uci_move(piece.row, piece.col, to_row, to_col, promotion)
+
+
+class Session:
+    """One game: its board, clocks, AI opponent and pending AI job"""
+    def __init__(self, game_id, connection, board, engine, ai_color, clock, increment):
+        self.game_id = game_id
+        self.connection = connection
+        self.board = board
+        self.engine = engine  # Engine spec string of the AI opponent, or None for two humans
+        self.ai_color = ai_color
+        self.clock = {Color.WHITE: clock, Color.BLACK: clock} if clock else None
+        self.increment = increment
+        self.turn_started = time.monotonic()
+        self.result = None
+        self.reason = None
+        self.ai_task = None
+        self.flag_timer = None
+
+    @property
+    def over(self):
+        return self.result is not None
+
+    def remaining(self, color):
+        """Get the seconds left on a side's clock, counting the running turn"""
+        left = self.clock[color]
+        if color == self.board.current_player and not self.over:
+            left -= time.monotonic() - self.turn_started
+        return max(left, 0.0)
+
+    def state(self):
+        """Get the game's state as a JSON-friendly dict"""
+        state = {
+            'game': self.game_id,
+            'fen': self.board.to_fen(),
+            'turn': self.board.current_player.value,
+            'ply': self.board.current_ply,
+            'check': self.board.in_check,
+            'result': self.result,
+            'reason': self.reason,
+            'legal': [] if self.over else legal_moves(self.board)
+        }
+        if self.clock:
+            state['clock'] = {color.value: round(self.remaining(color), 3) for color in Color}
+        return state
+
+
+class GameServer:
+    """Hosts sessions for any number of TCP connections"""
+    def __init__(self, workers=None, max_sessions=MAX_SESSIONS):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_sessions = max_sessions
+        self.sessions = {}
+        self.next_game_id = 1
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.ai_slots = None  # Semaphore created on the server's event loop
+        self.moves = 0
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.ai_slots = asyncio.Semaphore(self.workers * MAX_PENDING_PER_WORKER)
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_LINE_LENGTH)
+        print(f"Serving on {host}:{port} with {self.workers} AI workers", file=sys.stderr)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def handle_connection(self, reader, writer):
+        """Answer one client's requests until it disconnects"""
+        connection = {'writer': writer, 'sessions': set()}
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):
+                    break  # Over-long line or reset connection
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                self.send(connection, self.handle_line(connection, line))
+                await writer.drain()  # Stop reading while the client is not reading replies
+        finally:
+            for game_id in list(connection['sessions']):
+                self.close_session(game_id)
+            writer.close()
+
+    def send(self, connection, message):
+        writer = connection['writer']
+        if not writer.is_closing():
+            writer.write((json.dumps(message) + "\n").encode())
+
+    def handle_line(self, connection, line):
+        """Handle one request line and return the response dict"""
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+            request_id = request.get('id')
+            handler = getattr(self, f"op_{request.get('op')}", None)
+            if handler is None:
+                raise ValueError(f"unknown op {request.get('op')!r}")
+            response = handler(connection, request)
+            response['ok'] = True
+        except (ValueError, TypeError, KeyError) as error:
+            response = {'ok': False, 'error': str(error)}
+        if request_id is not None:
+            response['id'] = request_id
+        return response
+
+    def session_for(self, connection, request):
+        game_id = request['game']
+        if game_id not in connection['sessions']:
+            raise ValueError(f"no game {game_id!r} on this connection")
+        return self.sessions[game_id]
+
+    def op_new(self, connection, request):
+        """Start a game, against the AI when 'ai' gives an engine spec"""
+        if len(self.sessions) >= self.max_sessions:
+            raise ValueError("server is full")
+        engine = request.get('ai')
+        if engine is not None:
+            parse_engine(engine)  # Reject bad specs now rather than in a worker
+        color = request.get('color', 'white')
+        if color not in ('white', 'black'):
+            raise ValueError(f"invalid color {color!r}")
+        clock = float(request.get('clock') or 0)
+        increment = float(request.get('increment') or 0)
+        board = ChessBoard.from_fen(request.get('fen', STARTING_FEN))
+
+        ai_color = Color.BLACK if color == 'white' else Color.WHITE
+        session = Session(self.next_game_id, connection, board, engine, ai_color, clock, increment)
+        self.next_game_id += 1
+        self.sessions[session.game_id] = session
+        connection['sessions'].add(session.game_id)
+        self.check_game_end(session)
+        self.start_turn(session)
+        return session.state()
+
+    def op_move(self, connection, request):
+        """Play a move for the side to move, given in UCI notation"""
+        session = self.session_for(connection, request)
+        if session.over:
+            raise ValueError("the game is over")
+        if session.engine and session.board.current_player == session.ai_color:
+            raise ValueError("it is the AI's turn")
+        self.play_move(session, request['move'])
+        return session.state()
+
+    def op_state(self, connection, request):
+        return self.session_for(connection, request).state()
+
+    def op_resign(self, connection, request):
+        """Resign for the side to move (or for the human against the AI)"""
+        session = self.session_for(connection, request)
+        if not session.over:
+            loser = session.board.current_player
+            if session.engine:
+                loser = Color.WHITE if session.ai_color == Color.BLACK else Color.BLACK
+            self.end_game(session, "0-1" if loser == Color.WHITE else "1-0", "resignation")
+        return session.state()
+
+    def op_close(self, connection, request):
+        session = self.session_for(connection, request)
+        self.close_session(session.game_id)
+        return {'game': session.game_id, 'closed': True}
+
+    def play_move(self, session, text):
+        """Validate and play a UCI move, charging the mover's clock"""
+        board = session.board
+        from_row, from_col, to_row, to_col = parse_uci_move(text)
+        piece = board.get_piece(from_row, from_col)
+        if not piece or piece.color != board.current_player or \
+                (to_row, to_col) not in board.get_valid_moves(piece):
+            raise ValueError(f"illegal move {text!r}")
+        if session.clock:
+            mover = board.current_player
+            if session.remaining(mover) <= 0:
+                self.flag(session)
+                raise ValueError("time forfeit")
+            session.clock[mover] = session.remaining(mover) + session.increment
+        board.execute_move(from_row, from_col, to_row, to_col)
+        self.moves += 1
+        self.check_game_end(session)
+        self.start_turn(session)
+
+    def start_turn(self, session):
+        """Restart the clock for the side to move and launch the AI if it is its turn"""
+        session.turn_started = time.monotonic()
+        if session.flag_timer:
+            session.flag_timer.cancel()
+            session.flag_timer = None
+        if session.over:
+            return
+        loop = asyncio.get_running_loop()
+        if session.clock:
+            session.flag_timer = loop.call_later(session.clock[session.board.current_player], self.flag, session)
+        if session.engine and session.board.current_player == session.ai_color:
+            session.ai_task = loop.create_task(self.ai_turn(session))
+
+    async def ai_turn(self, session):
+        """Get the AI's move from the pool and play it"""
+        engine = parse_engine(session.engine)
+        time_limit = engine['time_limit']
+        if session.clock and not time_limit:
+            time_limit = session.remaining(session.ai_color) / CLOCK_MOVES_TO_GO + session.increment * 0.8
+        fen = session.board.to_fen()
+        # Waiting here is the backpressure: at most ai_slots jobs reach the pool
+        async with self.ai_slots:
+            loop = asyncio.get_running_loop()
+            executor = self.executor
+            try:
+                move = await loop.run_in_executor(executor, choose_ai_move, fen, session.engine, time_limit)
+            except Exception as error:
+                session.ai_task = None
+                if isinstance(error, BrokenProcessPool) and executor is self.executor:
+                    self.restart_executor()
+                self.ai_failed(session, error)
+                return
+        session.ai_task = None
+        if session.over or session.game_id not in self.sessions:
+            return
+        if move is None:
+            self.check_game_end(session)
+            return
+        try:
+            self.play_move(session, move)
+        except ValueError:
+            return  # The AI's clock ran out while it was thinking
+        self.send(session.connection, dict(session.state(), event="move", move=move))
+
+    def restart_executor(self):
+        """Replace a pool whose worker died; jobs still queued on it fail with it"""
+        print("AI worker pool broke, starting a new one", file=sys.stderr)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def ai_failed(self, session, error):
+        """Report a failed AI job and adjudicate the game against the AI"""
+        if session.over or session.game_id not in self.sessions:
+            return
+        self.send(session.connection, {'event': "error", 'game': session.game_id,
+                                       'error': f"AI failed: {error!r}"})
+        self.end_game(session, "0-1" if session.ai_color == Color.WHITE else "1-0", "engine failure")
+
+    def flag(self, session):
+        """End the game on time for the side to move"""
+        if not session.over:
+            loser = session.board.current_player
+            session.clock[loser] = 0.0
+            self.end_game(session, "0-1" if loser == Color.WHITE else "1-0", "time forfeit")
+
+    def check_game_end(self, session):
+        if session.board.game_over and not session.over:
+            self.end_game(session, game_result(session.board), termination_reason(session.board))
+
+    def end_game(self, session, result, reason):
+        """Record the result, stop the clock and the AI, and tell the client"""
+        if session.clock:
+            player = session.board.current_player
+            session.clock[player] = session.remaining(player)
+        session.result = result
+        session.reason = reason
+        self.cancel_ai(session)
+        if session.flag_timer:
+            session.flag_timer.cancel()
+            session.flag_timer = None
+        # Sent on the next loop iteration, after the response or move event that ended the game
+        message = {'event': "end", 'game': session.game_id, 'result': result, 'reason': reason,
+                   'ply': session.board.current_ply}
+        asyncio.get_running_loop().call_soon(self.send, session.connection, message)
+
+    def cancel_ai(self, session):
+        """Cancel a pending AI job; one already running finishes in the pool and is ignored"""
+        if session.ai_task and session.ai_task is not asyncio.current_task():
+            session.ai_task.cancel()
+        session.ai_task = None
+
+    def close_session(self, game_id):
+        session = self.sessions.pop(game_id, None)
+        if session:
+            session.connection['sessions'].discard(game_id)
+            self.cancel_ai(session)
+            if session.flag_timer:
+                session.flag_timer.cancel()
+
+
+class LoadClient:
+    """Protocol client used by the load generator: requests by id, events by game"""
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.next_id = 1
+        self.pending = {}
+        self.events = {}
+        self.listener = asyncio.get_running_loop().create_task(self.listen())
+
+    async def listen(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            if 'event' in message:
+                self.events.setdefault(message['game'], asyncio.Queue()).put_nowait(message)
+            elif message.get('id') in self.pending:
+                self.pending.pop(message['id']).set_result(message)
+        for future in self.pending.values():
+            future.set_exception(ConnectionError("server closed the connection"))
+
+    async def request(self, op, **fields):
+        request_id = self.next_id
+        self.next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        self.writer.write((json.dumps(dict(fields, id=request_id, op=op)) + "\n").encode())
+        await self.writer.drain()
+        return await future
+
+    async def event(self, game_id):
+        return await self.events.setdefault(game_id, asyncio.Queue()).get()
+
+    async def close(self):
+        self.listener.cancel()
+        self.writer.close()
+
+
+async def play_load_games(host, port, games, settings, stats, rng):
+    """Play games on one connection with random legal moves, timing every request"""
+    reader, writer = await asyncio.open_connection(host, port, limit=MAX_LINE_LENGTH)
+    client = LoadClient(reader, writer)
+    try:
+        for _ in range(games):
+            state = await client.request('new', ai=settings['ai'], clock=settings['clock'])
+            game_id = state['game']
+            while state['result'] is None and state['ply'] < settings['max_plies']:
+                start = time.perf_counter()
+                state = await client.request('move', game=game_id, move=rng.choice(state['legal']))
+                stats['latencies'].append(time.perf_counter() - start)
+                stats['moves'] += 1
+                if not state['ok']:
+                    stats['errors'] += 1
+                    break
+                if settings['ai'] and state['result'] is None:
+                    # Wait for the AI's reply (or the end of the game)
+                    event = await client.event(game_id)
+                    stats['ai_latencies'].append(time.perf_counter() - start)
+                    if event['event'] == "move":
+                        stats['moves'] += 1
+                        state = event
+                    else:
+                        state = dict(state, result=event['result'])
+            await client.request('close', game=game_id)
+            stats['games'] += 1
+    finally:
+        await client.close()
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+async def run_load(host, port, clients, games, settings, seed):
+    stats = {'games': 0, 'moves': 0, 'errors': 0, 'latencies': [], 'ai_latencies': []}
+    start = time.perf_counter()
+    await asyncio.gather(*(play_load_games(host, port, games, settings, stats, random.Random(seed + index))
+                           for index in range(clients)))
+    elapsed = time.perf_counter() - start
+    print(f"{stats['games']} games, {stats['moves']} moves in {elapsed:.1f}s "
+          f"({stats['moves'] / elapsed:.0f} moves/sec), {stats['errors']} errors")
+    latencies = stats['latencies']
+    print(f"move latency: p50 {percentile(latencies, 0.5) * 1000:.2f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.2f} ms")
+    if stats['ai_latencies']:
+        print(f"AI reply latency: p50 {percentile(stats['ai_latencies'], 0.5) * 1000:.2f} ms, "
+              f"p99 {percentile(stats['ai_latencies'], 0.99) * 1000:.2f} ms")
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-game chess server and load generator")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve', help="run the game server")
+    loadgen = commands.add_parser('loadgen', help="play random games against a running server")
+    for command in (serve, loadgen):
+        command.add_argument('--host', default=DEFAULT_HOST)
+        command.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve.add_argument('--workers', type=int, default=None, help="AI worker processes (default: all cores)")
+    serve.add_argument('--max-sessions', type=int, default=MAX_SESSIONS)
+    loadgen.add_argument('--clients', type=int, default=100, help="concurrent connections")
+    loadgen.add_argument('--games', type=int, default=1, help="games played by each client in turn")
+    loadgen.add_argument('--ai', default=None, help="engine spec of the AI opponent (default: play both sides)")
+    loadgen.add_argument('--clock', type=float, default=0, help="seconds per side (default: untimed)")
+    loadgen.add_argument('--max-plies', type=int, default=200)
+    loadgen.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'serve':
+            asyncio.run(GameServer(args.workers, args.max_sessions).serve(args.host, args.port))
+        else:
+            settings = {'ai': args.ai, 'clock': args.clock, 'max_plies': args.max_plies}
+            asyncio.run(run_load(args.host, args.port, args.clients, args.games, settings, args.seed))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""Persistent analysis cache: stores, eviction and use by the search"""
+import itertools
+import types
+
+import pytest
+
+import analysis_cache
+from analysis_cache import AnalysisCache, EVICTION_INTERVAL
+from chess_game import ChessAI, ChessBoard, encode_move
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Give every store a distinct, increasing timestamp"""
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(analysis_cache, "time", types.SimpleNamespace(time=lambda: float(next(ticks))))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    with AnalysisCache(str(tmp_path / "cache.db")) as cache:
+        yield cache
+
+
+def test_put_and_get(cache):
+    high_key = (1 << 64) - 5
+    cache.put(high_key, 7, -120, encode_move(1, 4, 3, 4))
+    cache.put(42, 3, 15, None)
+    assert cache.get(high_key) == (7, -120, encode_move(1, 4, 3, 4))
+    assert cache.get(42) == (3, 15, None)
+    assert cache.get(43) is None
+    assert len(cache) == 2
+    cache.clear()
+    assert len(cache) == 0 and cache.get(42) is None
+
+
+def test_deeper_entry_wins(cache):
+    cache.put(1, 6, 30, 100)
+    cache.put(1, 4, -50, 200)
+    assert cache.get(1) == (6, 30, 100)
+    cache.put(1, 6, 35, 300)
+    assert cache.get(1) == (6, 35, 300)
+    cache.put(1, 9, 0, 400)
+    assert cache.get(1) == (9, 0, 400)
+
+
+def test_entries_are_shared_between_connections(tmp_path):
+    path = str(tmp_path / "cache.db")
+    with AnalysisCache(path) as writer, AnalysisCache(path) as reader:
+        writer.put(5, 2, 10, 99)
+        assert reader.get(5) == (2, 10, 99)
+
+
+def test_eviction_removes_shallowest_then_oldest(tmp_path, clock):
+    with AnalysisCache(str(tmp_path / "cache.db"), max_entries=100) as cache:
+        # Keys 0-39 at depth 1, then keys 40-127 at depth 5
+        for key in range(2 * EVICTION_INTERVAL):
+            cache.put(key, 1 if key < 40 else 5, 0, None)
+        # 28 entries over the limit plus 10% of it are removed at the 128th store
+        assert len(cache) == 90
+        assert [key for key in range(40) if cache.get(key)] == [38, 39]
+        assert all(cache.get(key) for key in range(40, 128))
+
+
+def test_eviction_waits_for_the_interval(tmp_path):
+    with AnalysisCache(str(tmp_path / "cache.db"), max_entries=10) as cache:
+        for key in range(EVICTION_INTERVAL - 1):
+            cache.put(key, 1, 0, None)
+        assert len(cache) == EVICTION_INTERVAL - 1
+        cache.put(EVICTION_INTERVAL, 1, 0, None)
+        assert len(cache) == 9
+
+
+def test_reopening_with_a_lower_limit_evicts(tmp_path, clock):
+    path = str(tmp_path / "cache.db")
+    with AnalysisCache(path) as cache:
+        for key in range(50):
+            cache.put(key, 2 if key % 2 else 3, 0, None)
+    with AnalysisCache(path, max_entries=20) as cache:
+        # 30 over the limit plus 2 are removed, all of them at depth 2
+        assert len(cache) == 18
+        assert all(cache.get(key) for key in range(0, 50, 2)[-18:])
+        assert not any(cache.get(key) for key in range(1, 50, 2))
+
+
+def test_search_continues_from_cached_result(cache):
+    board = ChessBoard()
+    first = ChessAI("expert", cache=cache)
+    move, score = first.search(board, max_depth=3)
+    key = board.position_key()
+    piece, (to_row, to_col) = move
+    assert cache.get(key) == (3, score, encode_move(piece.row, piece.col, to_row, to_col))
+
+    # A fresh AI returns a deep enough cached result without searching
+    second = ChessAI("expert", cache=cache)
+    assert second.search(board, max_depth=3) == (move, score)
+    assert second.last_report.nodes == 0
+
+    # and searches only the depths beyond it
+    depths = []
+    third = ChessAI("expert", cache=cache)
+    third.search(board, max_depth=4, on_depth=lambda report: depths.append(report.depth))
+    assert depths == [3, 4]
+    assert cache.get(key)[0] == 4
+
+
+def test_search_ignores_illegal_cached_move(cache):
+    board = ChessBoard()
+    # A move from an empty square, as if the key belonged to another position
+    cache.put(board.position_key(), 20, 999, encode_move(4, 4, 3, 4))
+    ai = ChessAI("expert", cache=cache)
+    depths = []
+    move, score = ai.search(board, max_depth=2, on_depth=lambda report: depths.append(report.depth))
+    assert depths == [1, 2]
+    assert move is not None and score != 999
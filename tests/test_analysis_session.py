@@ -0,0 +1,72 @@
+"""Background analysis: streaming multi-PV results and repetition history"""
+import time
+
+import pytest
+
+from chess_game import AnalysisSession, ChessAI, ChessBoard, encode_move
+from uci import parse_uci_move
+
+# White has only a king against king and queen, and can repeat the position
+LOST_FEN = "2q4k/8/8/8/8/8/8/6K1 w - - 0 1"
+REPETITION = ["g1h1", "h8g8", "h1g1", "g8h8"]
+
+
+def wait_for_reports(session, ready, timeout=10.0):
+    """Poll until the session's reports satisfy ready, returning them"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        reports = session.poll()
+        if reports and ready(reports):
+            return reports
+        time.sleep(0.02)
+    pytest.fail("no analysis results in time")
+
+
+@pytest.fixture
+def session():
+    session = AnalysisSession(lines=2, time_limit=1.0)
+    yield session
+    session.close()
+
+
+def test_reports_are_for_the_current_position(session):
+    board = ChessBoard()
+    session.analyze(board)
+    reports = wait_for_reports(session, lambda reports: reports[0].depth >= 2)
+    assert len(reports) == 2
+    assert reports[0].score >= reports[1].score
+    assert reports[0].pv[0] != reports[1].pv[0]
+
+    board.execute_move(*parse_uci_move("e2e4"))
+    session.analyze(board)
+    assert session.reports == [] and session.generation == 2
+    reports = wait_for_reports(session, lambda reports: True)
+    legal = {encode_move(piece.row, piece.col, to_row, to_col)
+             for piece, (to_row, to_col) in board.get_all_valid_moves(board.current_player)}
+    assert all(report.pv[0] in legal for report in reports)
+
+
+def test_same_position_is_not_restarted(session):
+    board = ChessBoard()
+    session.analyze(board)
+    ai = session.ai
+    session.analyze(board)
+    assert session.ai is ai and session.generation == 1
+    session.stop()
+    assert ai.stop_event.is_set() and session.fen is None
+
+
+def test_searches_see_the_game_history(session):
+    board = ChessBoard.from_fen(LOST_FEN)
+    for move in REPETITION:
+        board.execute_move(*parse_uci_move(move))
+    session.analyze(board)
+    reports = wait_for_reports(session, lambda reports: reports[0].depth >= 2)
+    # Going back to h1 repeats the game and holds the draw
+    assert reports[0].score == 0
+    assert reports[0].pv[0] == encode_move(*parse_uci_move("g1h1"))
+
+    # The same position without its history is simply lost
+    fresh = ChessAI("expert")
+    reports = fresh.search_multipv(ChessBoard.from_fen(board.to_fen()), 1, max_depth=2)
+    assert reports[0].score < -500
@@ -0,0 +1,46 @@
+"""Self-play arena: engine specs, game records and match statistics"""
+import pytest
+
+from arena import parse_engine, play_game, run_match, MatchStats, sprt_bounds
+from chess_game import ChessBoard, decode_move
+
+SETTINGS = {'seed': 1, 'opening_plies': 4, 'time_limit': None, 'time_margin': 0.25, 'max_plies': 30}
+
+
+def test_parse_engine():
+    engine = parse_engine("expert:depth=2:time=0.5")
+    assert engine == {'name': "expert:depth=2:time=0.5", 'difficulty': "expert", 'depth': 2, 'time_limit': 0.5}
+    with pytest.raises(ValueError):
+        parse_engine("grandmaster")
+    with pytest.raises(ValueError):
+        parse_engine("expert:nodes=5")
+
+
+def test_game_record_replays():
+    record = play_game((0, parse_engine("easy"), parse_engine("medium"), SETTINGS))
+    assert record['plies'] == len(record['moves']) <= SETTINGS['max_plies']
+    assert record['opening_plies'] == SETTINGS['opening_plies']
+    board = ChessBoard()
+    for code in record['codes']:
+        board.execute_move(*decode_move(code))
+    if record['termination'] == "max plies":
+        assert record['result'] == "1/2-1/2"
+
+
+def test_games_pair_openings_with_colors_swapped():
+    records = list(run_match(parse_engine("easy"), parse_engine("medium"), 2, SETTINGS, workers=1))
+    first, second = sorted(records, key=lambda record: record['index'])
+    assert (first['white'], second['white']) == ("easy", "medium")
+    assert first['moves'][:4] == second['moves'][:4]
+
+
+def test_match_stats():
+    stats = MatchStats()
+    for result, white in (("1-0", "a"), ("0-1", "a"), ("1/2-1/2", "b"), ("0-1", "b")):
+        stats.add({'result': result, 'white': white}, "a")
+    assert (stats.wins, stats.draws, stats.losses) == (2, 1, 1)
+    elo, margin = stats.elo()
+    assert elo > 0 and margin > 0
+    lower, upper = sprt_bounds(0.05, 0.05)
+    assert lower < 0 < upper
+    assert stats.llr(0, 10) > stats.llr(10, 0)
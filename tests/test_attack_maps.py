@@ -0,0 +1,86 @@
+"""Attack maps: full builds, incremental updates through apply/undo and their users"""
+import random
+
+import pytest
+
+from chess_game import ChessAI, ChessBoard, Color, PieceType, STARTING_FEN, KING_ZONE_ATTACK_WEIGHT
+
+
+def reference_attacks(board, color):
+    """Count attackers square by square with the move rules, treating every square as capturable"""
+    counts = [0] * 64
+    for piece in board.get_all_pieces(color):
+        for row in range(8):
+            for col in range(8):
+                if (row, col) == (piece.row, piece.col):
+                    continue
+                if piece.type == PieceType.PAWN:
+                    direction = -1 if color == Color.WHITE else 1
+                    attacked = row == piece.row + direction and abs(col - piece.col) == 1
+                else:
+                    occupant = board.board[row][col]
+                    board.board[row][col] = None
+                    attacked = board.is_valid_move(piece, row, col)
+                    board.board[row][col] = occupant
+                counts[row * 8 + col] += attacked
+    return counts
+
+
+@pytest.mark.parametrize("fen", [
+    STARTING_FEN,
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+])
+def test_full_build_matches_the_move_rules(fen):
+    board = ChessBoard.from_fen(fen)
+    for color in Color:
+        assert board.get_attack_map(color) == reference_attacks(board, color)
+
+
+def test_incremental_updates_match_a_full_build():
+    rng = random.Random(7)
+    for game in range(6):
+        board = ChessBoard()
+        board.get_attack_map(Color.WHITE)
+        undo_stack = []
+        for _ in range(120):
+            moves = board.get_all_valid_moves(board.current_player)
+            if not moves:
+                break
+            # Try every move so castling, en passant and promotions are all exercised
+            for piece, (to_row, to_col) in moves:
+                undo_info = board.apply_move(piece.row, piece.col, to_row, to_col)
+                assert board._attack_maps == board.compute_attack_maps()
+                board.undo_move(undo_info)
+            piece, (to_row, to_col) = rng.choice(moves)
+            undo_stack.append(board.apply_move(piece.row, piece.col, to_row, to_col))
+            assert board._attack_maps == board.compute_attack_maps()
+        while undo_stack:
+            board.undo_move(undo_stack.pop())
+        assert board._attack_maps == board.compute_attack_maps()
+        assert board.to_fen() == STARTING_FEN
+
+
+def test_direct_board_edits_rebuild_after_invalidate():
+    board = ChessBoard()
+    board.get_attack_map(Color.WHITE)
+    board.board[6][4] = None
+    board.invalidate_attack_maps()
+    assert board.get_attack_map(Color.BLACK) == board.compute_attack_maps()[Color.BLACK]
+
+
+def test_check_and_square_queries_use_the_maps():
+    board = ChessBoard.from_fen("4k3/8/8/8/8/8/8/4K2R w K - 0 1")
+    assert not board.is_in_check(Color.BLACK)
+    board.execute_move(7, 7, 0, 7)  # Rh8+
+    assert board.in_check and board.is_in_check(Color.BLACK)
+    assert board.would_square_be_attacked(0, 5, Color.BLACK)
+    assert not board.would_square_be_attacked(1, 4, Color.BLACK)
+
+
+def test_king_safety_counts_attacks_next_to_each_king():
+    ai = ChessAI("expert")
+    assert ai.king_safety(ChessBoard()) == 0
+    # The rook attacks d8 and d7 next to the black king
+    assert ai.king_safety(ChessBoard.from_fen("4k3/8/8/8/8/8/8/3RK3 w - - 0 1")) == 2 * KING_ZONE_ATTACK_WEIGHT
+    assert ai.king_safety(ChessBoard.from_fen("3rk3/8/8/8/8/8/8/4K3 w - - 0 1")) == -2 * KING_ZONE_ATTACK_WEIGHT
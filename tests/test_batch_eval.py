@@ -0,0 +1,61 @@
+"""Vectorized batch evaluation against ChessAI.evaluate"""
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import chess_game
+from chess_game import ChessAI, ChessBoard, STARTING_FEN
+from batch_eval import encode_boards, encode_fens, evaluate_batch, evaluate_fens, build_tables, one_hot
+
+
+def random_positions(count, seed):
+    """Get the FENs of positions from random games"""
+    rng = random.Random(seed)
+    positions = []
+    board = ChessBoard()
+    while len(positions) < count:
+        moves = board.get_all_valid_moves(board.current_player)
+        if not moves or board.game_over or board.current_ply > 150:
+            board = ChessBoard()
+            continue
+        piece, (to_row, to_col) = rng.choice(moves)
+        board.execute_move(piece.row, piece.col, to_row, to_col)
+        positions.append(board.to_fen())
+    return positions
+
+
+def test_scores_equal_evaluate():
+    fens = random_positions(400, seed=3) + [STARTING_FEN]
+    ai = ChessAI()
+    expected = [ai.evaluate(ChessBoard.from_fen(fen)) for fen in fens]
+    assert evaluate_fens(fens).tolist() == expected
+
+
+def test_board_and_fen_encodings_agree():
+    fens = random_positions(50, seed=4)
+    boards = [ChessBoard.from_fen(fen) for fen in fens]
+    assert np.array_equal(encode_boards(boards), encode_fens(fens))
+    assert one_hot(encode_fens(fens)).sum() == sum(sum(board.piece_counts) for board in boards)
+
+
+def test_chunking_does_not_change_scores():
+    codes = encode_fens(random_positions(100, seed=5))
+    assert np.array_equal(evaluate_batch(codes, chunk_size=7), evaluate_batch(codes))
+
+
+def test_tables_follow_loaded_weights(monkeypatch):
+    fens = random_positions(30, seed=6)
+    monkeypatch.setitem(chess_game.PIECE_VALUES, chess_game.PieceType.KNIGHT, 300)
+    monkeypatch.setitem(chess_game.MOBILITY_WEIGHTS, chess_game.PieceType.QUEEN, 3)
+    ai = ChessAI()
+    assert evaluate_batch(encode_fens(fens), build_tables()).tolist() == \
+        [ai.evaluate(ChessBoard.from_fen(fen)) for fen in fens]
+
+
+def test_bad_input_is_rejected():
+    with pytest.raises(ValueError):
+        encode_fens(["8/8/8 w - - 0 1"])
+    with pytest.raises(ValueError):
+        evaluate_batch(np.zeros((2, 63), dtype=np.int8))
@@ -0,0 +1,35 @@
+"""Benchmark harness: setups, timing with untimed resets and baseline comparison"""
+import benchmark
+from benchmark import build_benchmarks, compare, measure
+
+
+def test_every_setup_returns_a_callable():
+    for name, setup in build_benchmarks().items():
+        if name.startswith(("ai.", "render.")):
+            continue  # Slow, and rendering needs a display
+        function = setup()
+        if isinstance(function, tuple):
+            function, reset = function
+            reset()
+        function()
+
+
+def test_measure_runs_reset_outside_the_timing(monkeypatch):
+    monkeypatch.setattr(benchmark, "MIN_RUN_TIME", 0.001)
+    calls = {'run': 0, 'reset': 0}
+
+    def run():
+        calls['run'] += 1
+
+    def reset():
+        calls['reset'] += 1
+
+    seconds = measure(run, repeat=2, reset=reset)
+    assert seconds >= 0
+    assert calls['run'] == calls['reset'] > 0
+
+
+def test_compare_flags_only_slowdowns_past_the_threshold():
+    baseline = {'a': 1.0, 'b': 1.0, 'c': 1.0}
+    results = {'a': 1.2, 'b': 1.5, 'c': 0.5, 'new': 9.0}
+    assert compare(results, baseline, 0.25) == [('b', 1.0, 1.5, 1.5)]
@@ -0,0 +1,80 @@
+"""FEN import and export, validation and the streaming bulk loader"""
+import pytest
+
+from chess_game import ChessBoard, STARTING_FEN, iter_fen_positions
+
+FENS = [
+    STARTING_FEN,
+    "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "r3k2r/8/8/8/8/8/8/R3K2R b Kq - 12 40",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+    "4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 2",
+]
+
+
+@pytest.mark.parametrize("fen", FENS)
+def test_round_trip(fen):
+    assert ChessBoard.from_fen(fen).to_fen() == fen
+
+
+def test_new_board_is_the_starting_position():
+    assert ChessBoard().to_fen() == STARTING_FEN
+
+
+def test_missing_clocks_default():
+    board = ChessBoard.from_fen("4k3/8/8/8/8/8/8/4K2R w K -")
+    assert board.to_fen() == "4k3/8/8/8/8/8/8/4K2R w K - 0 1"
+
+
+def test_castling_rights_and_en_passant_are_playable():
+    board = ChessBoard.from_fen("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1")
+    king = board.get_piece(7, 4)
+    assert {(7, 6), (7, 2)} <= set(board.get_valid_moves(king))
+    board = ChessBoard.from_fen("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 2")
+    assert (2, 3) in board.get_valid_moves(board.get_piece(3, 4))
+
+
+def test_fen_after_moves():
+    board = ChessBoard()
+    board.execute_move(6, 4, 4, 4)  # e2e4
+    assert board.to_fen() == FENS[1]
+
+
+@pytest.mark.parametrize("fen", [
+    "",
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP w KQkq - 0 1",
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBN9 w KQkq - 0 1",
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR x KQkq - 0 1",
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KXkq - 0 1",
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq e5 0 1",
+    "8/8/8/8/8/8/8/8 w - - 0 1",
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQQBNR w KQkq - 0 1",
+])
+def test_invalid_fen_leaves_the_board_untouched(fen):
+    board = ChessBoard.from_fen(FENS[2])
+    with pytest.raises(ValueError):
+        board.load_fen(fen)
+    assert board.to_fen() == FENS[2]
+    assert board.piece_counts == ChessBoard.from_fen(FENS[2]).piece_counts
+
+
+def test_bulk_loader_reuses_one_board():
+    lines = ["# comment", FENS[0], "", FENS[2], FENS[4]]
+    seen = []
+    boards = set()
+    for board in iter_fen_positions(lines):
+        seen.append(board.to_fen())
+        boards.add(id(board))
+    assert seen == [FENS[0], FENS[2], FENS[4]]
+    assert len(boards) == 1
+
+
+def test_bulk_loaded_board_can_continue_the_game(tmp_path):
+    path = tmp_path / "positions.fen"
+    path.write_text(FENS[2] + "\n")
+    board = next(iter_fen_positions(str(path)))
+    board.execute_move(6, 0, 5, 0)  # a2a3
+    assert board.current_ply == 1
+    board.go_to_ply(0)
+    assert board.to_fen() == FENS[2]
@@ -0,0 +1,199 @@
+"""Binary game archive: writing, random access, live games, reindexing and PGN"""
+import io
+import os
+import random
+
+import pytest
+
+import game_archive
+from chess_game import ChessBoard, encode_move
+from game_archive import (ArchiveWriter, ArchiveReader, ArchivedGame, rebuild_index, import_pgn, export_pgn,
+                          INDEX_SUFFIX, GAME_HEADER)
+
+ENDGAME_FEN = "8/8/4k3/8/2K5/8/4P3/8 w - - 0 40"
+SCHOLARS_MATE = """[Event "Test"]
+[White "A"]
+[Black "B"]
+[Result "1-0"]
+
+1. e4 e5 2. Bc4 Nc6 3. Qh5 Nf6 4. Qxf7# 1-0
+"""
+ILLEGAL_GAME = """[Event "Broken"]
+[Result "*"]
+
+1. e4 e5 2. Ke3 *
+"""
+
+
+def random_game(plies, seed, fen=None):
+    board = ChessBoard.from_fen(fen) if fen else ChessBoard()
+    rng = random.Random(seed)
+    for _ in range(plies):
+        moves = board.get_all_valid_moves(board.current_player)
+        if not moves or board.game_over:
+            break
+        piece, (to_row, to_col) = rng.choice(moves)
+        board.execute_move(piece.row, piece.col, to_row, to_col)
+    return board
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "games.cga")
+
+
+def test_games_round_trip(path):
+    games = [random_game(60, seed) for seed in range(5)]
+    endgame = random_game(20, 9, ENDGAME_FEN)
+    with ArchiveWriter(path) as writer:
+        for number, board in enumerate(games):
+            writer.add_game(board.history.moves, "1/2-1/2", {"Round": str(number)})
+        writer.add_game(endgame.history.moves, "1-0", start_fen=ENDGAME_FEN)
+    with ArchiveReader(path) as reader:
+        assert len(reader) == 6
+        for number, board in enumerate(games):
+            game = reader[number]
+            assert list(game.moves) == list(board.history.moves)
+            assert (game.result, game.tags, game.start_fen) == ("1/2-1/2", {"Round": str(number)},
+                                                                ChessBoard().to_fen())
+            assert game.to_board().to_fen() == board.to_fen()
+        last = reader[-1]
+        assert (last.result, last.tags, last.start_fen) == ("1-0", {}, ENDGAME_FEN)
+        assert list(reader.moves(5)) == list(endgame.history.moves)
+        assert last.to_board().to_fen() == endgame.to_fen()
+        with pytest.raises(IndexError):
+            reader[6]
+
+
+def test_add_board_stops_at_the_ply_shown(path):
+    board = random_game(30, seed=3)
+    board.go_to_ply(12)
+    with ArchiveWriter(path) as writer:
+        writer.add_board(board, {"Event": "Review"})
+    with ArchiveReader(path) as reader:
+        game = reader[0]
+        assert list(game.moves) == list(board.history.moves[:12])
+        assert game.result == "*" and game.tags == {"Event": "Review"}
+
+
+def test_reopened_archive_is_appended_to(path):
+    with ArchiveWriter(path) as writer:
+        writer.add_game([encode_move(6, 4, 4, 4)], "*")
+    with ArchiveWriter(path) as writer:
+        writer.add_game([encode_move(6, 3, 4, 3)], "*")
+    with ArchiveReader(path) as reader:
+        assert [list(game.moves) for game in reader] == [[encode_move(6, 4, 4, 4)], [encode_move(6, 3, 4, 3)]]
+
+
+def test_not_an_archive(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_bytes(b"just some text")
+    with pytest.raises(ValueError):
+        ArchiveWriter(str(path))
+
+
+def test_added_games_are_indexed_on_flush(path):
+    with ArchiveWriter(path) as writer, ArchiveReader(path) as reader:
+        writer.add_game([encode_move(6, 4, 4, 4)], "1-0")
+        reader.refresh()
+        assert len(reader) == 0
+        writer.flush()
+        reader.refresh()
+        assert len(reader) == 1 and reader[0].result == "1-0"
+
+
+def test_index_is_batched(path, monkeypatch):
+    monkeypatch.setattr(game_archive, "INDEX_BATCH", 3)
+    with ArchiveWriter(path) as writer:
+        for _ in range(4):
+            writer.add_game([], "*")
+        # The first three were published together, the fourth waits for a flush
+        assert os.path.getsize(path + INDEX_SUFFIX) == 3 * 8
+        assert len(writer.pending_offsets) == 1
+    assert os.path.getsize(path + INDEX_SUFFIX) == 4 * 8
+
+
+def test_live_game_is_read_while_it_grows(path):
+    board = random_game(10, seed=4)
+    with ArchiveWriter(path) as writer, ArchiveReader(path) as reader:
+        writer.add_game([encode_move(6, 4, 4, 4)], "0-1")
+        live = writer.begin_game({"Event": "Live"})
+        # begin_game publishes the new record and the games before it at once
+        reader.refresh()
+        assert len(reader) == 2
+        assert len(reader[1]) == 0 and reader[1].result == "*"
+        for ply, code in enumerate(board.history.moves, 1):
+            live.append(code)
+            reader.refresh()
+            assert list(reader.moves(1)) == list(board.history.moves[:ply])
+        live.finish("1/2-1/2")
+        reader.refresh()
+        game = reader[1]
+        assert (game.result, game.tags) == ("1/2-1/2", {"Event": "Live"})
+        assert game.to_board().to_fen() == board.to_fen()
+        assert reader[0].result == "0-1"
+
+
+def test_live_game_must_be_the_last_record(path):
+    with ArchiveWriter(path) as writer:
+        first = writer.begin_game()
+        first.append(encode_move(6, 4, 4, 4))
+        second = writer.begin_game()
+        with pytest.raises(ValueError):
+            first.append(encode_move(1, 4, 3, 4))
+        with pytest.raises(ValueError):
+            first.finish("1-0")
+        second.append(encode_move(6, 3, 4, 3))
+        writer.add_game([], "*")
+        with pytest.raises(ValueError):
+            second.append(encode_move(1, 3, 3, 3))
+    with ArchiveReader(path) as reader:
+        assert [len(game) for game in reader] == [1, 1, 0]
+
+
+def test_rebuild_index(path):
+    with ArchiveWriter(path) as writer:
+        for seed in range(4):
+            writer.add_game(random_game(25, seed).history.moves, "*", {"Seed": str(seed)})
+    with open(path + INDEX_SUFFIX, 'rb') as index:
+        expected = index.read()
+    os.remove(path + INDEX_SUFFIX)
+    assert rebuild_index(path) == 4
+    with open(path + INDEX_SUFFIX, 'rb') as index:
+        assert index.read() == expected
+
+
+def test_rebuild_index_drops_a_truncated_record(path):
+    with ArchiveWriter(path) as writer:
+        writer.add_game(random_game(25, seed=1).history.moves, "*")
+        writer.add_game(random_game(25, seed=2).history.moves, "*")
+    with open(path, 'r+b') as archive:
+        archive.truncate(os.path.getsize(path) - 3)
+    assert rebuild_index(path) == 1
+    with ArchiveReader(path) as reader:
+        assert len(reader) == 1
+        assert list(reader[0].moves) == list(random_game(25, seed=1).history.moves)
+
+
+def test_import_and_export_pgn(path):
+    imported, skipped = import_pgn([SCHOLARS_MATE, ILLEGAL_GAME, SCHOLARS_MATE], path)
+    assert (imported, skipped) == (2, 1)
+    with ArchiveReader(path) as reader:
+        game = reader[1]
+        assert len(game) == 7 and game.result == "1-0"
+        assert game.tags == {"Event": "Test", "White": "A", "Black": "B"}
+    output = io.StringIO()
+    export_pgn(path, output, [0])
+    text = output.getvalue()
+    assert '[Result "1-0"]' in text
+    assert "4. Qxf7# 1-0" in text
+    assert text.count("[Event ") == 1
+
+
+def test_record_layout(path):
+    with ArchiveWriter(path) as writer:
+        writer.add_game([encode_move(6, 4, 4, 4), encode_move(1, 4, 3, 4)], "0-1", {"A": "1"})
+    # File header, game header, tags and two u16 moves
+    assert os.path.getsize(path) == 8 + GAME_HEADER.size + len('{"A":"1"}') + 4
+    with ArchiveReader(path) as reader:
+        assert isinstance(reader[0], ArchivedGame)
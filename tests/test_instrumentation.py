@@ -0,0 +1,47 @@
+"""Attachable call counters and timers and the JSON lines search log"""
+import io
+import json
+
+from chess_game import ChessAI, ChessBoard
+from instrumentation import Instrumentation, JsonLinesSink
+
+
+def test_attach_counts_calls_and_detach_restores_methods():
+    board = ChessBoard()
+    stats = Instrumentation().attach(board)
+    board.get_all_valid_moves(board.current_player)
+    board.execute_move(6, 4, 4, 4)
+    timers = stats.timers()
+    assert timers["ChessBoard.get_all_valid_moves"]['calls'] >= 1
+    assert timers["ChessBoard.execute_move"]['calls'] == 1
+    assert timers["ChessBoard.get_valid_moves"]['calls'] >= 16
+    stats.detach()
+    assert "execute_move" not in vars(board)
+    assert board.execute_move.__func__ is ChessBoard.execute_move
+
+
+def test_search_reports_reach_the_sink():
+    board = ChessBoard()
+    ai = ChessAI("expert", depth=2)
+    output = io.StringIO()
+    previous = []
+    ai.on_report = previous.append
+    with Instrumentation(sink=JsonLinesSink(output)) as stats:
+        stats.attach(board, ai)
+        ai.get_move(board)
+        snapshot = stats.snapshot()
+    assert snapshot['searches'] == 1
+    assert snapshot['nodes'] == ai.last_report.nodes > 0
+    record = json.loads(output.getvalue())
+    assert record['depth'] == 2 and record['pv']
+    assert "ChessBoard.get_valid_moves" in record['timers']
+    assert ai.on_report == previous.append
+
+
+def test_reset_zeroes_counters():
+    board = ChessBoard()
+    stats = Instrumentation().attach(board)
+    board.get_all_valid_moves(board.current_player)
+    stats.reset()
+    assert all(timer['calls'] == 0 for timer in stats.timers().values())
+    stats.detach()
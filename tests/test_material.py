@@ -0,0 +1,89 @@
+"""Incremental material counts, insufficient material and endgame evaluators"""
+import random
+
+import pytest
+
+from chess_game import (ChessAI, ChessBoard, Color, ENDGAME_EVALUATORS, ENDGAME_BONUS, material_signature,
+                        evaluate_mating_endgame)
+
+
+def recounted(board):
+    """Get the material state rebuilt from scratch on a copy of the board"""
+    copy = ChessBoard.from_fen(board.to_fen())
+    copy.recount_material()
+    return copy.piece_counts, copy.bishop_square_colors, copy.material_signature
+
+
+def material(board):
+    return board.piece_counts, board.bishop_square_colors, board.material_signature
+
+
+def test_counts_follow_moves_and_undo():
+    rng = random.Random(5)
+    for _ in range(20):
+        board = ChessBoard()
+        undo_stack = []
+        for _ in range(120):
+            moves = board.get_all_valid_moves(board.current_player)
+            if not moves:
+                break
+            piece, (to_row, to_col) = rng.choice(moves)
+            undo_stack.append(board.apply_move(piece.row, piece.col, to_row, to_col))
+            assert material(board) == recounted(board)
+        while undo_stack:
+            board.undo_move(undo_stack.pop())
+        assert material(board) == recounted(ChessBoard())
+
+
+def test_counts_after_promotion():
+    board = ChessBoard.from_fen("8/4P3/8/8/8/8/k7/4K3 w - - 0 1")
+    board.execute_move(1, 4, 0, 4)
+    assert material(board) == recounted(board)
+    assert board.material_signature == material_signature("KQ", "K")
+
+
+def test_material_signature_letters():
+    board = ChessBoard.from_fen("4k3/3pp3/8/8/8/8/8/R3K1N1 w - - 0 1")
+    assert board.material_signature == material_signature("KRN", "KPP")
+    assert material_signature("KR", "K") != material_signature("K", "KR")
+
+
+@pytest.mark.parametrize("fen, insufficient", [
+    ("8/8/4k3/8/8/3K4/8/8 w - - 0 1", True),
+    ("8/8/4k3/8/8/3K4/8/6N1 w - - 0 1", True),
+    ("8/8/4k3/8/8/3K4/8/5b2 w - - 0 1", True),
+    ("8/8/4k3/8/2B5/3K4/8/5b2 w - - 0 1", True),  # Bishops on light squares only
+    ("8/8/4k3/8/3B4/3K4/8/5b2 w - - 0 1", False),  # Bishops on both colors
+    ("8/8/4k3/8/8/3K4/8/5nN1 w - - 0 1", False),
+    ("8/8/4k3/8/8/3K4/8/5BN1 w - - 0 1", False),
+    ("8/8/4k3/8/8/3K4/7P/8 w - - 0 1", False),
+    ("8/8/4k3/8/8/3K4/8/7r w - - 0 1", False),
+])
+def test_insufficient_material(fen, insufficient):
+    assert ChessBoard.from_fen(fen).check_insufficient_material() == insufficient
+
+
+def test_insufficient_material_after_the_last_capture():
+    board = ChessBoard.from_fen("8/8/4k3/8/8/3K4/8/4r2N w - - 0 1")
+    assert not board.check_insufficient_material()
+    board.execute_move(7, 7, 6, 5)  # Nf2
+    board.execute_move(7, 4, 6, 4)  # Re2
+    board.execute_move(5, 3, 6, 4)  # Kxe2
+    assert board.check_insufficient_material()
+
+
+def test_mating_endgames_are_registered_for_both_colors():
+    assert ENDGAME_EVALUATORS[material_signature("KR", "K")] == (evaluate_mating_endgame, Color.WHITE)
+    assert ENDGAME_EVALUATORS[material_signature("K", "KQ")] == (evaluate_mating_endgame, Color.BLACK)
+    assert material_signature("KRN", "K") not in ENDGAME_EVALUATORS
+
+
+def test_mating_endgame_drives_the_king_to_the_edge():
+    ai = ChessAI("expert")
+    centre = ChessBoard.from_fen("8/8/8/3k4/8/8/8/R3K3 w - - 0 1")
+    edge = ChessBoard.from_fen("3k4/8/8/8/8/8/8/R3K3 w - - 0 1")
+    assert ai.evaluate_leaf(centre) > ENDGAME_BONUS
+    assert ai.evaluate_leaf(edge) > ai.evaluate_leaf(centre)
+    # The mirrored endgame scores the same for Black
+    mirrored = ChessBoard.from_fen("r3k3/8/8/8/8/8/8/3K4 w - - 0 1")
+    assert ai.evaluate_leaf(mirrored) == -ai.evaluate_leaf(edge)
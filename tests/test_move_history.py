@@ -0,0 +1,83 @@
+"""Packed move history: recording, navigation between plies and truncation"""
+import random
+
+from chess_game import ChessBoard, CHECKPOINT_INTERVAL, decode_move
+
+
+def play_random_game(board, plies, seed):
+    """Play random legal moves, returning the FEN after each ply (index 0 is the start)"""
+    rng = random.Random(seed)
+    fens = [board.to_fen()]
+    for _ in range(plies):
+        moves = board.get_all_valid_moves(board.current_player)
+        if not moves:
+            break
+        piece, (to_row, to_col) = rng.choice(moves)
+        board.execute_move(piece.row, piece.col, to_row, to_col)
+        fens.append(board.to_fen())
+    return fens
+
+
+def test_moves_are_packed_with_a_checkpoint_every_interval():
+    board = ChessBoard()
+    fens = play_random_game(board, 3 * CHECKPOINT_INTERVAL + 5, seed=1)
+    plies = len(fens) - 1
+    assert len(board.history) == plies == board.current_ply
+    assert board.history.moves.typecode == 'H'
+    assert len(board.history.checkpoints) == plies // CHECKPOINT_INTERVAL + 1
+    assert len(board.position_history) == plies + 1
+
+
+def test_go_to_ply_restores_every_position():
+    board = ChessBoard()
+    fens = play_random_game(board, 2 * CHECKPOINT_INTERVAL + 7, seed=2)
+    for ply in [0, len(fens) - 1, 5, CHECKPOINT_INTERVAL, CHECKPOINT_INTERVAL + 1, 3, len(fens) - 2]:
+        board.go_to_ply(ply)
+        assert board.current_ply == ply
+        assert board.to_fen() == fens[ply]
+
+
+def test_step_back_and_forward():
+    board = ChessBoard()
+    fens = play_random_game(board, 20, seed=3)
+    for ply in range(len(fens) - 2, -1, -1):
+        board.step_back()
+        assert board.to_fen() == fens[ply]
+    board.step_back()
+    assert board.current_ply == 0
+    for ply in range(1, len(fens)):
+        board.step_forward()
+        assert board.to_fen() == fens[ply]
+    board.go_to_start()
+    assert board.to_fen() == fens[0]
+    board.go_to_end()
+    assert board.to_fen() == fens[-1]
+
+
+def test_moving_from_an_earlier_ply_truncates_the_rest():
+    board = ChessBoard()
+    fens = play_random_game(board, CHECKPOINT_INTERVAL * 2 + 3, seed=4)
+    ply = CHECKPOINT_INTERVAL - 2
+    board.go_to_ply(ply)
+    kept_moves = list(board.history.moves[:ply])
+    play_random_game(board, 1, seed=5)
+    assert board.current_ply == ply + 1
+    assert len(board.history) == ply + 1
+    assert list(board.history.moves[:ply]) == kept_moves
+    assert len(board.history.checkpoints) == 1
+    assert len(board.position_history) == ply + 2
+    # The new move is replayed when navigating back to it
+    last_fen = board.to_fen()
+    board.go_to_ply(0)
+    assert board.to_fen() == fens[0]
+    board.go_to_end()
+    assert board.to_fen() == last_fen
+
+
+def test_recorded_moves_replay_the_game():
+    board = ChessBoard()
+    fens = play_random_game(board, 30, seed=6)
+    replay = ChessBoard()
+    for code in board.history.moves:
+        replay.execute_move(*decode_move(code))
+    assert replay.to_fen() == fens[-1]
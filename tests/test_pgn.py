@@ -0,0 +1,133 @@
+"""PGN reading and writing, SAN conversion and game validation"""
+import io
+import random
+
+import pytest
+
+from chess_game import ChessBoard, encode_move
+from pgn import (read_pgn_games, parse_game, parse_san, move_to_san, moves_to_pgn, board_to_pgn,
+                 validate_game, validate_games)
+
+SCHOLARS_MATE = """[Event "Test"]
+[White "A"]
+[Black "B"]
+[Result "1-0"]
+
+1. e4 e5 2. Bc4 {a comment} Nc6 3. Qh5 (3. Nf3) Nf6?? 4. Qxf7# 1-0
+"""
+
+
+def random_game(plies, seed, fen=None):
+    board = ChessBoard.from_fen(fen) if fen else ChessBoard()
+    rng = random.Random(seed)
+    for _ in range(plies):
+        moves = board.get_all_valid_moves(board.current_player)
+        if not moves or board.game_over:
+            break
+        piece, (to_row, to_col) = rng.choice(moves)
+        board.execute_move(piece.row, piece.col, to_row, to_col)
+    return board
+
+
+def replay(text):
+    tags, sans, result = parse_game(text)
+    board = ChessBoard.from_fen(tags['FEN']) if 'FEN' in tags else ChessBoard()
+    for san in sans:
+        board.execute_move(*parse_san(board, san))
+    return board, tags, result
+
+
+def test_parse_game_skips_comments_and_variations():
+    tags, sans, result = parse_game(SCHOLARS_MATE)
+    assert tags['White'] == "A"
+    assert sans == ["e4", "e5", "Bc4", "Nc6", "Qh5", "Nf6??", "Qxf7#"]
+    assert result == "1-0"
+    board, _, _ = replay(SCHOLARS_MATE)
+    assert board.checkmate
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_round_trip_through_pgn(seed):
+    board = random_game(120, seed)
+    text = board_to_pgn(board, {"Event": f"Game {seed}"})
+    replayed, tags, result = replay(text)
+    assert tags["Event"] == f"Game {seed}"
+    assert list(replayed.history.moves) == list(board.history.moves)
+    assert replayed.to_fen() == board.to_fen()
+
+
+def test_round_trip_from_a_setup_position():
+    fen = "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R b KQkq - 0 1"
+    board = random_game(40, 7, fen)
+    text = board_to_pgn(board)
+    assert '[FEN "' + fen + '"]' in text
+    assert "1..." in text
+    replayed, _, _ = replay(text)
+    assert replayed.to_fen() == board.to_fen()
+
+
+@pytest.mark.parametrize("fen", [
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "4k3/8/8/8/8/8/8/R3K2R w KQ - 0 1",
+    "1k6/8/8/8/8/8/N3N3/4K3 w - - 0 1",
+])
+def test_every_legal_move_survives_san(fen):
+    board = ChessBoard.from_fen(fen)
+    for piece, (to_row, to_col) in board.get_all_valid_moves(board.current_player):
+        move = (piece.row, piece.col, to_row, to_col)
+        assert parse_san(board, move_to_san(board, *move)) == move
+
+
+def test_ambiguous_moves_are_disambiguated():
+    board = ChessBoard.from_fen("1k6/8/8/8/8/8/N3N3/4K3 w - - 0 1")
+    assert move_to_san(board, 6, 0, 4, 1) == "Nb4"
+    assert move_to_san(board, 6, 0, 5, 2) == "Nac3"
+    assert move_to_san(board, 6, 4, 5, 2) == "Nec3"
+
+
+def test_illegal_san_is_rejected():
+    board = ChessBoard()
+    for san in ("e5", "Nf4", "O-O", "Qxd7", "zz"):
+        with pytest.raises(ValueError):
+            parse_san(board, san)
+
+
+def test_read_pgn_games_splits_a_stream():
+    text = SCHOLARS_MATE + "\n" + moves_to_pgn([encode_move(6, 3, 4, 3)], result="*")
+    games = list(read_pgn_games(io.StringIO(text), chunk_size=7))
+    assert len(games) == 2
+    assert parse_game(games[1])[1] == ["d4"]
+
+
+def test_validate_game_reports_errors():
+    assert validate_game(0, SCHOLARS_MATE)['error'] is None
+    report = validate_game(1, SCHOLARS_MATE.replace("Qxf7#", "Qxf8"))
+    assert report['error'].startswith("ply 7")
+    report = validate_game(2, SCHOLARS_MATE.replace("1-0", "0-1"))
+    assert "does not match" in report['error']
+
+
+def test_threefold_repetition_counts_the_start_position():
+    board = ChessBoard()
+    shuffle = ["Nf3", "Nf6", "Ng1", "Ng8"]
+    for san in shuffle:
+        board.execute_move(*parse_san(board, san))
+    assert not board.check_threefold_repetition()
+    for san in shuffle:
+        board.execute_move(*parse_san(board, san))
+    assert board.check_threefold_repetition()
+    assert board.game_over
+
+
+def test_validation_plays_past_a_claimable_draw():
+    text = "1. Nf3 Nf6 2. Ng1 Ng8 3. Nf3 Nf6 4. Ng1 Ng8 5. e4 *"
+    report = validate_game(0, text)
+    assert report['error'] is None
+    assert report['plies'] == 9
+
+
+def test_validate_games_in_worker_processes():
+    games = [SCHOLARS_MATE, SCHOLARS_MATE.replace("Qxf7#", "Qxf8")] * 3
+    reports = list(validate_games(games, workers=2, batch_size=2))
+    assert [report['index'] for report in reports] == list(range(6))
+    assert [report['error'] is None for report in reports] == [True, False] * 3
@@ -0,0 +1,56 @@
+"""Piece sprite atlas: building, up-to-date checks and loading by the game"""
+import json
+import os
+
+from chess_game import Piece
+from create_pieces import build_atlas, atlas_is_current, source_hash, ATLAS_FILE, MANIFEST_FILE
+
+SIZES = (12, 20)
+
+
+def test_build_writes_every_sprite(tmp_path):
+    assets = str(tmp_path)
+    assert build_atlas(SIZES, assets, workers=1)
+    with open(os.path.join(assets, MANIFEST_FILE)) as manifest_file:
+        manifest = json.load(manifest_file)
+    assert manifest['hash'] == source_hash(SIZES) and manifest['image'] == ATLAS_FILE
+    assert set(manifest['sprites']) == {"12", "20"}
+    sprites = manifest['sprites']["20"]
+    assert len(sprites) == 12
+    assert sprites["black_pawn"][2:] == [20, 20]
+    # One row per size, smallest first
+    assert {rect[1] for rect in manifest['sprites']["12"].values()} == {0}
+    assert {rect[1] for rect in sprites.values()} == {12}
+
+
+def test_unchanged_sources_are_not_rebuilt(tmp_path):
+    assets = str(tmp_path)
+    assert build_atlas(SIZES, assets, workers=1)
+    assert atlas_is_current(assets, source_hash(SIZES))
+    assert not build_atlas(list(reversed(SIZES)), assets, workers=1)
+    assert build_atlas(SIZES, assets, force=True, workers=1)
+    # Other sizes hash differently
+    assert not atlas_is_current(assets, source_hash((12,)))
+    assert build_atlas((12,), assets, workers=1)
+
+
+def test_missing_image_or_bad_manifest_is_not_current(tmp_path):
+    assets = str(tmp_path)
+    build_atlas(SIZES, assets, workers=1)
+    os.remove(os.path.join(assets, ATLAS_FILE))
+    assert not atlas_is_current(assets, source_hash(SIZES))
+    (tmp_path / MANIFEST_FILE).write_text("{broken")
+    assert not atlas_is_current(assets, source_hash(SIZES))
+
+
+def test_game_slices_sprites_from_the_atlas(tmp_path, monkeypatch):
+    assets = str(tmp_path)
+    build_atlas(SIZES, assets, workers=1)
+    monkeypatch.setattr(Piece, "_atlas_sprites", None)
+    sprites = Piece.load_atlas(os.path.join(assets, MANIFEST_FILE), size=20)
+    assert len(sprites) == 12
+    assert sprites["white_queen"].get_size() == (20, 20)
+
+    # A size missing from the atlas leaves the game on its single images
+    monkeypatch.setattr(Piece, "_atlas_sprites", None)
+    assert Piece.load_atlas(os.path.join(assets, MANIFEST_FILE), size=50) == {}
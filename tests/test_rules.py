@@ -0,0 +1,99 @@
+"""Move generation against perft counts and the original full-board scan, and apply/undo"""
+import random
+
+import pytest
+
+from chess_game import ChessBoard, Color, PieceType, STARTING_FEN
+
+KIWIPETE = "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"
+ENDGAME = "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1"
+
+# Published perft node counts (these depths have no underpromotions, which the board does not play)
+PERFT = [
+    (STARTING_FEN, [20, 400, 8902]),
+    (KIWIPETE, [48, 2039]),
+    (ENDGAME, [14, 191, 2812, 43238]),
+]
+
+
+def perft(board, depth):
+    if depth == 0:
+        return 1
+    nodes = 0
+    for piece, (to_row, to_col) in board.get_all_valid_moves(board.current_player):
+        undo_info = board.apply_move(piece.row, piece.col, to_row, to_col)
+        nodes += perft(board, depth - 1)
+        board.undo_move(undo_info)
+    return nodes
+
+
+def baseline_valid_moves(board, piece):
+    """The original generator: test every square of the board, then add castling and en passant"""
+    moves = [(row, col) for row in range(8) for col in range(8)
+             if board.is_valid_move(piece, row, col) and not board.would_be_in_check_after_move(piece, row, col)]
+    if piece.type == PieceType.KING and not piece.has_moved:
+        moves.extend(board.get_castling_moves(piece))
+    if piece.type == PieceType.PAWN:
+        moves.extend(board.get_en_passant_moves(piece))
+    return sorted(moves)
+
+
+@pytest.mark.parametrize("fen, counts", PERFT)
+def test_perft(fen, counts):
+    board = ChessBoard.from_fen(fen)
+    for depth, expected in enumerate(counts, 1):
+        assert perft(board, depth) == expected
+    assert board.to_fen() == fen
+
+
+@pytest.mark.parametrize("fen", [STARTING_FEN, KIWIPETE, ENDGAME])
+def test_generator_matches_the_full_board_scan(fen):
+    board = ChessBoard.from_fen(fen)
+    rng = random.Random(fen)
+    for _ in range(80):
+        moves = board.get_all_valid_moves(board.current_player)
+        if not moves:
+            break
+        for piece in board.get_all_pieces(board.current_player):
+            assert sorted(board.get_valid_moves(piece)) == baseline_valid_moves(board, piece)
+        piece, (to_row, to_col) = rng.choice(moves)
+        board.execute_move(piece.row, piece.col, to_row, to_col)
+
+
+def test_undo_restores_everything():
+    board = ChessBoard.from_fen(KIWIPETE)
+    rng = random.Random(1)
+    undo_stack = []
+    fens = []
+    for _ in range(60):
+        moves = board.get_all_valid_moves(board.current_player)
+        if not moves:
+            break
+        fens.append((board.to_fen(), board.position_key(), list(board.piece_counts)))
+        piece, (to_row, to_col) = rng.choice(moves)
+        undo_stack.append(board.apply_move(piece.row, piece.col, to_row, to_col))
+    while undo_stack:
+        board.undo_move(undo_stack.pop())
+        assert (board.to_fen(), board.position_key(), list(board.piece_counts)) == fens.pop()
+
+
+def test_special_moves():
+    # Castling moves the rook, en passant removes the passed pawn, pawns promote to queens
+    board = ChessBoard.from_fen("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1")
+    board.execute_move(7, 4, 7, 6)
+    assert board.to_fen() == "r3k2r/8/8/8/8/8/8/R4RK1 b kq - 1 1"
+    board = ChessBoard.from_fen("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 2")
+    board.execute_move(3, 4, 2, 3)
+    assert board.to_fen() == "4k3/8/3P4/8/8/8/8/4K3 b - - 0 2"
+    board = ChessBoard.from_fen("4k3/1P6/8/8/8/8/8/4K3 w - - 0 1")
+    board.execute_move(1, 1, 0, 1)
+    assert board.to_fen() == "1Q2k3/8/8/8/8/8/8/4K3 b - - 0 1"
+
+
+def test_checkmate_and_stalemate():
+    board = ChessBoard.from_fen("7k/5Q2/6K1/8/8/8/8/8 w - - 0 1")
+    board.execute_move(1, 5, 1, 6)  # Qg7#
+    assert board.checkmate and board.winner == Color.WHITE
+    board = ChessBoard.from_fen("7k/8/6K1/8/8/8/8/5Q2 w - - 0 1")
+    board.execute_move(7, 5, 1, 5)  # Qf7 stalemates
+    assert board.stalemate and board.game_over and not board.checkmate
@@ -0,0 +1,83 @@
+"""Expert search: mates, limits, the transposition table and repetition draws"""
+import time
+
+from chess_game import ChessAI, ChessBoard, MATE_SCORE, encode_move, format_score
+from uci import parse_uci_move
+
+
+def play(board, *moves):
+    for move in moves:
+        board.execute_move(*parse_uci_move(move))
+    return board
+
+
+def test_finds_mate_in_one():
+    board = ChessBoard.from_fen("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1")
+    move, score = ChessAI("expert", depth=3).search(board)
+    piece, target = move
+    assert (piece.row, piece.col, target) == (7, 0, (0, 0))
+    assert score == MATE_SCORE - 1
+    assert format_score(score) == "M1"
+
+
+def test_search_leaves_the_board_unchanged():
+    board = ChessBoard.from_fen("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+    fen, key = board.to_fen(), board.position_key()
+    ChessAI("expert", depth=2).search(board)
+    assert (board.to_fen(), board.position_key()) == (fen, key)
+
+
+def test_time_limit_is_respected():
+    board = ChessBoard()
+    ai = ChessAI("expert", depth=20)
+    start = time.perf_counter()
+    move, _ = ai.search(board, time_limit=0.3)
+    assert move is not None
+    assert time.perf_counter() - start < 0.3 + 0.2
+
+
+def test_reports_follow_each_depth():
+    reports = []
+    ai = ChessAI("expert", depth=3)
+    ai.search(ChessBoard(), on_depth=reports.append)
+    assert [report.depth for report in reports] == [1, 2, 3]
+    assert ai.last_report.pv and ai.last_report.pv[0] in {
+        encode_move(piece.row, piece.col, row, col)
+        for piece, (row, col) in ChessBoard().get_all_valid_moves(ChessBoard().current_player)}
+
+
+def test_multipv_returns_distinct_lines_best_first():
+    reports = ChessAI("expert").search_multipv(ChessBoard(), lines=3, max_depth=2)
+    assert len(reports) == 3
+    assert len({report.pv[0] for report in reports}) == 3
+    assert [report.score for report in reports] == sorted((report.score for report in reports), reverse=True)
+
+
+def test_repeating_the_game_scores_as_a_draw():
+    # With the game's history, Ng8 repeats the start position a third time
+    board = play(ChessBoard(), "g1f3", "g8f6", "f3g1", "f6g8", "g1f3", "g8f6", "f3g1")
+    ai = ChessAI("expert")
+    ai.start_key_path(board)
+    undo_info = board.apply_move(*parse_uci_move("f6g8"))
+    assert ai.negamax(board, 2, -MATE_SCORE - 1, MATE_SCORE + 1, 1) == 0
+    assert ai.nodes == 1
+    board.undo_move(undo_info)
+
+    # The same position without its history is searched normally
+    fresh = ChessBoard.from_fen(board.to_fen())
+    ai = ChessAI("expert")
+    ai.start_key_path(fresh)
+    fresh.apply_move(*parse_uci_move("f6g8"))
+    ai.negamax(fresh, 2, -MATE_SCORE - 1, MATE_SCORE + 1, 1)
+    assert ai.nodes > 1
+    # Passing the keys along restores the repetition
+    ai = ChessAI("expert")
+    ai.start_key_path(ChessBoard.from_fen(board.to_fen()), board.position_history[:board.current_ply])
+    assert len(ai.key_path) == board.current_ply + 1
+
+
+def test_easier_difficulties_play_legal_moves():
+    board = ChessBoard()
+    for difficulty in ("easy", "medium", "hard"):
+        piece, target = ChessAI(difficulty).get_move(board)
+        assert target in board.get_valid_moves(piece)
@@ -0,0 +1,134 @@
+"""Texel tuner: features, weight vectors, datasets and the weights file"""
+import json
+import copy
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import chess_game
+from chess_game import ChessAI, ChessBoard, PieceType, load_evaluation_weights, save_evaluation_weights
+import tuner
+from uci import parse_uci_move
+from tuner import (features, weights_to_vector, vector_to_weights, iter_games, build_dataset, load_dataset,
+                   fit_k, sigmoid)
+
+GAME = """[Event "Test"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 Nc6 3. Bc4 Nf6 4. Ng5 d5 5. exd5 Na5 6. Bb5+ c6 7. dxc6 bxc6 8. Be2 h6 1-0
+"""
+BAD_SETUP = """[Event "Test"]
+[FEN "not a fen"]
+[Result "0-1"]
+
+1. e4 0-1
+"""
+
+
+@pytest.fixture
+def weights():
+    """Restore the evaluation weights after a test changes them"""
+    saved = (copy.deepcopy(chess_game.PIECE_VALUES), copy.deepcopy(chess_game.PIECE_SQUARE_TABLES),
+             copy.deepcopy(chess_game.MOBILITY_WEIGHTS))
+    yield
+    for table, values in zip((chess_game.PIECE_VALUES, chess_game.PIECE_SQUARE_TABLES,
+                              chess_game.MOBILITY_WEIGHTS), saved):
+        table.clear()
+        table.update(values)
+
+
+def test_features_times_weights_equal_evaluate():
+    board = ChessBoard()
+    ai = ChessAI("expert")
+    codes = []
+    scores = []
+    for move in ["e2e4", "d7d5", "e4d5", "d8d5", "b1c3", "d5a5"]:
+        board.execute_move(*parse_uci_move(move))
+        codes.append(np.frombuffer(board.save_board_state()[0], dtype=np.int8))
+        scores.append(ai.evaluate(board))
+    matrix = features(np.array(codes))
+    assert np.allclose(matrix @ weights_to_vector(), scores)
+
+
+def test_vector_round_trip(weights):
+    vector = weights_to_vector()
+    vector[tuner.VALUES_OFFSET + tuner.PIECE_TYPES.index(PieceType.KNIGHT)] += 7.4
+    vector_to_weights(vector)
+    assert np.array_equal(weights_to_vector(), np.rint(vector))
+
+
+def test_weights_file_round_trip(tmp_path, weights):
+    path = str(tmp_path / "weights.json")
+    chess_game.PIECE_VALUES[PieceType.BISHOP] += 15
+    chess_game.PIECE_SQUARE_TABLES[PieceType.PAWN][20] += 3
+    save_evaluation_weights(path)
+    expected = weights_to_vector()
+    vector_to_weights(np.zeros(tuner.WEIGHT_COUNT))
+    load_evaluation_weights(path)
+    assert np.array_equal(weights_to_vector(), expected)
+
+
+def test_partial_weights_file_keeps_other_weights(tmp_path, weights):
+    path = tmp_path / "weights.json"
+    path.write_text(json.dumps({'piece_values': {'knight': 333}}))
+    before = weights_to_vector()
+    load_evaluation_weights(str(path))
+    after = weights_to_vector()
+    changed = np.flatnonzero(before != after)
+    assert chess_game.PIECE_VALUES[PieceType.KNIGHT] == 333
+    assert list(changed) == [tuner.VALUES_OFFSET + tuner.PIECE_TYPES.index(PieceType.KNIGHT)]
+
+
+@pytest.mark.parametrize("content", [
+    "{not json",
+    json.dumps({'piece_values': {'knight': 300, 'bishop': 'a lot'}}),
+    json.dumps({'piece_values': {'knight': 300}, 'piece_square_tables': {'pawn': [0] * 63}}),
+    json.dumps([300]),
+])
+def test_bad_weights_file_changes_nothing(tmp_path, weights, content):
+    path = tmp_path / "weights.json"
+    path.write_text(content)
+    before = weights_to_vector()
+    with pytest.raises(ValueError):
+        load_evaluation_weights(str(path))
+    assert np.array_equal(weights_to_vector(), before)
+
+
+def test_iter_games_yields_none_for_bad_setups(tmp_path):
+    pgn_path = tmp_path / "games.pgn"
+    pgn_path.write_text(GAME + "\n" + BAD_SETUP)
+    jsonl_path = tmp_path / "games.jsonl"
+    jsonl_path.write_text('{"moves": ["e2e4", "e7e5"], "result": "1/2-1/2"}\n{broken\n')
+    board = ChessBoard()
+    games = []
+    for game in iter_games([str(pgn_path), str(jsonl_path)], board):
+        if game is None:
+            games.append(None)
+            continue
+        # Moves are resolved against the board as it is replayed
+        moves = []
+        for move in game[0]:
+            board.apply_move(*move)
+            moves.append(move)
+        games.append((moves, game[1]))
+    assert [game is None for game in games] == [False, True, False, True]
+    assert len(games[0][0]) == 16 and games[0][1] == "1-0"
+    assert games[2] == ([(6, 4, 4, 4), (1, 4, 3, 4)], "1/2-1/2")
+
+
+def test_build_dataset_keeps_quiet_positions(tmp_path):
+    pgn_path = tmp_path / "games.pgn"
+    pgn_path.write_text(GAME + "\n" + BAD_SETUP)
+    count, games, errors = build_dataset([str(pgn_path)], str(tmp_path / "dataset"), skip_plies=0)
+    positions, results = load_dataset(str(tmp_path / "dataset"))
+    # 16 plies, less the three captures and the check 6. Bb5+
+    assert (count, games, errors) == (12, 2, 1)
+    assert positions.shape == (12, 64) and positions.dtype == np.int8
+    assert set(results.tolist()) == {1.0}
+
+
+def test_fit_k_recovers_the_scaling_constant():
+    scores = np.linspace(-800, 800, 201)
+    results = sigmoid(scores, 1.3)
+    assert fit_k(scores, results) == pytest.approx(1.3, abs=1e-3)
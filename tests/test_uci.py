@@ -0,0 +1,130 @@
+"""UCI command handling: moves, positions, options and search control"""
+import io
+import time
+
+import pytest
+
+from chess_game import ChessBoard, MATE_SCORE
+from uci import UCIEngine, parse_uci_move, format_uci_move, format_score, DEFAULT_MOVES_TO_GO, MOVE_OVERHEAD
+
+
+class Output(io.StringIO):
+    def lines(self):
+        return self.getvalue().splitlines()
+
+
+def run(engine, *commands):
+    for command in commands:
+        engine.handle(command)
+
+
+def wait_for(output, prefix, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        found = [line for line in output.lines() if line.startswith(prefix)]
+        if found:
+            return found
+        time.sleep(0.01)
+    return []
+
+
+def test_parse_and_format_moves():
+    assert parse_uci_move("e2e4") == (6, 4, 4, 4)
+    assert parse_uci_move("a7a8q") == (1, 0, 0, 0)
+    assert format_uci_move(6, 4, 4, 4) == "e2e4"
+    assert format_uci_move(1, 0, 0, 0, promotion=True) == "a7a8q"
+    for text in ("e2", "e2e9", "i2i4", "e7e8n", "e2e4xx"):
+        with pytest.raises(ValueError):
+            parse_uci_move(text)
+
+
+def test_format_score():
+    assert format_score(35) == "cp 35"
+    assert format_score(MATE_SCORE - 1) == "mate 1"
+    assert format_score(-(MATE_SCORE - 4)) == "mate -2"
+
+
+def test_handshake():
+    output = Output()
+    engine = UCIEngine(output)
+    run(engine, "uci", "isready")
+    lines = output.lines()
+    assert lines[0].startswith("id name")
+    assert "uciok" in lines and lines[-1] == "readyok"
+
+
+def test_position_commands():
+    engine = UCIEngine(Output())
+    run(engine, "position startpos moves e2e4 e7e5 g1f3")
+    assert engine.board.to_fen() == "rnbqkbnr/pppp1ppp/8/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2"
+    fen = "4k3/8/8/8/8/8/8/4K2R w K - 0 1"
+    run(engine, f"position fen {fen} moves e1g1")
+    assert engine.board.to_fen() == "4k3/8/8/8/8/8/8/5RK1 b - - 1 1"
+    # The repetition history of the moves is kept for the search
+    assert len(engine.board.position_history) == 2
+
+
+def test_illegal_position_keeps_the_old_one():
+    output = Output()
+    engine = UCIEngine(output)
+    run(engine, "position startpos moves e2e4")
+    run(engine, "position startpos moves e2e5")
+    assert engine.board.current_ply == 1
+    assert output.lines()[-1].startswith("info string illegal move")
+
+
+def test_options():
+    output = Output()
+    engine = UCIEngine(output)
+    run(engine, "setoption name Hash value 1")
+    assert engine.ai.table_size < 10000
+    run(engine, "setoption name Hash value lots")
+    assert output.lines()[-1] == "info string invalid value for hash: lots"
+    run(engine, "setoption name Threads value 4")
+    assert engine.threads == 4 and "not supported" in output.lines()[-1]
+
+
+def test_analysis_cache_option(tmp_path):
+    engine = UCIEngine(Output())
+    path = tmp_path / "cache.db"
+    run(engine, f"setoption name AnalysisCache value {path}")
+    assert engine.ai.cache is not None
+    run(engine, "setoption name AnalysisCache value <empty>")
+    assert engine.ai.cache is None
+
+
+def test_allocate_time():
+    engine = UCIEngine(Output())
+    assert engine.allocate_time({"movetime": 1000}) == pytest.approx(1 - MOVE_OVERHEAD)
+    assert engine.allocate_time({}) is None
+    budget = engine.allocate_time({"wtime": 60000, "btime": 1000})
+    assert budget == pytest.approx(60 / DEFAULT_MOVES_TO_GO - MOVE_OVERHEAD)
+    # Never more than half the remaining time
+    assert engine.allocate_time({"wtime": 1000, "movestogo": 1}) == pytest.approx(0.5 - MOVE_OVERHEAD)
+
+
+def test_go_depth_sends_bestmove():
+    output = Output()
+    engine = UCIEngine(output)
+    run(engine, "position fen 6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1", "go depth 2")
+    assert wait_for(output, "bestmove") == ["bestmove a1a8"]
+    assert any(line.startswith("info depth 1 ") for line in output.lines())
+
+
+def test_bare_go_searches_until_stop():
+    output = Output()
+    engine = UCIEngine(output)
+    run(engine, "position startpos", "go")
+    time.sleep(0.3)
+    assert not any(line.startswith("bestmove") for line in output.lines())
+    run(engine, "stop")
+    assert len([line for line in output.lines() if line.startswith("bestmove")]) == 1
+
+
+def test_go_movetime_stops_on_time():
+    output = Output()
+    engine = UCIEngine(output)
+    start = time.monotonic()
+    run(engine, "position startpos", "go movetime 300")
+    assert wait_for(output, "bestmove")
+    assert time.monotonic() - start < 1.0
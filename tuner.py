@@ -0,0 +1,339 @@
+"""Texel tuning of the evaluation weights against game results.
+
+Usage:
+    python tuner.py build games.pgn selfplay.jsonl --output dataset
+    python tuner.py tune dataset --iterations 300 --workers 4 --output eval_weights.json
+
+`build` replays PGN files and arena.py JSONL records and keeps the quiet
+positions (side to move not in check, last move not a capture) together with
+the game's result. They are saved as dataset/positions.npy, an (N, 64) int8
+array of piece codes, and dataset/results.npy, where 1 is a White win, 0.5 a
+draw and 0 a Black win.
+
+`tune` reads both files as memory-mapped arrays and fits the piece values,
+piece-square tables and mobility weights by minimizing the mean squared
+error between each result and sigmoid(K * eval / 400), with Adam steps on
+full-batch gradients. The dataset is split into shards that are evaluated in
+parallel by a process pool. The evaluation is linear in its weights, so each
+position becomes one row of a feature matrix and eval = features @ weights.
+The fitted weights are written in the format chess_game loads at startup.
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import chess_game
+from chess_game import ChessBoard, PieceType, STARTING_FEN, EVAL_WEIGHTS_PATH, save_evaluation_weights
+from batch_eval import ADJACENCY, one_hot
+from pgn import read_pgn_games, parse_game, parse_san
+from uci import parse_uci_move
+
+# Constants
+POSITIONS_FILE = "positions.npy"
+RESULTS_FILE = "results.npy"
+RESULT_VALUES = {"1-0": 1.0, "1/2-1/2": 0.5, "0-1": 0.0}
+SKIP_PLIES = 8  # Opening plies left out of the dataset
+CHUNK_SIZE = 4096  # Positions turned into features at a time
+ITERATIONS = 300
+LEARNING_RATE = 1.0  # Adam step size in centipawns
+ADAM_BETAS = (0.9, 0.999)
+K_RANGE = (0.05, 4.0)  # Search interval for the sigmoid scaling constant
+
+# Weight vector layout: piece-square tables, then piece values, then mobility weights
+PIECE_TYPES = list(PieceType)  # Same order as the piece codes
+PST_SIZE = len(PIECE_TYPES) * 64
+VALUES_OFFSET = PST_SIZE
+MOBILITY_OFFSET = PST_SIZE + len(PIECE_TYPES)
+WEIGHT_COUNT = MOBILITY_OFFSET + len(PIECE_TYPES)
+
+
+def replay_pgn(board, text):
+    """Set up a PGN game on the board, returning (moves, result) with moves resolved as played"""
+    tags, sans, result = parse_game(text)
+    board.load_fen(tags.get('FEN', STARTING_FEN), update_status=False)
+    return (parse_san(board, san) for san in sans), result
+
+
+def replay_record(board, record):
+    """Set up an arena.py game record on the board, returning (moves, result)"""
+    board.load_fen(STARTING_FEN, update_status=False)
+    return (parse_uci_move(move) for move in record['moves']), record['result']
+
+
+def iter_games(paths, board):
+    """Yield (moves, result) for every game in PGN and JSONL files, replayed on board
+
+    Games that cannot be set up, such as a bad [FEN] tag or JSON line, are
+    yielded as None so the caller can count them.
+    """
+    for path in paths:
+        with open(path, encoding='utf-8', errors='replace') as stream:
+            jsonl = path.endswith('.jsonl')
+            games = (line for line in stream if line.strip()) if jsonl else read_pgn_games(stream)
+            for game in games:
+                try:
+                    replayed = replay_record(board, json.loads(game)) if jsonl else replay_pgn(board, game)
+                except (ValueError, KeyError):
+                    replayed = None
+                yield replayed
+
+
+def game_positions(board, moves, result, skip_plies=SKIP_PLIES):
+    """Yield the piece codes (as bytes) of each quiet position of a game being replayed"""
+    value = RESULT_VALUES[result]
+    for ply, move in enumerate(moves, 1):
+        undo_info = board.apply_move(*move)
+        captured = undo_info[5]
+        if ply > skip_plies and captured is None and not board.is_in_check(board.current_player):
+            yield board.save_board_state()[0], value
+
+
+def build_dataset(paths, output, skip_plies=SKIP_PLIES):
+    """Write positions.npy and results.npy for the games in paths, returning (positions, games, errors)"""
+    board = ChessBoard()
+    positions = bytearray()
+    results = []
+    games = errors = 0
+    for game in iter_games(paths, board):
+        if game is None:
+            games += 1
+            errors += 1
+            continue
+        moves, result = game
+        if result not in RESULT_VALUES:
+            continue
+        games += 1
+        try:
+            for codes, value in game_positions(board, moves, result, skip_plies):
+                positions += codes
+                results.append(value)
+        except ValueError:
+            # Keep the positions before the bad move
+            errors += 1
+    os.makedirs(output, exist_ok=True)
+    np.save(os.path.join(output, POSITIONS_FILE), np.frombuffer(bytes(positions), dtype=np.int8).reshape(-1, 64))
+    np.save(os.path.join(output, RESULTS_FILE), np.array(results, dtype=np.float32))
+    return len(results), games, errors
+
+
+def load_dataset(path):
+    """Open a dataset directory as memory-mapped (positions, results) arrays"""
+    positions = np.load(os.path.join(path, POSITIONS_FILE), mmap_mode='r')
+    results = np.load(os.path.join(path, RESULTS_FILE), mmap_mode='r')
+    if len(positions) != len(results):
+        raise ValueError(f"{path}: {len(positions)} positions but {len(results)} results")
+    return positions, results
+
+
+def features(codes):
+    """Get the (N, WEIGHT_COUNT) float32 feature matrix of (N, 64) piece codes
+
+    Each row holds +1/-1 piece-square occupancy (Black mirrored), the material
+    balance per piece type and the empty-neighbor balance per piece type, so
+    that features(codes) @ weights_to_vector() equals the evaluation.
+    """
+    count = len(codes)
+    planes = one_hot(codes).astype(np.float32)
+    white, black = planes[:, :len(PIECE_TYPES)], planes[:, len(PIECE_TYPES):]
+    # Black reads the tables with the rows mirrored
+    mirrored = black.reshape(count, len(PIECE_TYPES), 8, 8)[:, :, ::-1].reshape(count, len(PIECE_TYPES), 64)
+    squares = white - mirrored
+    empty_neighbors = (np.asarray(codes) == 0).astype(np.float32) @ ADJACENCY
+    mobility = ((white - black) * empty_neighbors[:, None, :]).sum(axis=2)
+    return np.concatenate([squares.reshape(count, PST_SIZE), squares.sum(axis=2), mobility], axis=1)
+
+
+def weights_to_vector():
+    """Get the current evaluation weights as a float64 vector"""
+    vector = np.zeros(WEIGHT_COUNT)
+    for index, piece_type in enumerate(PIECE_TYPES):
+        vector[index * 64:(index + 1) * 64] = chess_game.PIECE_SQUARE_TABLES[piece_type]
+        vector[VALUES_OFFSET + index] = chess_game.PIECE_VALUES[piece_type]
+        vector[MOBILITY_OFFSET + index] = chess_game.MOBILITY_WEIGHTS[piece_type]
+    return vector
+
+
+def vector_to_weights(vector):
+    """Round a weight vector to whole centipawns and install it as the evaluation weights"""
+    vector = np.rint(vector).astype(int)
+    for index, piece_type in enumerate(PIECE_TYPES):
+        chess_game.PIECE_SQUARE_TABLES[piece_type] = vector[index * 64:(index + 1) * 64].tolist()
+        chess_game.PIECE_VALUES[piece_type] = int(vector[VALUES_OFFSET + index])
+        chess_game.MOBILITY_WEIGHTS[piece_type] = int(vector[MOBILITY_OFFSET + index])
+
+
+def sigmoid(scores, k):
+    """Map centipawn scores to expected results"""
+    return 1 / (1 + np.power(10.0, -k * scores / 400))
+
+
+_worker_datasets = {}  # Memory maps opened by this process, by dataset path
+
+
+def _dataset(path):
+    if path not in _worker_datasets:
+        _worker_datasets[path] = load_dataset(path)
+    return _worker_datasets[path]
+
+
+def shard_scores(task):
+    """Evaluate the positions of one shard, returning their float64 scores"""
+    path, start, stop, weights = task
+    positions, _ = _dataset(path)
+    scores = np.empty(stop - start)
+    for offset in range(start, stop, CHUNK_SIZE):
+        end = min(offset + CHUNK_SIZE, stop)
+        scores[offset - start:end - start] = features(positions[offset:end]) @ weights
+    return scores
+
+
+def shard_gradient(task):
+    """Get (squared error sum, gradient of the squared error sum) for one shard"""
+    path, start, stop, weights, k = task
+    positions, results = _dataset(path)
+    weights = weights.astype(np.float32)
+    error_sum = 0.0
+    gradient = np.zeros(WEIGHT_COUNT)
+    for offset in range(start, stop, CHUNK_SIZE):
+        end = min(offset + CHUNK_SIZE, stop)
+        matrix = features(positions[offset:end])
+        predicted = sigmoid(matrix @ weights, k)
+        error = predicted - results[offset:end]
+        error_sum += float(error @ error)
+        # d/dw (p - r)^2 = 2 (p - r) p (1 - p) K ln(10) / 400 * features
+        slope = error * predicted * (1 - predicted) * (2 * k * math.log(10) / 400)
+        gradient += matrix.T @ slope.astype(np.float32)
+    return error_sum, gradient
+
+
+def fit_k(scores, results, k_range=K_RANGE, steps=40):
+    """Find the sigmoid scaling constant that best fits scores to results (golden section)"""
+    low, high = k_range
+    ratio = (math.sqrt(5) - 1) / 2
+
+    def loss(k):
+        error = sigmoid(scores, k) - results
+        return float(error @ error) / len(results)
+
+    for _ in range(steps):
+        left, right = high - ratio * (high - low), low + ratio * (high - low)
+        if loss(left) < loss(right):
+            high = right
+        else:
+            low = left
+    return (low + high) / 2
+
+
+class Tuner:
+    """Fits the evaluation weights to a dataset with a pool of worker processes"""
+    def __init__(self, path, workers=None):
+        self.path = path
+        positions, self.results = load_dataset(path)
+        self.size = len(positions)
+        self.workers = workers or os.cpu_count() or 1
+        shard_size = -(-self.size // self.workers)
+        self.shards = [(start, min(start + shard_size, self.size)) for start in range(0, self.size, shard_size)]
+        self.executor = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+
+    def map(self, function, tasks):
+        if self.executor:
+            return list(self.executor.map(function, tasks))
+        return [function(task) for task in tasks]
+
+    def scores(self, weights):
+        """Evaluate every position with a weight vector"""
+        return np.concatenate(self.map(shard_scores, [(self.path, start, stop, weights)
+                                                      for start, stop in self.shards]))
+
+    def loss_and_gradient(self, weights, k):
+        """Get the mean squared error and its gradient for a weight vector"""
+        parts = self.map(shard_gradient, [(self.path, start, stop, weights, k) for start, stop in self.shards])
+        return sum(part[0] for part in parts) / self.size, sum(part[1] for part in parts) / self.size
+
+    def fit_k(self, weights):
+        return fit_k(self.scores(weights), np.asarray(self.results, dtype=np.float64))
+
+    def tune(self, weights, k, iterations=ITERATIONS, learning_rate=LEARNING_RATE, frozen=(), on_step=None):
+        """Run Adam on the weight vector and return (weights, loss)
+
+        frozen lists indices of weights that are kept fixed.
+        """
+        weights = weights.copy()
+        beta1, beta2 = ADAM_BETAS
+        first = np.zeros(WEIGHT_COUNT)
+        second = np.zeros(WEIGHT_COUNT)
+        loss = None
+        for step in range(1, iterations + 1):
+            loss, gradient = self.loss_and_gradient(weights, k)
+            gradient[list(frozen)] = 0
+            first = beta1 * first + (1 - beta1) * gradient
+            second = beta2 * second + (1 - beta2) * gradient * gradient
+            corrected_first = first / (1 - beta1 ** step)
+            corrected_second = second / (1 - beta2 ** step)
+            weights -= learning_rate * corrected_first / (np.sqrt(corrected_second) + 1e-12)
+            if on_step:
+                on_step(step, loss)
+        return weights, loss
+
+    def close(self):
+        if self.executor:
+            self.executor.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Texel tuning of the evaluation weights")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="build a dataset from PGN and arena JSONL files")
+    build.add_argument('games', nargs='+', help="PGN files and arena.py --jsonl files")
+    build.add_argument('--output', default="dataset", help="dataset directory")
+    build.add_argument('--skip-plies', type=int, default=SKIP_PLIES, help="opening plies to leave out")
+    tune = commands.add_parser('tune', help="fit the weights to a dataset")
+    tune.add_argument('dataset', help="dataset directory written by 'build'")
+    tune.add_argument('--output', default=EVAL_WEIGHTS_PATH, help="weights file to write")
+    tune.add_argument('--iterations', type=int, default=ITERATIONS)
+    tune.add_argument('--learning-rate', type=float, default=LEARNING_RATE)
+    tune.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    tune.add_argument('--k', type=float, help="sigmoid scaling constant (default: fitted to the dataset)")
+    tune.add_argument('--freeze-pawn', action='store_true', help="keep the pawn value fixed as the scale anchor")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    if args.command == 'build':
+        positions, games, errors = build_dataset(args.games, args.output, args.skip_plies)
+        print(f"{positions} positions from {games} games ({errors} with bad setups or illegal moves) "
+              f"in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+        return 0
+
+    tuner = Tuner(args.dataset, args.workers)
+    try:
+        weights = weights_to_vector()
+        k = args.k or tuner.fit_k(weights)
+        initial_loss, _ = tuner.loss_and_gradient(weights, k)
+        print(f"{tuner.size} positions, {len(tuner.shards)} shards, K = {k:.4f}, "
+              f"initial loss {initial_loss:.6f}", file=sys.stderr)
+
+        def report(step, loss):
+            if step % 10 == 0 or step == args.iterations:
+                print(f"iteration {step}: loss {loss:.6f} ({time.perf_counter() - start:.1f}s)", file=sys.stderr)
+
+        frozen = [VALUES_OFFSET + PIECE_TYPES.index(PieceType.PAWN)] if args.freeze_pawn else []
+        weights, _ = tuner.tune(weights, k, args.iterations, args.learning_rate, frozen, report)
+        vector_to_weights(weights)
+        final_loss, _ = tuner.loss_and_gradient(weights_to_vector(), k)
+    finally:
+        tuner.close()
+    save_evaluation_weights(args.output)
+    print(f"final loss {final_loss:.6f} with rounded weights, saved to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+"""UCI protocol front end for ChessAI.
+
+Run `python uci.py` as the engine command in any UCI GUI or tournament manager.
+Commands are read on the main thread while searches run on a background
+thread, so `stop` and `isready` are answered during a search.
+"""
+import os
+import sys
+import sqlite3
+import threading
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from chess_game import (ChessAI, ChessBoard, Color, PieceType, STARTING_FEN, SQUARE_NAMES, MATE_SCORE,
+                        MAX_SEARCH_DEPTH, decode_move)
+from analysis_cache import AnalysisCache
+
+# Constants
+ENGINE_NAME = "ChessGame AI"
+ENGINE_AUTHOR = "ChessGame contributors"
+DEFAULT_HASH_MB = 64
+MAX_HASH_MB = 4096
+HASH_ENTRY_BYTES = 200  # Rough size of one transposition table entry in a dict
+MOVE_OVERHEAD = 0.05  # Seconds kept back per move for process and GUI latency
+DEFAULT_MOVES_TO_GO = 30  # Moves the remaining time is spread over without movestogo
+
+
+def parse_uci_move(text):
+    """Parse a UCI move like 'e2e4' or 'e7e8q' into (from_row, from_col, to_row, to_col)"""
+    if len(text) not in (4, 5) or text[:2] not in SQUARE_NAMES or text[2:4] not in SQUARE_NAMES:
+        raise ValueError(f"invalid move {text!r}")
+    if len(text) == 5 and text[4] != 'q':
+        # Pawns always promote to a queen on this board
+        raise ValueError(f"underpromotion is not supported {text!r}")
+    from_square = SQUARE_NAMES.index(text[:2])
+    to_square = SQUARE_NAMES.index(text[2:4])
+    return from_square // 8, from_square % 8, to_square // 8, to_square % 8
+
+
+def format_uci_move(from_row, from_col, to_row, to_col, promotion=False):
+    """Format a move in UCI long algebraic notation"""
+    text = SQUARE_NAMES[from_row * 8 + from_col] + SQUARE_NAMES[to_row * 8 + to_col]
+    return text + 'q' if promotion else text
+
+
+def format_pv(board, codes):
+    """Format packed moves played from the board's position as UCI moves"""
+    moves = []
+    undo_stack = []
+    for code in codes:
+        from_row, from_col, to_row, to_col = decode_move(code)
+        piece = board.board[from_row][from_col]
+        promotion = piece.type == PieceType.PAWN and to_row in (0, 7)
+        moves.append(format_uci_move(from_row, from_col, to_row, to_col, promotion))
+        undo_stack.append(board.apply_move(from_row, from_col, to_row, to_col))
+    for undo_info in reversed(undo_stack):
+        board.undo_move(undo_info)
+    return " ".join(moves)
+
+
+def format_score(score):
+    """Format a search score as a UCI 'cp' or 'mate' value"""
+    if abs(score) >= MATE_SCORE - MAX_SEARCH_DEPTH:
+        plies = MATE_SCORE - abs(score)
+        moves = (plies + 1) // 2
+        return f"mate {moves if score > 0 else -moves}"
+    return f"cp {score}"
+
+
+class UCIEngine:
+    """UCI command loop driving a ChessAI search on a background thread"""
+    def __init__(self, output=None):
+        self.output = output or sys.stdout
+        self.output_lock = threading.Lock()
+        self.board = ChessBoard()
+        self.ai = ChessAI("expert")
+        self.set_hash_size(DEFAULT_HASH_MB)
+        self.threads = 1
+        self.search_thread = None
+
+    def send(self, line):
+        """Write one line to the GUI"""
+        with self.output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def set_hash_size(self, megabytes):
+        """Resize the transposition table to roughly the given number of megabytes"""
+        self.ai.table_size = max(1, megabytes * 1024 * 1024 // HASH_ENTRY_BYTES)
+        self.ai.transposition_table.clear()
+
+    def run(self, stream=None):
+        """Read commands until 'quit' or end of input"""
+        for line in stream or sys.stdin:
+            if not self.handle(line):
+                break
+        self.stop_search()
+
+    def handle(self, line):
+        """Handle one command line, returning False on 'quit'"""
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == "uci":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send(f"option name Hash type spin default {DEFAULT_HASH_MB} min 1 max {MAX_HASH_MB}")
+            self.send("option name Threads type spin default 1 min 1 max 1")
+            self.send("option name AnalysisCache type string default <empty>")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "setoption":
+            self.stop_search()
+            self.set_option(args)
+        elif command == "ucinewgame":
+            self.stop_search()
+            self.ai.transposition_table.clear()
+            self.board = ChessBoard()
+        elif command == "position":
+            self.stop_search()
+            self.set_position(args)
+        elif command == "go":
+            self.stop_search()
+            self.start_search(args)
+        elif command in ("stop", "ponderhit"):
+            self.stop_search()
+        elif command == "quit":
+            return False
+        return True
+
+    def set_option(self, args):
+        """Handle 'setoption name <name> value <value>'"""
+        if "name" not in args:
+            return
+        name_end = args.index("value") if "value" in args else len(args)
+        name = " ".join(args[args.index("name") + 1:name_end]).lower()
+        value = " ".join(args[name_end + 1:])
+        try:
+            if name == "hash":
+                self.set_hash_size(min(max(int(value), 1), MAX_HASH_MB))
+            elif name == "threads":
+                # The search is single threaded; other values are accepted but ignored
+                self.threads = max(int(value), 1)
+                if self.threads > 1:
+                    self.send("info string Threads > 1 is not supported, searching with 1 thread")
+            elif name == "analysiscache":
+                self.set_analysis_cache(value)
+        except ValueError:
+            self.send(f"info string invalid value for {name}: {value}")
+
+    def set_analysis_cache(self, path):
+        """Open a persistent analysis cache at path, or close it for '' and '<empty>'"""
+        if self.ai.cache is not None:
+            self.ai.cache.close()
+            self.ai.cache = None
+        if path in ("", "<empty>"):
+            return
+        try:
+            self.ai.cache = AnalysisCache(path)
+        except sqlite3.Error as error:
+            self.send(f"info string cannot open analysis cache {path}: {error}")
+
+    def set_position(self, args):
+        """Handle 'position [startpos | fen <fen>] [moves <move> ...]'"""
+        moves_index = args.index("moves") if "moves" in args else len(args)
+        if args and args[0] == "fen":
+            fen = " ".join(args[1:moves_index])
+        else:
+            fen = STARTING_FEN
+        try:
+            board = ChessBoard.from_fen(fen)
+            for text in args[moves_index + 1:]:
+                from_row, from_col, to_row, to_col = parse_uci_move(text)
+                piece = board.get_piece(from_row, from_col)
+                if not piece or piece.color != board.current_player or \
+                        (to_row, to_col) not in board.get_valid_moves(piece):
+                    raise ValueError(f"illegal move {text!r}")
+                board.execute_move(from_row, from_col, to_row, to_col)
+        except ValueError as error:
+            self.send(f"info string {error}")
+            return
+        self.board = board
+
+    def allocate_time(self, options):
+        """Get the seconds to spend on this move from 'go' options, or None for no limit"""
+        if "movetime" in options:
+            return max(options["movetime"] / 1000 - MOVE_OVERHEAD, 0.01)
+        white = self.board.current_player == Color.WHITE
+        time_left = options.get("wtime" if white else "btime")
+        if time_left is None:
+            return None
+        increment = options.get("winc" if white else "binc", 0)
+        moves_to_go = options.get("movestogo", DEFAULT_MOVES_TO_GO)
+        budget = (time_left / max(moves_to_go, 1) + increment * 0.8) / 1000
+        return max(min(budget, time_left / 1000 / 2) - MOVE_OVERHEAD, 0.01)
+
+    def start_search(self, args):
+        """Handle 'go' by starting a search thread"""
+        options = {}
+        infinite = False
+        index = 0
+        while index < len(args):
+            key = args[index]
+            if key in ("infinite", "ponder"):
+                infinite = True
+            elif key in ("wtime", "btime", "winc", "binc", "movestogo", "movetime", "depth", "nodes", "mate"):
+                if index + 1 < len(args):
+                    try:
+                        options[key] = int(args[index + 1])
+                    except ValueError:
+                        pass
+                    index += 1
+            index += 1
+
+        depth = options.get("depth", MAX_SEARCH_DEPTH)
+        time_limit = None if infinite else self.allocate_time(options)
+        # A 'go' with no depth or time limit (a bare 'go') searches until 'stop'
+        if "depth" not in options and time_limit is None:
+            infinite = True
+        self.ai.stop_event.clear()
+        self.search_thread = threading.Thread(target=self.search, args=(depth, time_limit, infinite), daemon=True)
+        self.search_thread.start()
+
+    def search(self, depth, time_limit, infinite):
+        """Run a search and report 'info' lines and the best move"""
+        def report(search_report):
+            pv = format_pv(self.board, search_report.pv)
+            self.send(f"info depth {search_report.depth} score {format_score(search_report.score)} "
+                      f"nodes {search_report.nodes} nps {search_report.nps} "
+                      f"time {int(search_report.seconds * 1000)} pv {pv}")
+
+        move, _ = self.ai.search(self.board, depth, time_limit, on_depth=report)
+        # In infinite mode the best move is only sent after 'stop'
+        if infinite:
+            self.ai.stop_event.wait()
+        if move is None:
+            self.send("bestmove 0000")
+            return
+        piece, (to_row, to_col) = move
+        promotion = piece.type == PieceType.PAWN and to_row in (0, 7)
+        self.send(f"bestmove {format_uci_move(piece.row, piece.col, to_row, to_col, promotion)}")
+
+    def stop_search(self):
+        """Stop any running search and wait for its best move to be sent"""
+        if self.search_thread:
+            self.ai.stop_event.set()
+            self.search_thread.join()
+            self.search_thread = None
+
+
+def main():
+    UCIEngine().run()
+
+
+if __name__ == "__main__":
+    main()